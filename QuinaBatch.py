@@ -0,0 +1,251 @@
+# Facturación por lotes sin interfaz (cierre de mes: varios periodos / subcuentas).
+# No depende de Streamlit.
+#
+#   python QuinaBatch.py manifiesto.json --output-dir facturas --workers 4
+#
+# Manifiesto (JSON): lista de trabajos; las rutas relativas se resuelven desde la carpeta del manifiesto
+# y "ddc" acepta comodines (glob). "ddc" es opcional, como en la aplicación web.
+#   [
+#     {"name": "cliente_a_2024-05", "rdc": "a/RDC.xlsx", "ddc": ["a/DDC_*.xlsx"]},
+#     {"name": "cliente_b_2024-05", "rdc": "b/RDC.xlsx", "ddc": ["b/DDC1.xlsx", "b/DDC2.xlsx"]}
+#   ]
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+
+from QuinaLogic import QuinaCalculator
+from QuinaReport import AUDIT_FORMATS
+from QuinaWindows import WINDOW_MODES
+
+SUMMARY_KEYS = ["Total HSM Final", "Total Mensajes Final", "HSM Bruto", "HSM Credito",
+                "Mensajes Bruto", "Mensajes Agente", "Mensajes Credito"]
+# Diferencia de Total HSM Final entre los modos de ventana (meta-anchored - previous-chat)
+# y mensajes descartados por repetirse entre archivos DDC
+RESULT_KEYS = (["name", "status", "seconds", "output", "audit", "rollup", "error", "warnings"] + SUMMARY_KEYS
+               + ["Diferencia HSM Modos", "Mensajes Duplicados"])
+
+# Dónde va la auditoría por chat: hojas del mismo libro, libros XLSX aparte, un archivo columnar o ninguna
+AUDIT_MODES = ("sheets", "files") + AUDIT_FORMATS + ("none",)
+
+
+def load_manifest(path):
+    """Lee el manifiesto y devuelve los trabajos con rutas absolutas y comodines expandidos"""
+    with open(path, encoding="utf-8") as f:
+        jobs = json.load(f)
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs", [])
+    base = os.path.dirname(os.path.abspath(path))
+
+    resueltos = []
+    nombres = set()
+    for n, job in enumerate(jobs, start=1):
+        if "rdc" not in job:
+            raise ValueError(f"Trabajo {n} del manifiesto sin 'rdc'")
+        name = str(job.get("name") or f"job_{n:03d}")
+        if name in nombres:
+            raise ValueError(f"Nombre de trabajo repetido en el manifiesto: {name}")
+        nombres.add(name)
+
+        ddc = job.get("ddc") or []
+        if isinstance(ddc, str):
+            ddc = [ddc]
+        rutas_ddc = []
+        for patron in ddc:
+            patron = os.path.normpath(os.path.join(base, patron))
+            encontrados = sorted(glob.glob(patron))
+            # Sin coincidencias se conserva la ruta para que el trabajo falle con un error claro
+            rutas_ddc.extend(encontrados or [patron])
+
+        resueltos.append({
+            "name": name,
+            "rdc": os.path.normpath(os.path.join(base, job["rdc"])),
+            "ddc": rutas_ddc,
+            "output": job.get("output") or f"{name}.xlsx",
+        })
+    return resueltos
+
+
+def _write_atomic(ruta, write):
+    """Escribe en un temporal y lo renombra: un trabajo fallido no deja un archivo a medias"""
+    tmp = f"{ruta}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, ruta)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def run_job(job, output_dir, cache_dir=None, memory_budget=None, audit="sheets", audit_rows=None, rollup=False,
+            window_mode="previous-chat", preflight=True, ddc_workers=1):
+    """
+    Procesa un trabajo y escribe su factura; los errores se devuelven en el resultado, no se propagan.
+    audit: uno de AUDIT_MODES; con "files" o un formato columnar el libro lleva sólo la hoja Factura
+    audit_rows: filas por hoja/libro de auditoría (por defecto el máximo de Excel)
+    rollup: escribe además el cubo día × tipificación × hora (<factura>_cubo.parquet)
+    window_mode: regla de conversación HSM (QuinaWindows.WINDOW_MODES)
+    preflight: revisa antes los archivos (columnas, periodo) y falla sin leerlos completos si hay errores
+    ddc_workers: procesos para leer los DDC del trabajo en paralelo (1 = lectura secuencial)
+    """
+    inicio = time.perf_counter()
+    resultado = {"name": job["name"], "status": "ok", "output": None, "audit": None, "rollup": None, "error": None,
+                 "warnings": None}
+    try:
+        calc = QuinaCalculator(cache_dir=cache_dir, memory_budget=memory_budget, window_mode=window_mode,
+                               ddc_workers=ddc_workers)
+        if audit_rows:
+            calc.AUDIT_MAX_ROWS = audit_rows
+        if preflight:
+            revision = calc.preflight(job["rdc"], job["ddc"])
+            resultado["warnings"] = " | ".join(revision.advertencias) or None
+            revision.check()
+        summary = calc.process_data(job["rdc"], job["ddc"])
+        resultado.update({k: int(v) for k, v in summary.items()})
+        resultado["Diferencia HSM Modos"] = int(calc.compare_window_modes().loc["Diferencia", "Total HSM Final"])
+        resultado["Mensajes Duplicados"] = calc.get_duplicate_count() or 0
+
+        ruta = os.path.join(output_dir, job["output"])
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        _write_atomic(ruta, lambda tmp: calc.write_excel_report(tmp, include_audit=audit == "sheets"))
+        resultado["output"] = ruta
+
+        base = os.path.splitext(ruta)[0]
+        if audit == "files":
+            directorio = f"{base}_auditoria"
+            calc.write_audit_workbooks(directorio)
+            resultado["audit"] = directorio
+        elif audit in AUDIT_FORMATS:
+            ruta_auditoria = f"{base}_auditoria.{audit}"
+            _write_atomic(ruta_auditoria, lambda tmp: calc.write_audit_export(tmp, audit))
+            resultado["audit"] = ruta_auditoria
+        if rollup:
+            ruta_cubo = f"{base}_cubo.parquet"
+            _write_atomic(ruta_cubo, calc.write_rollup)
+            resultado["rollup"] = ruta_cubo
+    except Exception as e:
+        resultado["status"] = "error"
+        resultado["error"] = f"{type(e).__name__}: {e}"
+        resultado["traceback"] = traceback.format_exc()
+    resultado["seconds"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def _job_process(conn, args):
+    """Proceso hijo: ejecuta un trabajo y envía su resultado por la tubería"""
+    try:
+        conn.send(run_job(*args))
+    finally:
+        conn.close()
+
+
+def run_batch(jobs, output_dir, workers=1, cache_dir=None, memory_budget=None, audit="sheets", audit_rows=None,
+              rollup=False, window_mode="previous-chat", preflight=True, ddc_workers=1, log=print):
+    """
+    Ejecuta los trabajos con a lo sumo `workers` procesos simultáneos, uno por trabajo: si un proceso muere
+    (p.ej. sin memoria) sólo falla su trabajo y los demás siguen.
+    Devuelve los resultados en el orden del manifiesto.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    resultados = {}
+
+    def registrar(r):
+        resultados[r["name"]] = r
+        estado = "OK" if r["status"] == "ok" else f"ERROR {r['error']}"
+        log(f"[{len(resultados)}/{len(jobs)}] {r['name']}: {estado} ({r['seconds']}s)")
+
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        for job in jobs:
+            registrar(run_job(job, output_dir, cache_dir, memory_budget, audit, audit_rows, rollup, window_mode,
+                              preflight, ddc_workers))
+    else:
+        ctx = multiprocessing.get_context()
+        pendientes = list(jobs)
+        activos = {}  # extremo de lectura de la tubería -> (proceso, trabajo)
+        while pendientes or activos:
+            while pendientes and len(activos) < workers:
+                job = pendientes.pop(0)
+                lectura, escritura = ctx.Pipe(duplex=False)
+                args = (job, output_dir, cache_dir, memory_budget, audit, audit_rows, rollup, window_mode, preflight,
+                        ddc_workers)
+                proceso = ctx.Process(target=_job_process, args=(escritura, args))
+                proceso.start()
+                escritura.close()
+                activos[lectura] = (proceso, job)
+            for lectura in wait(list(activos)):
+                proceso, job = activos.pop(lectura)
+                try:
+                    resultado = lectura.recv()
+                except EOFError:
+                    # El proceso terminó sin enviar resultado (p.ej. lo mató el sistema por falta de memoria)
+                    proceso.join()
+                    resultado = {"name": job["name"], "status": "error", "output": None, "seconds": None,
+                                 "error": f"El proceso del trabajo terminó sin resultado (código {proceso.exitcode})"}
+                lectura.close()
+                proceso.join()
+                registrar(resultado)
+    return [resultados[job["name"]] for job in jobs]
+
+
+def write_summaries(resultados, output_dir):
+    """Escribe resumen.json (con trazas de error) y resumen.csv"""
+    ruta_json = os.path.join(output_dir, "resumen.json")
+    with open(ruta_json, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    ruta_csv = os.path.join(output_dir, "resumen.csv")
+    with open(ruta_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_KEYS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(resultados)
+    return ruta_json, ruta_csv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Facturación Quina por lotes")
+    parser.add_argument("manifest", help="Manifiesto JSON con los juegos de archivos RDC/DDC")
+    parser.add_argument("--output-dir", default="facturas", help="Carpeta de salida (facturas y resumen)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Máximo de procesos en paralelo")
+    parser.add_argument("--ddc-workers", type=int, default=1,
+                        help="Por trabajo: procesos para leer sus DDC en paralelo (por defecto 1, lectura secuencial)")
+    parser.add_argument("--cache-dir", default=None, help="Caché de archivos parseados (opcional)")
+    parser.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="Por trabajo: si el DDC estimado supera este tamaño se procesa particionado en disco")
+    parser.add_argument("--audit", choices=AUDIT_MODES, default="sheets",
+                        help="Auditoría en hojas del libro (sheets), en libros XLSX aparte (files), "
+                             "en un archivo csv.gz/parquet junto a la factura, o sin auditoría (none)")
+    parser.add_argument("--audit-rows", type=int, default=None,
+                        help="Filas por hoja/libro de auditoría (por defecto el máximo de Excel, 1,048,575)")
+    parser.add_argument("--rollup", action="store_true",
+                        help="Escribe también el cubo día × tipificación × hora (<factura>_cubo.parquet) para tableros")
+    parser.add_argument("--window-mode", choices=WINDOW_MODES, default="previous-chat",
+                        help="Regla de conversación HSM: >= 24h desde el chat anterior (previous-chat) "
+                             "o ventana de 24h desde el inicio de la conversación (meta-anchored)")
+    parser.add_argument("--skip-preflight", action="store_true",
+                        help="No revisa los archivos antes de procesarlos (columnas requeridas, periodo del DDC)")
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    memory_budget = args.memory_budget_mb * 1024 ** 2 if args.memory_budget_mb is not None else None
+    resultados = run_batch(jobs, args.output_dir, args.workers, args.cache_dir, memory_budget,
+                           args.audit, args.audit_rows, args.rollup, args.window_mode, not args.skip_preflight,
+                           args.ddc_workers)
+    ruta_json, ruta_csv = write_summaries(resultados, args.output_dir)
+
+    fallidos = [r["name"] for r in resultados if r["status"] != "ok"]
+    print(f"{len(resultados) - len(fallidos)}/{len(resultados)} facturas generadas. Resumen: {ruta_json}, {ruta_csv}")
+    if fallidos:
+        print(f"Trabajos con error: {', '.join(fallidos)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# Benchmark del pipeline de facturación sobre datos sintéticos (QuinaSynthetic).
+# Mide cada etapa por separado y el pico de memoria (RSS); escribe resultados JSON comparables entre commits.
+#
+#   python QuinaBenchmark.py --scales 10k,1m --output bench.json
+#   python QuinaBenchmark.py --scales 10k --format xlsx --output bench_xlsx.json
+#   python QuinaBenchmark.py --scales 1m --format parquet --engine pyarrow --output bench_arrow.json
+#   python QuinaBenchmark.py --compare bench_base.json bench.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from QuinaSynthetic import SCALES, generate, write_files
+from QuinaProfile import current_rss_mb
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Etapas medidas (tiempo propio: el tiempo de una etapa anidada no se cuenta en la etapa que la llama)
+STAGES = ["load", "_process_rdc", "_process_ddc", "_prepare_detailed_report", "_build_rollup", "generate_excel_report"]
+METODOS = {
+    "load": "_load_sources",
+    "_process_rdc": "_process_rdc",
+    "_process_ddc": "_process_ddc",
+    "_prepare_detailed_report": "_prepare_detailed_report",
+    "_build_rollup": "_build_rollup",
+    "generate_excel_report": "generate_excel_report",
+}
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual (MB)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes
+    return round(pico / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageTimer:
+    """Envuelve métodos de una instancia de QuinaCalculator y acumula el tiempo propio de cada etapa"""
+
+    def __init__(self, calc):
+        self.times = {stage: 0.0 for stage in STAGES}
+        self._pila = []
+        for stage, metodo in METODOS.items():
+            setattr(calc, metodo, self._wrap(stage, getattr(calc, metodo)))
+
+    def _wrap(self, stage, func):
+        def medido(*args, **kwargs):
+            self._pila.append(0.0)
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                total = time.perf_counter() - inicio
+                anidado = self._pila.pop()
+                self.times[stage] += total - anidado
+                if self._pila:
+                    self._pila[-1] += total
+        return medido
+
+
+def run_scale(scale, seed=0, fmt=None, ddc_workers=1, compact_ddc=False, engine="numpy"):
+    """Ejecuta el pipeline completo para una escala y devuelve las métricas"""
+    from QuinaLogic import QuinaCalculator
+
+    n_mensajes = SCALES[scale] if scale in SCALES else int(scale)
+    inicio = time.perf_counter()
+    rdc, ddc = generate(n_mensajes, seed=seed)
+    resultado = {
+        "scale": scale,
+        "rows_rdc": len(rdc),
+        "rows_ddc": len(ddc),
+        "generate_s": round(time.perf_counter() - inicio, 3),
+    }
+
+    with tempfile.TemporaryDirectory(prefix="quina_bench_") as tmp:
+        if fmt:
+            inicio = time.perf_counter()
+            rdc_source, ddc_sources = write_files(rdc, ddc, tmp, fmt)
+            resultado["write_files_s"] = round(time.perf_counter() - inicio, 3)
+            resultado["ddc_files"] = len(ddc_sources)
+            del rdc, ddc
+        else:
+            rdc_source, ddc_sources = rdc, [ddc]
+        resultado["rss_before_mb"] = current_rss_mb()
+
+        calc = QuinaCalculator(ddc_workers=ddc_workers, compact_ddc=compact_ddc, engine=engine)
+        timer = StageTimer(calc)
+        inicio = time.perf_counter()
+        summary = calc.process_data(rdc_source, ddc_sources)
+        excel = calc.generate_excel_report()
+        resultado["total_s"] = round(time.perf_counter() - inicio, 3)
+
+    resultado["stages_s"] = {stage: round(t, 3) for stage, t in timer.times.items()}
+    resultado["rows_detalle"] = len(calc.df_detalle) if calc.df_detalle is not None else 0
+    resultado["excel_bytes"] = len(excel)
+    resultado["summary"] = {k: int(v) for k, v in summary.items()}
+    resultado["hsm_window_diff"] = {k: int(v) for k, v in calc.compare_window_modes().loc["Diferencia"].items()}
+    resultado["df_ddc_mb"] = round(calc.df_ddc.memory_usage(deep=True).sum() / 1024 ** 2, 1) if calc.df_ddc is not None else 0
+    resultado["peak_rss_mb"] = peak_rss_mb()
+    return resultado
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scales, seed=0, fmt=None, ddc_workers=1, compact_ddc=False, engine="numpy"):
+    """Cada escala corre en un proceso nuevo para que el pico de RSS no se contamine entre escalas"""
+    resultados = []
+    ctx = multiprocessing.get_context("spawn")
+    for scale in scales:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run_scale, (scale, seed, fmt, ddc_workers, compact_ddc, engine))
+        print(f"{scale:>5}: total {r['total_s']:.2f}s, pico RSS {r['peak_rss_mb']} MB  "
+              + ", ".join(f"{k} {v:.2f}s" for k, v in r["stages_s"].items()))
+        resultados.append(r)
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "format": fmt or "dataframe",
+        "ddc_workers": ddc_workers,
+        "compact_ddc": compact_ddc,
+        "engine": engine,
+        "results": resultados,
+    }
+
+
+def compare(path_base, path_nuevo):
+    """Imprime la razón nuevo/base por etapa y escala (< 1 = más rápido)"""
+    with open(path_base) as f:
+        base = json.load(f)
+    with open(path_nuevo) as f:
+        nuevo = json.load(f)
+    por_escala = {r["scale"]: r for r in base["results"]}
+    print(f"base {base.get('commit')} -> nuevo {nuevo.get('commit')}")
+    for r in nuevo["results"]:
+        b = por_escala.get(r["scale"])
+        if b is None:
+            continue
+        if b["summary"] != r["summary"]:
+            print(f"{r['scale']}: ¡el resumen difiere! {b['summary']} vs {r['summary']}")
+        filas = [(k, b["stages_s"].get(k), v) for k, v in r["stages_s"].items()]
+        filas.append(("total", b["total_s"], r["total_s"]))
+        filas.append(("peak_rss_mb", b["peak_rss_mb"], r["peak_rss_mb"]))
+        filas.append(("df_ddc_mb", b.get("df_ddc_mb"), r.get("df_ddc_mb")))
+        print(f"[{r['scale']}]")
+        for nombre, vb, vn in filas:
+            razon = f"{vn / vb:.2f}x" if vb and vn is not None else "-"
+            print(f"  {nombre:<26} {vb!s:>10} {vn!s:>10} {razon:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de QuinaCalculator con datos sintéticos")
+    parser.add_argument("--scales", default="10k,1m", help="Escalas separadas por coma (10k, 1m, 10m o un número de mensajes)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["xlsx", "csv", "csv.gz", "parquet"], default=None,
+                        help="Escribir los datos en este formato y medir también la lectura (por defecto DataFrames)")
+    parser.add_argument("--xlsx", action="store_const", dest="format", const="xlsx", help="Equivale a --format xlsx")
+    parser.add_argument("--ddc-workers", type=int, default=1)
+    parser.add_argument("--compact-ddc", action="store_true", help="Usar el modo compacto del DDC")
+    parser.add_argument("--engine", choices=["numpy", "pyarrow"], default="numpy",
+                        help="Motor de columnas del DDC (pyarrow: texto respaldado por Arrow)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NUEVO"), help="Comparar dos archivos de resultados")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    suite = run_suite(args.scales.split(","), args.seed, args.format, args.ddc_workers, args.compact_ddc, args.engine)
+    with open(args.output, "w") as f:
+        json.dump(suite, f, indent=2)
+    print(f"Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
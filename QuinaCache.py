@@ -0,0 +1,135 @@
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # La caché queda deshabilitada sin pyarrow
+    pa = None
+    feather = None
+
+# Tamaño de bloque para el hash de los archivos de entrada
+HASH_BLOCK = 1 << 20
+
+
+def _arrow_text_types(tipo):
+    return pd.ArrowDtype(tipo) if pa.types.is_string(tipo) or pa.types.is_large_string(tipo) else None
+
+
+def hash_source(source):
+    """
+    Hash del contenido de un archivo de entrada.
+    source: ruta o archivo binario; en este último caso se restituye la posición de lectura.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+    else:
+        pos = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(HASH_BLOCK), b""):
+            h.update(block)
+        source.seek(pos)
+    return h.hexdigest()
+
+
+class ParsedFileCache:
+    """
+    Caché en disco de DataFrames ya tipados, direccionada por el contenido del archivo.
+    Cada entrada se guarda en formato Feather (Arrow) y se lee con memory-map.
+    Al superar `max_bytes` se eliminan las entradas menos usadas recientemente (LRU).
+    compression: por defecto sin comprimir, para que la lectura mapee el archivo sin copiarlo;
+    "lz4"/"zstd" ocupan menos disco pero cada lectura descomprime la tabla entera en memoria
+    """
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, compression="uncompressed"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.enabled = pa is not None
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, source, kind, version):
+        """Clave de caché: tipo de archivo + versión de las reglas de lectura + hash del contenido"""
+        return f"{kind}-v{version}-{hash_source(source)}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".feather")
+
+    def get(self, key, arrow=False):
+        """
+        Devuelve el DataFrame guardado o None si la clave no existe.
+        arrow: las columnas de texto vuelven respaldadas por Arrow (motor "pyarrow" de QuinaCalculator)
+        """
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            table = feather.read_table(path, memory_map=True)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        # Marcar como usado recientemente para la política LRU
+        os.utime(path)
+        if arrow:
+            return table.to_pandas(types_mapper=_arrow_text_types)
+        df = table.to_pandas()
+        # Arrow devuelve None en los nulos de texto; los lectores producen NaN
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+        return df
+
+    def put(self, key, df):
+        """Guarda el DataFrame; los tipos no representables en Arrow se omiten sin error"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        # Temporal único por llamada: varios hilos (trabajos de la aplicación web) pueden guardar la misma clave
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            table = pa.Table.from_pandas(df)
+            feather.write_feather(table, tmp_path, compression=self.compression)
+            os.replace(tmp_path, path)
+        except (pa.ArrowException, TypeError, ValueError):
+            return
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict()
+
+    def _evict(self):
+        """Elimina las entradas más antiguas hasta respetar el tamaño máximo"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".feather"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Elimina todas las entradas de la caché"""
+        if not self.enabled:
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".feather"):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,95 @@
+# Deduplicación de mensajes DDC entre archivos que se solapan (p.ej. el semanal más los diarios de esos días).
+# Cada mensaje se resume en una huella uint64 de (ID Chat, Fecha Hora, Tipo, Mensaje) sin armar una clave de texto:
+# cada columna se factoriza, se hashean sólo sus valores distintos y las huellas por columna se combinan.
+# Un mensaje de un archivo se descarta si un archivo anterior ya trajo esa huella; las repeticiones dentro de un
+# mismo archivo se conservan (se cuentan como ocurrencias: un archivo posterior sólo descarta tantas como ya había).
+import os
+
+import numpy as np
+import pandas as pd
+
+DEDUP_COLUMNS = ["ID Chat", "Fecha Hora", "Tipo", "Mensaje"]
+
+# Multiplicador para combinar huellas de columnas (aritmética uint64 con desborde)
+_MEZCLA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _column_hash(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.util.hash_array(series.to_numpy())
+    # Igual para texto Python o Arrow: se hashean los valores distintos como objetos
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    return pd.util.hash_array(np.asarray(uniques, dtype=object), categorize=False)[codes]
+
+
+def message_keys(df):
+    """Huella uint64 por mensaje de un DDC normalizado (ver QuinaLoader.normalize_ddc)"""
+    claves = np.zeros(len(df), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for col in DEDUP_COLUMNS:
+            claves = claves * _MEZCLA ^ _column_hash(df[col])
+    return claves
+
+
+def _occurrence_keys(claves):
+    """Distingue las repeticiones dentro del archivo: la k-ésima aparición de una huella se mezcla con k"""
+    repetidas = pd.Series(claves).duplicated().to_numpy()
+    if not repetidas.any():
+        return claves
+    claves = claves.copy()
+    ocurrencia = pd.Series(claves[repetidas]).groupby(claves[repetidas]).cumcount().to_numpy() + 1
+    with np.errstate(over="ignore"):
+        claves[repetidas] ^= pd.util.hash_array(ocurrencia.astype(np.uint64)) * _MEZCLA
+    return claves
+
+
+def source_name(source, posicion):
+    """Nombre legible de una fuente: ruta, archivo subido (atributo name) o DataFrame"""
+    nombre = getattr(source, "name", None)
+    if isinstance(source, (str, os.PathLike)):
+        nombre = os.fspath(source)
+    if isinstance(nombre, str) and nombre:
+        return os.path.basename(nombre)
+    return f"DDC {posicion + 1}"
+
+
+class MessageDeduplicator:
+    """
+    Filtro de mensajes ya vistos en archivos anteriores, archivo por archivo (sirve también para el modo
+    particionado, que nunca junta el DDC completo). Sólo guarda las huellas: 8 bytes por mensaje.
+    vistos: huellas ya registradas (p.ej. las del estado incremental)
+    """
+
+    def __init__(self, vistos=None):
+        self.vistos = np.asarray(vistos if vistos is not None else [], dtype=np.uint64)
+        self.registro = []
+
+    def add_seen(self, claves):
+        """Registra más huellas ya vistas (p.ej. las de los chats de un delta en el estado incremental)"""
+        self.vistos = np.concatenate([self.vistos, np.asarray(claves, dtype=np.uint64)])
+
+    def filter_many(self, dfs, nombres):
+        """
+        Filtra varios archivos en una sola pasada de hash (en el orden dado: gana el primero que trajo el mensaje).
+        Devuelve [(df sin los mensajes repetidos, huellas de las filas conservadas), ...]
+        """
+        claves = [_occurrence_keys(message_keys(df)) for df in dfs]
+        # Las huellas de un archivo son únicas entre sí, así que sólo se repiten las de archivos anteriores
+        repetidas = pd.Series(np.concatenate([self.vistos, *claves])).duplicated().to_numpy()[len(self.vistos):]
+        cortes = np.cumsum([len(c) for c in claves])[:-1]
+        salida = []
+        for df, nombre, clave, rep in zip(dfs, nombres, claves, np.split(repetidas, cortes)):
+            self.registro.append({"Archivo": nombre, "Filas": len(df), "Duplicadas": int(rep.sum())})
+            if rep.any():
+                df, clave = df[~rep].reset_index(drop=True), clave[~rep]
+            salida.append((df, clave))
+        self.vistos = np.concatenate([self.vistos, *(clave for _, clave in salida)])
+        return salida
+
+    def filter(self, df, nombre):
+        """Un archivo a la vez (modo particionado e incremental): (df filtrado, huellas conservadas)"""
+        return self.filter_many([df], [nombre])[0]
+
+    def report(self):
+        """Filas leídas y descartadas por archivo, en el orden de carga"""
+        return pd.DataFrame(self.registro, columns=["Archivo", "Filas", "Duplicadas"])
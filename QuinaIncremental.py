@@ -0,0 +1,477 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from QuinaLogic import QuinaCalculator
+from QuinaRollup import apply_delta, empty_cube, replace_days
+from QuinaWindows import conversation_starts
+
+# Versión del formato del estado persistido: estado.json + un segmento por delta (delta_00001.pkl, ...)
+# con sólo lo que cambió
+STATE_VERSION = 2
+
+STATE_META = "estado.json"
+SEGMENT_FILE = "delta_{:05d}.pkl"
+
+COUNTERS = ["hsm_bruto", "hsm_credito", "mensajes_bruto", "mensajes_agente", "mensajes_credito", "total_q_mensajes"]
+
+RDC_COLUMNS = {
+    "id": np.int64,
+    "F.Inicio Chat": "datetime64[ns]",
+    "Tipificación Chat": object,
+    "chat": np.int64,
+    "Es_Cobrable": np.int64,
+}
+MESSAGE_COLUMNS = {
+    "chat": np.int64,
+    "Fecha Hora": "datetime64[ns]",
+    "agente": bool,
+    "credito": bool,
+    # Huella del mensaje (QuinaDedup) para descartar deltas que se solapan; 0 = sin huella
+    "clave": np.uint64,
+}
+# Métricas por chat de QuinaCalculator._process_ddc (columnas de chat_view)
+CHAT_METRICS = {
+    "Mensajes_Facturables": np.int64,
+    "Mensajes_Bruto": np.int64,
+    "Mensajes_Post_Agente": np.int64,
+    "Mensajes_Post_Credito": np.int64,
+    "Time_Agente": "datetime64[ns]",
+    "Time_Credito": "datetime64[ns]",
+}
+CHAT_COLUMNS = dict(CHAT_METRICS, Tipif_Credito=bool, HSM_Cobrables=np.int64)
+CHAT_DEFAULTS = {"Time_Agente": np.datetime64("NaT"), "Time_Credito": np.datetime64("NaT")}
+
+
+class _Columnas:
+    """Tabla de columnas numpy que crece duplicando su capacidad: agregar filas cuesta lo que se agrega"""
+
+    def __init__(self, dtypes, defaults=None):
+        self.n = 0
+        self.datos = {col: np.empty(0, dtype=dtype) for col, dtype in dtypes.items()}
+        self.defaults = defaults or {}
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, col):
+        return self.datos[col][:self.n]
+
+    def append(self, cols, n=None):
+        """Agrega `n` filas (por defecto el largo del primer arreglo); las columnas que faltan toman su valor por defecto"""
+        m = n if n is not None else len(next(iter(cols.values())))
+        capacidad = len(next(iter(self.datos.values())))
+        if self.n + m > capacidad:
+            capacidad = max(2 * capacidad, self.n + m, 1024)
+            for col, arr in self.datos.items():
+                nuevo = np.empty(capacidad, dtype=arr.dtype)
+                nuevo[:self.n] = arr[:self.n]
+                self.datos[col] = nuevo
+        for col, arr in self.datos.items():
+            arr[self.n:self.n + m] = cols.get(col, self.defaults.get(col, 0))
+        self.n += m
+        return np.arange(self.n - m, self.n)
+
+    def frame(self, filas=None):
+        """DataFrame con una copia de las filas pedidas (todas por defecto)"""
+        return pd.DataFrame({col: (self[col] if filas is None else self[col][filas]).copy() for col in self.datos})
+
+
+class _Catalogo:
+    """Código entero por valor (ID o ID Chat) en orden de aparición; buscar los de un delta cuesta lo que el delta"""
+
+    def __init__(self):
+        self.codigos = {}
+        # Valores nuevos de cada delta; se concatenan sólo al armar las vistas de cierre
+        self.valores = []
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def _buscar(self, valores):
+        """Códigos de factorize, valores distintos y su código en el catálogo (-1 si no están)"""
+        codes, uniques = pd.factorize(valores)
+        # El código -1 de factorize (faltante) toma la última posición: todos los faltantes comparten la clave None
+        claves = np.append(np.asarray(uniques, dtype=object), None)
+        pos = np.fromiter((self.codigos.get(u, -1) for u in claves), dtype=np.int64, count=len(claves))
+        return codes, np.asarray(uniques), pos
+
+    def lookup(self, valores):
+        """Códigos de `valores` (-1 si no están en el catálogo)"""
+        codes, _, pos = self._buscar(valores)
+        return pos[codes]
+
+    def codes(self, valores):
+        """Códigos de `valores`; los nuevos se agregan al catálogo. Devuelve (códigos, cantidad de nuevos)"""
+        codes, uniques, pos = self._buscar(valores)
+        usados = np.zeros(len(pos), dtype=bool)
+        usados[codes] = True
+        nuevos = np.flatnonzero(usados & (pos == -1))
+        if len(nuevos):
+            pos[nuevos] = np.arange(len(self.codigos), len(self.codigos) + len(nuevos))
+            # Con el tipo de la columna (p.ej. ID enteros), como los concatenaría pandas
+            agregar = uniques[nuevos[nuevos < len(uniques)]]
+            if nuevos[-1] == len(uniques):
+                agregar = np.append(agregar.astype(object), None)
+            self.add(agregar)
+        return pos[codes], len(nuevos)
+
+    def add(self, valores):
+        valores = np.asarray(valores)
+        self.codigos.update(zip(valores.tolist(), range(len(self.codigos), len(self.codigos) + len(valores))))
+        self.valores.append(valores)
+
+    def to_numpy(self):
+        return np.concatenate(self.valores) if self.valores else np.zeros(0, dtype=object)
+
+
+class _Indice:
+    """
+    Filas de una tabla agrupadas por clave (código de ID o de chat). Cada delta agrega un tramo por clave
+    con sus filas y un enlace al tramo anterior de la misma clave; recorrer una clave cuesta tantos pasos
+    como deltas la trajeron, sin mirar las filas de las demás.
+    """
+
+    def __init__(self):
+        self.filas = _Columnas({"fila": np.int64})
+        self.tramos = _Columnas({"inicio": np.int64, "fin": np.int64, "anterior": np.int64})
+        self.ultimo = _Columnas({"tramo": np.int64})
+
+    def add(self, claves, filas):
+        if len(claves) == 0:
+            return
+        if len(self.ultimo) <= claves.max():
+            self.ultimo.append({"tramo": -1}, n=int(claves.max()) + 1 - len(self.ultimo))
+        orden = np.argsort(claves, kind="stable")
+        claves = claves[orden]
+        inicio = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]])
+        fin = np.append(inicio[1:], len(claves))
+        base = len(self.filas)
+        self.filas.append({"fila": filas[orden]})
+        unicas = claves[inicio]
+        ultimo = self.ultimo["tramo"]
+        tramos = self.tramos.append({"inicio": base + inicio, "fin": base + fin, "anterior": ultimo[unicas]})
+        ultimo[unicas] = tramos
+
+    def lookup(self, claves):
+        """Filas de las claves dadas (únicas, ya existentes), en orden de llegada"""
+        claves = claves[claves < len(self.ultimo)]
+        tramo = self.ultimo["tramo"][claves]
+        inicio, fin, anterior = self.tramos["inicio"], self.tramos["fin"], self.tramos["anterior"]
+        partes = []
+        tramo = tramo[tramo >= 0]
+        while len(tramo):
+            partes.append(tramo)
+            tramo = anterior[tramo]
+            tramo = tramo[tramo >= 0]
+        if not partes:
+            return np.zeros(0, dtype=np.int64)
+        tramos = np.concatenate(partes)
+        largos = fin[tramos] - inicio[tramos]
+        desplazamiento = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos)
+        return np.sort(self.filas["fila"][np.repeat(inicio[tramos], largos) + desplazamiento])
+
+
+class IncrementalState:
+    """
+    Estado acumulado de un periodo para la facturación incremental.
+    Cada delta (p.ej. la exportación de un día) sólo recalcula los ID / ID Chat que toca:
+    - RDC: regla de 24h de los ID presentes en el delta y crédito de sus ID Chat.
+    - DDC: cortes de agente/crédito y conteos de los ID Chat presentes en el delta.
+    Las filas se ubican por clave (_Indice) y los contadores globales y el cubo se actualizan restando el aporte
+    previo de lo recalculado y sumando el nuevo: un delta cuesta lo que sus ID / ID Chat, no lo acumulado,
+    y al cierre coincide exactamente con un cálculo completo sobre todos los deltas.
+    Al guardar sólo se escribe un segmento con lo que cambió desde el guardado anterior.
+    """
+    def __init__(self):
+        self.ids = _Catalogo()
+        self.chats = _Catalogo()
+
+        # Filas RDC ya tipadas; la posición es el orden de llegada (desempate estable de la regla de 24h)
+        self.rdc = _Columnas(RDC_COLUMNS)
+        # Mensajes DDC reducidos a lo que necesitan las reglas: chat, fecha y marcas de agente/crédito
+        self.mensajes = _Columnas(MESSAGE_COLUMNS)
+        # Métricas por chat (la posición es el código del catálogo `chats`) y HSM cobrables de sus filas RDC
+        self.por_chat = _Columnas(CHAT_COLUMNS, CHAT_DEFAULTS)
+
+        self.rdc_por_id = _Indice()
+        self.rdc_por_chat = _Indice()
+        self.mensajes_por_chat = _Indice()
+
+        # Cubo día × tipificación × hora (QuinaRollup) y aportes (antes, después) de las filas recalculadas
+        # desde la última actualización (ver update_cube)
+        self.cubo = empty_cube()
+        self._cubo_pendiente = []
+
+        # Modo de ventana de conversación con que se calcularon las filas RDC (ver QuinaWindows)
+        self.window_mode = None
+
+        self.ddc_files = 0
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+        # Cambios desde el último guardado (ver save)
+        self.segmentos = 0
+        # (ids/chats: tramos del catálogo; n_chats, rdc, mensajes: filas)
+        self._guardado = {"ids": 0, "chats": 0, "n_chats": 0, "rdc": 0, "mensajes": 0}
+        self._cobrables_cambiados = []
+        self._chats_cambiados = []
+        self._dias_cambiados = []
+
+    def _chat_codes(self, id_chat):
+        """Códigos enteros de los ID Chat del delta; los nuevos se agregan al catálogo y a `por_chat`"""
+        chat, nuevos = self.chats.codes(id_chat)
+        if nuevos:
+            self.por_chat.append({}, n=nuevos)
+        return chat
+
+    def add_rdc(self, df, tipif_mask, window_mode="previous-chat"):
+        """
+        Incorpora un delta de RDC ya normalizado (ver QuinaLoader.normalize_rdc).
+        tipif_mask: máscara de filas cuya tipificación indica crédito
+        window_mode: modo de ventana (QuinaWindows.WINDOW_MODES); debe ser el mismo en todo el periodo
+        """
+        if self.window_mode is not None and self.window_mode != window_mode:
+            raise ValueError(f"El estado se calculó con el modo de ventana {self.window_mode!r}, no {window_mode!r}")
+        self.window_mode = window_mode
+        ids = self.ids.codes(df["ID"])[0]
+        chat = self._chat_codes(df["ID Chat"])
+        tipif = self.por_chat["Tipif_Credito"]
+
+        # Filas previas afectadas: las de los ID del delta (regla 24h) y las de chats que pasan a crédito
+        ids_delta = np.unique(ids)
+        previas_id = self.rdc_por_id.lookup(ids_delta)
+        chats_tipif = np.unique(chat[np.asarray(tipif_mask)])
+        chats_tipif = chats_tipif[~tipif[chats_tipif]]
+        previas = np.union1d(previas_id, self.rdc_por_chat.lookup(chats_tipif))
+        antes = self._detail_rows(previas)
+
+        nuevas = self.rdc.append({
+            "id": ids,
+            "F.Inicio Chat": df["F.Inicio Chat"].to_numpy().astype("datetime64[ns]"),
+            "Tipificación Chat": df["Tipificación Chat"].to_numpy(),
+            "chat": chat,
+        })
+        self.rdc_por_id.add(ids, nuevas)
+        self.rdc_por_chat.add(chat, nuevas)
+
+        grupo = np.concatenate([previas_id, nuevas])
+        cobrable = self.rdc["Es_Cobrable"]
+        chat_grupo = self.rdc["chat"][grupo]
+        cambio = conversation_starts(self.rdc["id"][grupo], self.rdc["F.Inicio Chat"][grupo], window_mode,
+                                     desempate=grupo) - cobrable[grupo]
+        cobrable[grupo] += cambio
+        self.hsm_bruto += int(cambio.sum())
+        self.hsm_credito += int(cambio[tipif[chat_grupo]].sum())
+        np.add.at(self.por_chat["HSM_Cobrables"], chat_grupo, cambio)
+        # Los chats que pasan a crédito aportan todos sus HSM cobrables
+        self.hsm_credito += int(self.por_chat["HSM_Cobrables"][chats_tipif].sum())
+        tipif[chats_tipif] = True
+
+        self._cubo_pendiente.append((antes, self._detail_rows(np.concatenate([previas, nuevas]))))
+        cambiadas = grupo[cambio != 0]
+        self._cobrables_cambiados.append(cambiadas[cambiadas < self._guardado["rdc"]])
+        self._chats_cambiados.extend([np.unique(chat_grupo[cambio != 0]), chats_tipif])
+
+    def add_ddc(self, df, credito_mask, claves=None):
+        """
+        Incorpora un delta de DDC ya normalizado (ver QuinaLoader.normalize_ddc).
+        credito_mask: máscara de mensajes que activan la opción de crédito
+        claves: huellas de los mensajes (QuinaDedup.MessageDeduplicator.filter), si se deduplica
+        """
+        self.ddc_files += 1
+        chat = self._chat_codes(df["ID Chat"])
+        nuevos = self.mensajes.append({
+            "chat": chat,
+            "Fecha Hora": df["Fecha Hora"].to_numpy().astype("datetime64[ns]"),
+            "agente": (df["Tipo"] == "NOTIFICATION").to_numpy(dtype=bool),
+            "credito": np.asarray(credito_mask, dtype=bool),
+            "clave": claves if claves is not None else np.zeros(len(df), dtype=np.uint64),
+        })
+        self.mensajes_por_chat.add(chat, nuevos)
+
+        tocados = np.unique(chat)
+        filas_rdc = self.rdc_por_chat.lookup(tocados)
+        antes = self._detail_rows(filas_rdc)
+        self._sumar_mensajes(tocados, -1)
+        filas = self.mensajes_por_chat.lookup(tocados)
+        locales, uniq = pd.factorize(self.mensajes["chat"][filas])
+        self._recalcular_chats(filas, locales, uniq)
+        self._sumar_mensajes(tocados, 1)
+        if len(filas_rdc):
+            self._cubo_pendiente.append((antes, self._detail_rows(filas_rdc)))
+        self._chats_cambiados.append(tocados)
+
+    def message_keys(self, id_chat):
+        """Huellas ya incorporadas de los mensajes de esos ID Chat (los únicos con los que un delta puede repetirse)"""
+        chat = np.unique(self.chats.lookup(id_chat))
+        return self.mensajes["clave"][self.mensajes_por_chat.lookup(chat[chat >= 0])]
+
+    def _recalcular_chats(self, filas, locales, uniq):
+        """Cortes y conteos por chat con las mismas reglas que QuinaCalculator._process_ddc"""
+        n = len(uniq)
+        tiempos = pd.Series(self.mensajes["Fecha Hora"][filas])
+        t_agente = QuinaCalculator._first_time_by_chat(tiempos, locales, n, self.mensajes["agente"][filas])
+        t_credito = QuinaCalculator._first_time_by_chat(tiempos, locales, n, self.mensajes["credito"][filas])
+
+        t = tiempos.to_numpy()
+        ta = np.asarray(t_agente, dtype="datetime64[ns]")[locales]
+        tc = np.asarray(t_credito, dtype="datetime64[ns]")[locales]
+        antes_agente = np.isnat(ta) | (t < ta)
+        antes_credito = np.isnat(tc) | (t < tc)
+        post_credito = antes_agente & ~antes_credito
+
+        pc = self.por_chat
+        pc["Mensajes_Bruto"][uniq] = np.bincount(locales, minlength=n)
+        pc["Mensajes_Post_Agente"][uniq] = np.bincount(locales[~antes_agente], minlength=n)
+        pc["Mensajes_Post_Credito"][uniq] = np.bincount(locales[post_credito], minlength=n)
+        pc["Mensajes_Facturables"][uniq] = np.bincount(locales[antes_agente & antes_credito], minlength=n)
+        pc["Time_Agente"][uniq] = np.asarray(t_agente, dtype="datetime64[ns]")
+        pc["Time_Credito"][uniq] = np.asarray(t_credito, dtype="datetime64[ns]")
+
+    def _sumar_mensajes(self, codigos, signo):
+        pc = self.por_chat
+        self.mensajes_bruto += signo * int(pc["Mensajes_Bruto"][codigos].sum())
+        self.mensajes_agente += signo * int(pc["Mensajes_Post_Agente"][codigos].sum())
+        self.mensajes_credito += signo * int(pc["Mensajes_Post_Credito"][codigos].sum())
+        self.total_q_mensajes += signo * int(pc["Mensajes_Facturables"][codigos].sum())
+
+    def _detail_rows(self, filas):
+        """Filas RDC del estado con las columnas de df_detalle que usa el cubo"""
+        chat = self.rdc["chat"][filas]
+        df = pd.DataFrame({
+            "F.Inicio Chat": self.rdc["F.Inicio Chat"][filas],
+            "Tipificación Chat": self.rdc["Tipificación Chat"][filas],
+            "Es_Cobrable": self.rdc["Es_Cobrable"][filas],
+            "Es_Credito": self.por_chat["Tipif_Credito"][chat].astype(int),
+        })
+        for col in ["Mensajes_Bruto", "Mensajes_Post_Agente", "Mensajes_Post_Credito", "Mensajes_Facturables",
+                    "Time_Agente"]:
+            df[col] = self.por_chat[col][chat]
+        return df
+
+    def update_cube(self):
+        """
+        Aplica al cubo el cambio de aporte de las filas recalculadas desde la última vez; sólo toca sus días.
+        Los aportes se suman, así que los de varios deltas se aplican juntos.
+        """
+        if self._cubo_pendiente:
+            antes, despues = (pd.concat(partes, ignore_index=True) for partes in zip(*self._cubo_pendiente))
+            self.cubo, dias = apply_delta(self.cubo, antes, despues)
+            self._dias_cambiados.append(dias)
+            self._cubo_pendiente = []
+        return self.cubo
+
+    def rdc_frame(self):
+        """Reconstruye la vista RDC en el orden del cálculo completo (ID, fecha y orden de llegada)"""
+        chat = self.rdc["chat"]
+        df = pd.DataFrame({
+            "ID": self.ids.to_numpy()[self.rdc["id"]],
+            "F.Inicio Chat": self.rdc["F.Inicio Chat"].copy(),
+            "ID Chat": self.chats.to_numpy().astype(object)[chat],
+            "Tipificación Chat": self.rdc["Tipificación Chat"].copy(),
+            "Es_Cobrable": self.rdc["Es_Cobrable"].copy(),
+            "Es_Credito": self.por_chat["Tipif_Credito"][chat],
+        })
+        df.sort_values(by=["ID", "F.Inicio Chat"], inplace=True, kind="stable")
+        return df
+
+    def chat_view(self):
+        """Métricas DDC por chat indexadas por ID Chat"""
+        view = self.por_chat.frame()[list(CHAT_METRICS)]
+        view.index = pd.Index(self.chats.to_numpy().astype(object), dtype=object, name="ID Chat")
+        return view
+
+    def save(self, state_dir):
+        """
+        Persiste en `state_dir` un segmento nuevo con lo que cambió desde el guardado anterior (ID y chats nuevos,
+        filas RDC y mensajes nuevos, HSM cobrables que cambiaron, chats recalculados y días del cubo tocados)
+        y después estado.json, que es el que da por válido el segmento.
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        self.update_cube()
+        g = self._guardado
+        chats = np.unique(np.concatenate([np.arange(g["n_chats"], len(self.chats))] + self._chats_cambiados))
+        cobrables = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + self._cobrables_cambiados))
+        dias = pd.unique(np.concatenate([np.zeros(0, dtype="datetime64[ns]")] + self._dias_cambiados))
+        segmento = {
+            "ids": np.concatenate(self.ids.valores[g["ids"]:] or [np.zeros(0, dtype=object)]),
+            "chats": np.concatenate(self.chats.valores[g["chats"]:] or [np.zeros(0, dtype=object)]),
+            "rdc": self.rdc.frame(np.arange(g["rdc"], len(self.rdc))),
+            "cobrables": pd.DataFrame({"fila": cobrables, "Es_Cobrable": self.rdc["Es_Cobrable"][cobrables]}),
+            "mensajes": self.mensajes.frame(np.arange(g["mensajes"], len(self.mensajes))),
+            "por_chat": self.por_chat.frame(chats).set_index(pd.Index(chats, name="chat")),
+            "dias": dias,
+            "cubo": self.cubo[self.cubo["Fecha_Dia"].isin(dias)].reset_index(drop=True),
+        }
+        path = os.path.join(state_dir, SEGMENT_FILE.format(self.segmentos + 1))
+        pd.to_pickle(segmento, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.segmentos += 1
+
+        meta = {"version": STATE_VERSION, "segmentos": self.segmentos, "ddc_files": self.ddc_files,
+                "window_mode": self.window_mode}
+        meta.update({name: getattr(self, name) for name in COUNTERS})
+        path = os.path.join(state_dir, STATE_META)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+        self._mark_saved()
+
+    def _mark_saved(self):
+        self._guardado = {"ids": len(self.ids.valores), "chats": len(self.chats.valores),
+                          "n_chats": len(self.chats), "rdc": len(self.rdc),
+                          "mensajes": len(self.mensajes)}
+        self._cobrables_cambiados = []
+        self._chats_cambiados = []
+        self._dias_cambiados = []
+
+    def _apply_segment(self, segmento):
+        """Reaplica un segmento guardado (ver save); los índices por clave se arman al final de load"""
+        if len(segmento["ids"]):
+            self.ids.add(segmento["ids"])
+        if len(segmento["chats"]):
+            self.chats.add(segmento["chats"])
+            self.por_chat.append({}, n=len(segmento["chats"]))
+        self.rdc.append({col: segmento["rdc"][col].to_numpy() for col in RDC_COLUMNS})
+        self.rdc["Es_Cobrable"][segmento["cobrables"]["fila"].to_numpy()] = segmento["cobrables"]["Es_Cobrable"]
+        self.mensajes.append({col: segmento["mensajes"][col].to_numpy() for col in MESSAGE_COLUMNS})
+        chats = segmento["por_chat"].index.to_numpy()
+        for col in CHAT_COLUMNS:
+            self.por_chat[col][chats] = segmento["por_chat"][col].to_numpy()
+        self.cubo = replace_days(self.cubo, segmento["cubo"], segmento["dias"])
+
+    def _build_indexes(self):
+        self.rdc_por_id.add(self.rdc["id"], np.arange(len(self.rdc)))
+        self.rdc_por_chat.add(self.rdc["chat"], np.arange(len(self.rdc)))
+        self.mensajes_por_chat.add(self.mensajes["chat"], np.arange(len(self.mensajes)))
+
+    @classmethod
+    def load(cls, state_dir):
+        """
+        Carga el estado de `state_dir`; devuelve un estado vacío si no existe.
+        Un estado de otra versión lanza ValueError: guardar encima borraría lo acumulado.
+        """
+        state = cls()
+        path = os.path.join(state_dir, STATE_META)
+        if not os.path.exists(path):
+            return state
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STATE_VERSION:
+            raise ValueError(f"{state_dir}: el estado incremental es de la versión {meta.get('version')!r} y esta "
+                             f"calculadora usa la {STATE_VERSION}; reprocese el periodo en una carpeta nueva")
+
+        # Los segmentos posteriores a estado.json quedaron de un guardado interrumpido y se ignoran
+        for n in range(1, meta["segmentos"] + 1):
+            state._apply_segment(pd.read_pickle(os.path.join(state_dir, SEGMENT_FILE.format(n))))
+        state._build_indexes()
+        state.segmentos = meta["segmentos"]
+        state.ddc_files = meta["ddc_files"]
+        state.window_mode = meta["window_mode"]
+        for name in COUNTERS:
+            setattr(state, name, meta[name])
+        state._mark_saved()
+        return state
@@ -0,0 +1,193 @@
+# Ejecución de cálculos en segundo plano: pool acotado de hilos, cola FIFO y control de admisión por memoria.
+# No depende de Streamlit; la aplicación web comparte un único JobRunner entre sesiones.
+import threading
+import time
+import uuid
+from collections import deque
+
+from QuinaProfile import ETAPAS
+
+JOB_TTL = 60 * 60  # segundos que se conserva un trabajo terminado
+
+EN_COLA = "en cola"
+EJECUTANDO = "ejecutando"
+TERMINADO = "terminado"
+ERROR = "error"
+
+
+class JobRejected(RuntimeError):
+    """La cola está llena"""
+
+
+class Job:
+    """Estado de un trabajo; los hilos del runner lo actualizan y la interfaz sólo lo lee"""
+
+    def __init__(self, func, args, kwargs, key=None, name=None, est_bytes=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.name = name or self.id
+        self.est_bytes = est_bytes
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = EN_COLA
+        self.progress = 0.0
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        """Terminado (con resultado o con error); finished se fija después del estado final"""
+        return self.finished is not None
+
+
+class JobRunner:
+    """
+    workers: trabajos en ejecución simultánea
+    max_queue: trabajos en espera; por encima se rechazan (JobRejected)
+    memory_limit: bytes estimados en ejecución simultánea; un trabajo espera en la cola hasta que
+        quepa (siempre se admite si no hay otro en ejecución, aunque supere el límite: corre solo). None = sin límite
+    keep_finished / ttl: trabajos terminados que se conservan para descargar su resultado
+    """
+
+    def __init__(self, workers=1, max_queue=8, memory_limit=None, keep_finished=4, ttl=JOB_TTL):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.memory_limit = memory_limit
+        self.keep_finished = keep_finished
+        self.ttl = ttl
+        self._jobs = {}
+        self._by_key = {}
+        self._pending = deque()
+        self._running = 0
+        self._reserved = 0
+        self._cond = threading.Condition()
+        for n in range(workers):
+            threading.Thread(target=self._worker, name=f"quina-job-{n}", daemon=True).start()
+
+    def submit(self, func, *args, key=None, name=None, est_bytes=0, **kwargs):
+        """
+        Encola func(job, *args, **kwargs). Con `key`, un trabajo activo o terminado con la misma clave
+        se reutiliza en lugar de volver a calcular.
+        """
+        with self._cond:
+            self._expire()
+            previo = self._jobs.get(self._by_key.get(key)) if key is not None else None
+            if previo is not None and previo.state != ERROR:
+                return previo
+            if len(self._pending) >= self.max_queue:
+                raise JobRejected(f"Hay {len(self._pending)} trabajos en cola; intenta de nuevo en unos minutos")
+
+            job = Job(func, args, kwargs, key=key, name=name, est_bytes=est_bytes)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job.id
+            self._pending.append(job)
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job):
+        """Posición (1 = siguiente) de un trabajo en espera, None si ya no está en cola"""
+        with self._cond:
+            for pos, pendiente in enumerate(self._pending, start=1):
+                if pendiente is job:
+                    return pos
+        return None
+
+    def _admissible(self):
+        if not self._pending:
+            return False
+        if self._running == 0 or self.memory_limit is None:
+            return True
+        return self._reserved + self._pending[0].est_bytes <= self.memory_limit
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._admissible():
+                    self._cond.wait()
+                job = self._pending.popleft()
+                self._running += 1
+                self._reserved += job.est_bytes
+
+            job.started = time.time()
+            job.state = EJECUTANDO
+            try:
+                job.result = job.func(job, *job.args, **job.kwargs)
+                job.progress = 1.0
+                job.state = TERMINADO
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.state = ERROR
+            finally:
+                # Las entradas (p.ej. archivos subidos) ya no se necesitan
+                job.args = job.kwargs = None
+                job.finished = time.time()
+                with self._cond:
+                    self._running -= 1
+                    self._reserved -= job.est_bytes
+                    self._cond.notify_all()
+
+    def _expire(self):
+        """Descarta trabajos terminados por antigüedad (ttl) y por cantidad (keep_finished)"""
+        ahora = time.time()
+        terminados = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.finished)
+        sobrantes = len(terminados) - self.keep_finished
+        for n, job in enumerate(terminados):
+            if n < sobrantes or ahora - job.finished > self.ttl:
+                del self._jobs[job.id]
+                if self._by_key.get(job.key) == job.id:
+                    del self._by_key[job.key]
+
+
+def run_calculator(job, rdc_source, ddc_sources, calc_kwargs=None, ddc_names=None, preflight_report=None):
+    """
+    Trabajo estándar: process_data, con el avance por etapas en job.progress/job.stage.
+    No escribe ningún Excel: los reportes se generan a pedido con run_export.
+    ddc_names: nombres originales de los DDC (p.ej. de los archivos subidos) para el reporte de duplicados
+    preflight_report: revisión previa ya hecha sobre estos archivos (QuinaLogic.QuinaCalculator.preflight);
+    su estimación de filas elige el modo del DDC y sus advertencias quedan en la calculadora
+    Devuelve la calculadora, con la huella de sus reportes ya calculada (ver report_fingerprint).
+    """
+    from QuinaLogic import QuinaCalculator
+
+    def on_stage(record):
+        if record.name in ETAPAS:
+            # Al terminar una etapa externa (p.ej. _process_rdc) su índice queda detrás del de las anidadas:
+            # el avance nunca retrocede y la etiqueta sólo cambia cuando empieza una etapa
+            i = ETAPAS.index(record.name)
+            job.progress = max(job.progress, (i + record.finished) / len(ETAPAS))
+            if not record.finished:
+                job.stage = record.name
+
+    calc = QuinaCalculator(profile=True, on_stage=on_stage, **(calc_kwargs or {}))
+    calc.preflight_report = preflight_report
+    calc.process_data(rdc_source, ddc_sources)
+    duplicados = calc.get_ddc_duplicates()
+    if duplicados is not None and ddc_names:
+        duplicados["Archivo"] = list(ddc_names)
+    calc.report_fingerprint()
+    calc.profiler.hook = None
+    return calc
+
+
+def run_export(job, calc, fmt):
+    """
+    Exportación a pedido de un cálculo terminado.
+    fmt: "factura" = sólo la hoja Factura, "xlsx" = libro completo (auditoría en hojas numeradas),
+    "csv.gz" / "parquet" = sólo la auditoría
+    """
+    if fmt == "factura":
+        return calc.generate_excel_report(include_audit=False)
+    if fmt == "xlsx":
+        return calc.generate_excel_report()
+    return calc.generate_audit_export(fmt)
@@ -0,0 +1,413 @@
+import csv
+import gzip
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import openpyxl
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # sin pyarrow: CSV con el lector de pandas y sin soporte de Parquet
+    pa = None
+
+from QuinaPatterns import map_unique
+
+# Columnas requeridas por cada tipo de archivo
+RDC_COLUMNS = ["ID", "F.Inicio Chat", "ID Chat", "Tipificación Chat"]
+DDC_COLUMNS = ["ID Chat", "Mensaje", "Fecha Hora", "Tipo"]
+
+# Versión de las reglas de lectura/normalización (invalida la caché al cambiar)
+PARSE_VERSION = 2
+
+# Motores de columnas: "numpy" (objetos Python, por defecto) o "pyarrow" (texto respaldado por Arrow)
+ENGINES = ("numpy", "pyarrow")
+
+# Filas acumuladas antes de convertir el buffer a columnas tipadas
+CHUNK_ROWS = 50000
+
+# Formatos de entrada admitidos (por extensión; sin nombre se detectan por la firma del contenido)
+FORMATS = {".xlsx": "xlsx", ".xlsm": "xlsx", ".csv": "csv", ".gz": "csv.gz", ".zip": "zip", ".parquet": "parquet", ".pq": "parquet"}
+UPLOAD_TYPES = ["xlsx", "csv", "gz", "zip", "parquet"]
+
+# Columnas de texto (se leen siempre como texto, p.ej. para conservar ceros a la izquierda en ID Chat)
+# y de fecha (formato explícito, sin inferencia; si ninguno aplica se deja la inferencia de pandas)
+TEXT_COLUMNS = {"ID Chat", "Tipificación Chat", "Mensaje", "Tipo"}
+DATE_COLUMNS = {"F.Inicio Chat", "Fecha Hora"}
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M"]
+CSV_SEPARATORS = [",", ";", "\t", "|"]
+
+# Mismos textos que pandas.read_excel interpreta como valor nulo
+NA_STRINGS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+])
+
+
+def _convert_cell(val):
+    """Normaliza un valor de celda igual que pandas.read_excel"""
+    if val is None:
+        return np.nan
+    if isinstance(val, str):
+        return np.nan if val in NA_STRINGS else val
+    if isinstance(val, float) and val.is_integer():
+        return int(val)
+    return val
+
+
+def _resolve_columns(header, columns):
+    """Devuelve la posición de cada columna requerida dentro de la fila de encabezado"""
+    names = ["" if h is None else str(h) for h in header]
+    positions = {}
+    for idx, name in enumerate(names):
+        positions.setdefault(name, idx)
+
+    missing = [c for c in columns if c not in positions]
+    if missing:
+        raise ValueError(f"Columnas requeridas no encontradas en el archivo: {missing}")
+    return [positions[c] for c in columns]
+
+
+def _flush(buffers, columns, chunks):
+    """Convierte los buffers de Python en un bloque de columnas tipadas"""
+    if buffers[0]:
+        chunks.append(pd.DataFrame({col: buf for col, buf in zip(columns, buffers)}))
+        for buf in buffers:
+            buf.clear()
+
+
+def read_columns(source, columns, sheet_name=0, chunk_rows=CHUNK_ROWS, text_columns=()):
+    """
+    Lee sólo las columnas indicadas de un libro XLSX en modo streaming.
+    source: ruta, archivo binario (p.ej. UploadedFile de Streamlit) o bytes
+    columns: nombres de encabezado requeridos, en el orden de salida
+    sheet_name: índice o nombre de la hoja a leer
+    Las filas se recorren en modo read-only/values-only y se acumulan en
+    bloques de `chunk_rows`, por lo que la memoria no depende del ancho de la hoja.
+    Igual que pandas.read_excel, las filas vacías intermedias se conservan (como nulos) y las
+    finales se descartan, y cada columna se convierte a número si todos sus valores lo son.
+    text_columns: columnas que se dejan como están, sin esa conversión (p.ej. ID Chat "00123" de una auditoría)
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, int):
+            ws = wb.worksheets[sheet_name]
+        else:
+            ws = wb[sheet_name]
+        # Algunos exportadores escriben dimensiones incorrectas
+        ws.reset_dimensions()
+
+        rows = ws.iter_rows(values_only=True)
+        positions = None
+        for row in rows:
+            if any(v is not None for v in row):
+                positions = _resolve_columns(row, columns)
+                break
+        if positions is None:
+            raise ValueError("El archivo no contiene una fila de encabezados")
+
+        buffers = [[] for _ in columns]
+        chunks = []
+        width = max(positions) + 1
+        vacias = 0
+        for row in rows:
+            # Las filas vacías sólo se agregan si después aparece alguna fila con datos
+            if all(v is None for v in row):
+                vacias += 1
+                continue
+            for _ in range(vacias):
+                for buf in buffers:
+                    buf.append(np.nan)
+            vacias = 0
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            for buf, pos in zip(buffers, positions):
+                buf.append(_convert_cell(row[pos]))
+            if len(buffers[0]) >= chunk_rows:
+                _flush(buffers, columns, chunks)
+        _flush(buffers, columns, chunks)
+    finally:
+        wb.close()
+
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in columns})
+    df = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+    return _infer_numeric(df, text_columns)
+
+
+def _infer_numeric(df, text_columns=()):
+    """
+    Inferencia por columna de pandas.read_excel: una columna con números y números guardados como texto
+    (p.ej. 123 y "123") pasa entera a numérica; si algún valor no es numérico queda como objetos
+    """
+    for col in df.columns[df.dtypes == object].difference(text_columns, sort=False):
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+def _source_name(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, "name", None)
+
+
+def _open_binary(source):
+    """Archivo binario posicionado al inicio (las rutas se abren, los bytes se envuelven)"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def detect_format(source):
+    """'xlsx', 'csv', 'csv.gz', 'zip' o 'parquet' según la extensión o, si no hay nombre, la firma del contenido"""
+    name = _source_name(source)
+    if name:
+        ext = os.path.splitext(name.lower())[1]
+        if ext in FORMATS:
+            return FORMATS[ext]
+
+    f = _open_binary(source)
+    try:
+        head = f.read(4)
+        if head == b"PAR1":
+            return "parquet"
+        if head[:2] == b"\x1f\x8b":
+            return "csv.gz"
+        if head[:2] == b"PK":
+            f.seek(0)
+            with zipfile.ZipFile(f) as zf:
+                return "xlsx" if "[Content_Types].xml" in zf.namelist() else "zip"
+        return "csv"
+    finally:
+        if f is not source:
+            f.close()
+        else:
+            f.seek(0)
+
+
+def _csv_header(stream):
+    """Primera línea del CSV: devuelve (separador, nombres de columna)"""
+    line = stream.readline().decode("utf-8-sig").rstrip("\r\n")
+    sep = max(CSV_SEPARATORS, key=line.count)
+    return sep, next(csv.reader([line], delimiter=sep))
+
+
+def _parse_dates(df, columns):
+    """Convierte las fechas de texto con el primer formato explícito que aplique a toda la columna"""
+    for col in columns:
+        if col not in DATE_COLUMNS or df[col].dtype != object:
+            continue
+        for fmt in DATE_FORMATS:
+            try:
+                df[col] = pd.to_datetime(df[col], format=fmt)
+                break
+            except (ValueError, TypeError):
+                continue
+    return df
+
+
+def _to_pandas(table, arrow=False):
+    """
+    Tabla Arrow a DataFrame. Las columnas de texto quedan como NaN nulos (igual que XLSX) o,
+    con arrow=True, respaldadas por Arrow sin pasar por objetos Python.
+    """
+    if not arrow:
+        df = table.to_pandas()
+        for col in df.columns:
+            if col in TEXT_COLUMNS and df[col].dtype == object:
+                df[col] = df[col].fillna(np.nan)
+        return df
+    text = [c for c in table.column_names
+            if c in TEXT_COLUMNS and (pa.types.is_string(table.schema.field(c).type)
+                                      or pa.types.is_large_string(table.schema.field(c).type))]
+    df = table.drop_columns(text).to_pandas()
+    for col in text:
+        df[col] = pd.Series(pd.arrays.ArrowExtensionArray(table[col]), index=df.index)
+    return df[table.column_names]
+
+
+def _read_csv_stream(stream, columns, arrow=False):
+    """
+    Lee sólo `columns` de un flujo CSV binario (ya descomprimido y con seek).
+    Con pyarrow: lector multihilo, columnas de texto como texto y fechas con formatos explícitos.
+    """
+    sep, header = _csv_header(stream)
+    _resolve_columns(header, columns)
+
+    if pa is None:
+        stream.seek(0)
+        df = pd.read_csv(stream, sep=sep, usecols=columns, encoding="utf-8-sig",
+                         dtype={c: str for c in columns if c in TEXT_COLUMNS},
+                         na_values=list(NA_STRINGS), keep_default_na=False)
+        return _parse_dates(df[columns], columns)
+
+    column_types = {c: pa.string() for c in columns if c in TEXT_COLUMNS}
+    parse = pa_csv.ParseOptions(delimiter=sep)
+    for timestamp_parsers in (DATE_FORMATS, None):
+        types = dict(column_types)
+        if timestamp_parsers:
+            types.update({c: pa.timestamp("ns") for c in columns if c in DATE_COLUMNS})
+        convert = pa_csv.ConvertOptions(
+            include_columns=columns, column_types=types, null_values=list(NA_STRINGS),
+            strings_can_be_null=True, timestamp_parsers=timestamp_parsers or [],
+        )
+        stream.seek(0)
+        try:
+            table = pa_csv.read_csv(stream, parse_options=parse, convert_options=convert)
+            break
+        except pa.ArrowInvalid:
+            # Alguna fecha no respeta los formatos explícitos: se lee como texto y pandas infiere
+            if not timestamp_parsers:
+                raise
+    return _parse_dates(_to_pandas(table, arrow), columns)
+
+
+def read_csv_columns(source, columns, compression=None, arrow=False):
+    """CSV (o CSV comprimido con gzip): ruta, archivo binario o bytes"""
+    f = _open_binary(source)
+    try:
+        stream = gzip.GzipFile(fileobj=f) if compression == "gzip" else f
+        return _read_csv_stream(stream, columns, arrow)
+    finally:
+        if f is not source:
+            f.close()
+
+
+def read_parquet_columns(source, columns, arrow=False):
+    """Parquet: sólo las columnas requeridas, lectura multihilo de pyarrow"""
+    if pa is None:
+        raise ValueError("Leer archivos Parquet requiere pyarrow")
+    f = _open_binary(source)
+    try:
+        pf = pq.ParquetFile(f)
+        _resolve_columns(pf.schema_arrow.names, columns)
+        df = _to_pandas(pf.read(columns=columns), arrow)
+    finally:
+        if f is not source:
+            f.close()
+    return _parse_dates(df, columns)
+
+
+def read_zip_columns(source, columns, arrow=False):
+    """ZIP con un único archivo de datos (CSV, CSV.gz, XLSX o Parquet; se usa el primero que aparezca)"""
+    f = _open_binary(source)
+    try:
+        with zipfile.ZipFile(f) as zf:
+            members = [m for m in zf.namelist()
+                       if not m.endswith("/") and FORMATS.get(os.path.splitext(m.lower())[1]) not in (None, "zip")]
+            if not members:
+                raise ValueError("El archivo ZIP no contiene archivos CSV, XLSX o Parquet")
+            member = members[0]
+            fmt = FORMATS[os.path.splitext(member.lower())[1]]
+            if fmt == "csv":
+                # El CSV se lee directamente del ZIP, sin copiarlo entero a memoria
+                with zf.open(member) as stream:
+                    return _read_csv_stream(stream, columns, arrow)
+            return read_table(zf.read(member), columns, fmt, arrow)
+    finally:
+        if f is not source:
+            f.close()
+
+
+def read_table(source, columns, fmt=None, arrow=False):
+    """
+    Lee sólo `columns` de un archivo de cualquier formato admitido (ver FORMATS).
+    arrow: texto respaldado por Arrow en CSV/Parquet (XLSX siempre se lee a objetos Python)
+    """
+    fmt = fmt or detect_format(source)
+    if fmt == "xlsx":
+        return read_columns(source, columns)
+    if fmt == "parquet":
+        return read_parquet_columns(source, columns, arrow)
+    if fmt == "zip":
+        return read_zip_columns(source, columns, arrow)
+    return read_csv_columns(source, columns, compression="gzip" if fmt == "csv.gz" else None, arrow=arrow)
+
+
+def read_rdc(source):
+    """Carga las columnas de RDC necesarias para la regla de 24h"""
+    return read_table(source, RDC_COLUMNS)
+
+
+def read_ddc(source, arrow=False):
+    """Carga las columnas de DDC necesarias para el conteo de mensajes"""
+    return read_table(source, DDC_COLUMNS, arrow=arrow)
+
+
+def normalize_rdc(df):
+    """Tipado base del RDC: descarta filas sin ID/fecha y normaliza fechas e ID Chat"""
+    df.dropna(subset=["ID", "F.Inicio Chat"], inplace=True)
+    df["F.Inicio Chat"] = pd.to_datetime(df["F.Inicio Chat"])
+    df["ID Chat"] = df["ID Chat"].astype(str)
+    return df
+
+
+def _normalize_tipo(tipos):
+    return tipos.astype(str).str.upper().str.strip()
+
+
+def _arrow_text(series):
+    """Columna como texto Arrow, con el mismo resultado que astype(str) (los nulos pasan a "nan")"""
+    if isinstance(series.dtype, pd.ArrowDtype) and pa.types.is_string(series.dtype.pyarrow_dtype):
+        return pc.fill_null(pa.array(series.array), "nan")
+    return pa.chunked_array([pa.array(series.astype(str).to_numpy(dtype=object), type=pa.string())])
+
+
+def _arrow_series(array, index):
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=index)
+
+
+def normalize_ddc(df, engine="numpy"):
+    """
+    Tipado base del DDC: fechas, ID Chat como texto, Tipo y Mensaje normalizados.
+    engine="pyarrow": ID Chat, Tipo y Mensaje quedan como texto Arrow y se transforman con kernels de Arrow
+    """
+    df["Fecha Hora"] = pd.to_datetime(df["Fecha Hora"])
+    if engine == "pyarrow":
+        df["ID Chat"] = _arrow_series(_arrow_text(df["ID Chat"]), df.index)
+        # Tipo: se normalizan sólo los valores distintos y se expanden con `take`
+        codes, tipos = pd.factorize(_arrow_series(_arrow_text(df["Tipo"]), df.index))
+        normalizados = pa.array(_normalize_tipo(pd.Series(tipos, dtype=object)).to_numpy(dtype=object), type=pa.string())
+        df["Tipo"] = _arrow_series(normalizados.take(pa.array(codes)), df.index)
+        df["Mensaje"] = _arrow_series(pc.utf8_lower(_arrow_text(df["Mensaje"])), df.index)
+        return df
+    df["ID Chat"] = df["ID Chat"].astype(str)
+    # Tipo tiene pocos valores distintos: se normalizan sólo esos y se propagan
+    df["Tipo"] = map_unique(df["Tipo"], _normalize_tipo)
+    df["Mensaje"] = df["Mensaje"].astype(str).str.lower()
+    return df
+
+
+def load_rdc(source):
+    """Lectura + tipado de un RDC (función de módulo para poder usarse en un pool de procesos)"""
+    return normalize_rdc(read_rdc(source))
+
+
+def load_ddc(source, engine="numpy"):
+    """Lectura + tipado de un DDC (función de módulo para poder usarse en un pool de procesos)"""
+    return normalize_ddc(read_ddc(source, arrow=engine == "pyarrow"), engine)
+
+
+def portable_source(source):
+    """Convierte la fuente en algo serializable hacia otro proceso (ruta o bytes)"""
+    if isinstance(source, (str, os.PathLike, bytes)):
+        return source
+    pos = source.tell()
+    source.seek(0)
+    data = source.read()
+    source.seek(pos)
+    return data
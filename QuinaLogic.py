@@ -1,7 +1,22 @@
 import pandas as pd
-import io
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import numpy as np
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from QuinaLoader import load_rdc, load_ddc, normalize_rdc, normalize_ddc, portable_source, PARSE_VERSION, ENGINES
+from QuinaCache import ParsedFileCache
+from QuinaReport import (write_report, report_bytes, write_audit_workbooks, write_audit_table, audit_bytes,
+                         EXCEL_MAX_ROWS, TRAMOS_MENSAJES, IGV)
+from QuinaPatterns import PatternMatcher
+from QuinaProfile import Profiler, profiled
+from QuinaPartition import PartitionSpool, aggregate_partitions, estimate_ddc_bytes
+from QuinaTariffs import simulate, simulate_daily, daily_counters, scenario_report
+from QuinaRollup import build_cube
+from QuinaDedup import MessageDeduplicator, source_name
+from QuinaWindows import sort_keys, window_flags, compare_modes, WINDOW_MODES
+from QuinaPreflight import preflight
 
 class QuinaCalculator:
     """
@@ -9,16 +24,87 @@ class QuinaCalculator:
     Encapsula las reglas de negocio de Quina para procesar archivos RDC y DDC,
     aplicando ventanas de 24h, lógica de crédito y tarifas escalonadas.
     """
-    def __init__(self):
+    def __init__(self, cache_dir=None, cache_max_bytes=2 * 1024 ** 3, ddc_workers=1, profile=False, on_stage=None,
+                 compact_ddc=False, memory_budget=None, partitions=16, partition_workers=1, spill_dir=None,
+                 engine="numpy", window_mode="previous-chat", dedup_ddc=True):
         # Constantes de Configuración
         self.FEE_MENSUAL = 760.00
         self.TARIFA_HSM = 0.077
         self.META_FREE_TIER = 1000
+        self.TRAMOS_MENSAJES = list(TRAMOS_MENSAJES)
+        self.IGV = IGV
+
+        # Filas por hoja (o por archivo) de auditoría antes de continuar en la siguiente
+        self.AUDIT_MAX_ROWS = EXCEL_MAX_ROWS
+
+        # Regla de conversación (HSM): "previous-chat" (>= 24h desde el chat anterior, regla histórica)
+        # o "meta-anchored" (ventana de 24h desde el inicio de la conversación, como factura Meta)
+        if window_mode not in WINDOW_MODES:
+            raise ValueError(f"Modo de ventana desconocido: {window_mode!r} (opciones: {WINDOW_MODES})")
+        self.WINDOW_MODE = window_mode
+
+        # Disparadores de Crédito (expresiones regulares, sin distinguir mayúsculas)
+        # Mensajes DDC: texto de la opción 3 del menú, con y sin tildes
+        self.CREDITO_TRIGGERS = [
+            "evalúa si tienes un crédito",
+            "evalua si tienes un credito",
+            "3. evalúa",
+            "3. evalua",
+        ]
+        # Tipificación RDC
+        self.CREDITO_TIPIFICACION = ["evalú"]
+
+        # Caché de archivos ya parseados (deshabilitada si no se indica directorio)
+        self.cache = ParsedFileCache(cache_dir, cache_max_bytes) if cache_dir else None
+
+        # Estado de facturación incremental (ver process_increment)
+        self.incremental = None
+        self.incremental_dir = None
+
+        # Procesos para leer varios DDC en paralelo (1 = lectura secuencial, None = todos los núcleos)
+        self.ddc_workers = ddc_workers if ddc_workers is not None else (os.cpu_count() or 1)
+
+        # Modo compacto del DDC: ID Chat/Tipo categóricos, banderas int8, sin Mensaje
+        # y cortes por chat (ddc_cortes) en lugar de columnas por mensaje
+        self.compact_ddc = compact_ddc
+
+        # Motor de columnas del DDC: "numpy" (objetos Python) o "pyarrow" (ID Chat, Tipo y Mensaje como
+        # texto Arrow; normalización y detección de crédito con kernels de Arrow). Mismos resultados.
+        if engine not in ENGINES:
+            raise ValueError(f"Motor desconocido: {engine!r} (opciones: {ENGINES})")
+        self.engine = engine
+
+        # Archivos DDC solapados (p.ej. semanal + diarios): cada mensaje repetido de un archivo anterior
+        # se descarta por huella de (ID Chat, Fecha Hora, Tipo, Mensaje); ver QuinaDedup
+        self.dedup_ddc = dedup_ddc
+
+        # Modo fuera de memoria: si el DDC estimado supera `memory_budget` (bytes) se reparte en
+        # `partitions` particiones en disco (en `spill_dir`) por hash de ID Chat.
+        # None = siempre en memoria, 0 = siempre particionado
+        self.memory_budget = memory_budget
+        self.partitions = partitions
+        self.partition_workers = partition_workers
+        self.spill_dir = spill_dir
+        self.ddc_mode = None
+        # Revisión previa de los archivos (ver preflight); su estimación de filas decide el modo del DDC
+        self.preflight_report = None
+
+        # Instrumentación por etapas (tiempo, filas, memoria); on_stage(record) para colectores externos
+        self.profiler = Profiler(enabled=profile, hook=on_stage)
         
         # Estado Interno
         self.df_rdc = None
         self.df_ddc = None
+        self.ddc_cortes = None
+        # Filas leídas y descartadas por archivo DDC (ver get_ddc_duplicates)
+        self.ddc_duplicados = None
+        # HSM de ambos modos de ventana sobre el mismo RDC (ver compare_window_modes)
+        self.window_comparison = None
+        # Huella de los reportes (ver report_fingerprint); se invalida con cada cálculo
+        self.huella_reportes = None
         self.df_detalle = None
+        # Cubo día × tipificación × hora para tableros (ver QuinaRollup)
+        self.df_cubo = None
         
         # Métricas de Facturación
         self.hsm_bruto = 0
@@ -37,39 +123,152 @@ class QuinaCalculator:
         rdc_source: ruta al archivo Excel o DataFrame de RDC
         ddc_sources: lista de rutas a archivos Excel o lista de DataFrames de DDC
         """
+        self.profiler.reset()
+        self.huella_reportes = None
         self._process_rdc(rdc_source)
         self._process_ddc(ddc_sources)
+        self._build_rollup()
         return self.get_summary()
 
-    def _process_rdc(self, source):
-        # Carga de Datos
-        if isinstance(source, pd.DataFrame):
-            df = source.copy()
+    def process_increment(self, state_dir, rdc_source=None, ddc_sources=None, build_detail=False):
+        """
+        Modo incremental: incorpora sólo los deltas recibidos (p.ej. la exportación de un día)
+        al estado persistido en `state_dir` y actualiza el resumen.
+        rdc_source: delta de RDC (ruta, archivo o DataFrame) o None
+        ddc_sources: lista de deltas de DDC (o un DataFrame) o None
+        build_detail: reconstruye df_detalle; su costo depende de todo el periodo, usar al cierre del mes
+        Al cierre, el resumen y el detalle coinciden con process_data sobre todos los deltas concatenados.
+        """
+        # Importación diferida: QuinaIncremental reutiliza las reglas de esta clase
+        from QuinaIncremental import IncrementalState
+
+        if self.incremental is None or self.incremental_dir != state_dir:
+            self.incremental = IncrementalState.load(state_dir)
+            self.incremental_dir = state_dir
+        state = self.incremental
+        self.profiler.reset()
+        self.huella_reportes = None
+
+        if rdc_source is not None:
+            df = self._load_sources([rdc_source], "rdc")[0]
+            state.add_rdc(df, PatternMatcher(self.CREDITO_TIPIFICACION).contains_unique(df["Tipificación Chat"]),
+                          self.WINDOW_MODE)
+
+        if isinstance(ddc_sources, pd.DataFrame):
+            ddc_sources = [ddc_sources]
+        ddc_sources = list(ddc_sources or [])
+        # Los deltas se deduplican también contra los mensajes ya incorporados al estado; como la huella
+        # incluye el ID Chat, basta con los mensajes de los chats de cada delta
+        dedup = MessageDeduplicator() if self.dedup_ddc and ddc_sources else None
+        for i, (df, source) in enumerate(zip(self._load_sources(ddc_sources, "ddc"), ddc_sources)):
+            claves = None
+            if dedup is not None:
+                dedup.add_seen(state.message_keys(df["ID Chat"]))
+                df, claves = dedup.filter(df, source_name(source, i))
+            state.add_ddc(df, PatternMatcher(self.CREDITO_TRIGGERS).contains(df["Mensaje"]), claves)
+        self.ddc_duplicados = dedup.report() if dedup is not None else None
+
+        # El cubo se actualiza sólo en los días que tocaron los deltas; se guarda sólo lo que cambió
+        self.df_cubo = state.update_cube()
+        state.save(state_dir)
+
+        for name in ["hsm_bruto", "hsm_credito", "mensajes_bruto", "mensajes_agente", "mensajes_credito", "total_q_mensajes"]:
+            setattr(self, name, getattr(state, name))
+        self.total_q_hsm = max(0, self.hsm_bruto - self.hsm_credito - self.META_FREE_TIER)
+
+        self.df_detalle = None
+        if build_detail:
+            self.df_rdc = state.rdc_frame()
+            if state.ddc_files == 0:
+                self._prepare_simple_detail()
+            else:
+                self._join_detail(state.chat_view())
+        return self.get_summary()
+
+    def preflight(self, rdc_source, ddc_sources, rdc_name=None, ddc_names=None):
+        """
+        Revisión rápida de los archivos antes de process_data (encabezado y una muestra de filas por archivo):
+        columnas faltantes, DDC de otro periodo o solapados y filas estimadas. Devuelve un PreflightReport
+        (report.check() lanza ValueError si hay errores). Si luego se procesan los mismos DDC, el modo
+        (memoria o particionado) se elige con la estimación de filas de este reporte; con `memory_budget`
+        advierte de los DDC que solos lo superan.
+        """
+        self.preflight_report = preflight(rdc_source, ddc_sources, rdc_name, ddc_names,
+                                          memory_budget=self.memory_budget)
+        return self.preflight_report
+
+    def _estimate_ddc_bytes(self, sources):
+        reporte = self.preflight_report
+        if reporte is not None and reporte.ddc_bytes is not None and reporte.covers(sources):
+            return reporte.ddc_bytes
+        return estimate_ddc_bytes(sources)
+
+    @profiled(lambda sources, kind: f"load_{kind}")
+    def _load_sources(self, sources, kind):
+        """
+        Carga y tipa una lista de archivos RDC o DDC, conservando el orden de entrada.
+        kind: "rdc" o "ddc"
+        Los archivos (no los DataFrames) se buscan primero en la caché por hash de contenido;
+        los pendientes se leen en un pool de procesos si `ddc_workers` > 1 y hay más de uno.
+        """
+        if kind == "rdc":
+            load, normalize, tag = load_rdc, normalize_rdc, kind
+        else:
+            load, normalize = partial(load_ddc, engine=self.engine), partial(normalize_ddc, engine=self.engine)
+            tag = kind if self.engine == "numpy" else f"{kind}-{self.engine}"
+        dfs = [None] * len(sources)
+        pending = []  # (posición, fuente, clave de caché)
+        for i, source in enumerate(sources):
+            if isinstance(source, pd.DataFrame):
+                dfs[i] = normalize(source.copy())
+                continue
+            key = None
+            if self.cache is not None:
+                key = self.cache.key(source, tag, PARSE_VERSION)
+                dfs[i] = self.cache.get(key, arrow=tag != kind)
+                if dfs[i] is not None:
+                    continue
+            pending.append((i, source, key))
+
+        if self.ddc_workers > 1 and len(pending) > 1:
+            workers = min(self.ddc_workers, len(pending))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                loaded = list(pool.map(load, [portable_source(src) for _, src, _ in pending]))
         else:
-            df = pd.read_excel(source, usecols=["ID", "F.Inicio Chat", "ID Chat", "Tipificación Chat"])
+            loaded = [load(src) for _, src, _ in pending]
+
+        for (i, _, key), df in zip(pending, loaded):
+            if key is not None:
+                self.cache.put(key, df)
+            dfs[i] = df
+        self.profiler.rows(rows_out=sum(len(df) for df in dfs))
+        return dfs
+
+    @profiled("_process_rdc")
+    def _process_rdc(self, source):
+        # Carga de Datos (incluye descarte de filas sin ID/fecha y tipado)
+        df = self._load_sources([source], "rdc")[0]
 
         # Preprocesamiento
-        df.dropna(subset=["ID", "F.Inicio Chat"], inplace=True)
-        df["F.Inicio Chat"] = pd.to_datetime(df["F.Inicio Chat"])
-        df.sort_values(by=["ID", "F.Inicio Chat"], inplace=True)
-        
-        # Lógica de Ventana de 24h
-        df["Prev_ID"] = df["ID"].shift(1)
-        df["Prev_Time"] = df["F.Inicio Chat"].shift(1)
-        time_diff = (df["F.Inicio Chat"] - df["Prev_Time"]).dt.total_seconds() / 3600.0
-        
-        is_new_id = df["ID"] != df["Prev_ID"]
-        is_new_window = time_diff >= 24.0
-        
-        df["Es_Cobrable"] = (is_new_id | is_new_window).astype(int)
+        self.profiler.rows(rows_in=len(df))
+        # Orden por ID y fecha sobre códigos enteros (sin ordenar si el RDC ya viene ordenado)
+        id_codes, tiempos, orden = sort_keys(df["ID"], df["F.Inicio Chat"])
+        if orden is not None:
+            df = df.take(orden)
+
+        # Lógica de Ventana de 24h: se evalúan ambos modos (comparten el orden) y se factura con WINDOW_MODE
+        marcas = window_flags(id_codes, tiempos)
+        df["Es_Cobrable"] = marcas[self.WINDOW_MODE]
         
         # Detección de Crédito (Basado en Tipificación)
-        df["ID Chat"] = df["ID Chat"].astype(str)
-        mask_tipif_credito = df["Tipificación Chat"].astype(str).str.contains("evalú", case=False, na=False)
+        # Pocas tipificaciones distintas: el patrón se evalúa una vez por valor
+        mask_tipif_credito = PatternMatcher(self.CREDITO_TIPIFICACION).contains_unique(df["Tipificación Chat"])
         chats_con_credito_tipif = set(df[mask_tipif_credito]["ID Chat"].unique())
         df["Es_Credito"] = df["ID Chat"].isin(chats_con_credito_tipif)
+        self.window_comparison = compare_modes(marcas, df["Es_Credito"], self.META_FREE_TIER)
 
         self.df_rdc = df
+        self.profiler.rows(rows_out=len(df))
 
         # Cálculos Iniciales de HSM
         self.hsm_bruto = df["Es_Cobrable"].sum()
@@ -77,48 +276,79 @@ class QuinaCalculator:
         self.hsm_credito = df[(df["Es_Cobrable"] == 1) & (df["Es_Credito"])].shape[0]
         # Total Inicial (El paso DDC refina esto, pero se mantiene consistente con la lógica original)
 
+    @profiled("_process_ddc")
     def _process_ddc(self, sources):
+        if isinstance(sources, pd.DataFrame):
+            sources = [sources]
+        if sources and self.memory_budget is not None and self._estimate_ddc_bytes(sources) > self.memory_budget:
+            self._process_ddc_partitioned(sources)
+            return
+        self.ddc_mode = "memoria"
+
         # Carga de Datos
         dfs = []
         if isinstance(sources, list):
-            for source in sources:
-                if isinstance(source, pd.DataFrame):
-                    dfs.append(source)
-                else:
-                    dfs.append(pd.read_excel(source, usecols=["ID Chat", "Mensaje", "Fecha Hora", "Tipo"]))
+            dfs = self._load_sources(sources, "ddc")
         elif isinstance(sources, pd.DataFrame): # Manejar DataFrame único
-             dfs.append(sources)
+             dfs = self._load_sources([sources], "ddc")
         
+        if self.dedup_ddc and dfs:
+            dfs = self._dedup_ddc(dfs, sources)
+
         # Si no hay DDC, manejar ordenadamente
         if not dfs:
             self.total_q_hsm = max(0, self.hsm_bruto - self.hsm_credito - self.META_FREE_TIER)
             self._prepare_simple_detail()
             return
 
+        matcher = PatternMatcher(self.CREDITO_TRIGGERS)
+        if self.compact_ddc:
+            # Detección por archivo: el texto de Mensaje no llega a concatenarse
+            for df in dfs:
+                df["Es_Trigger"] = matcher.contains(df["Mensaje"])
+                df.drop(columns="Mensaje", inplace=True)
+
         df_ddc = pd.concat(dfs, ignore_index=True)
-        df_ddc["Fecha Hora"] = pd.to_datetime(df_ddc["Fecha Hora"])
-        df_ddc["ID Chat"] = df_ddc["ID Chat"].astype(str)
-        df_ddc["Tipo"] = df_ddc["Tipo"].astype(str).str.upper().str.strip()
-        df_ddc["Mensaje"] = df_ddc["Mensaje"].astype(str).str.lower()
+        # Liberar los bloques por archivo: sólo queda la copia concatenada
+        del dfs
+        self.profiler.rows(rows_in=len(df_ddc), rows_out=len(df_ddc))
+
+        # Códigos enteros por chat: se calculan una sola vez y se reutilizan en todas las agregaciones
+        # (con texto Arrow el catálogo de chats vuelve a objetos: es lo que se cruza con el RDC)
+        chat_codes, chats = pd.factorize(df_ddc["ID Chat"])
+        chats = chats.astype(object)
 
         # Identificar Marcas de Tiempo de Agente y Crédito
-        agente_times = df_ddc[df_ddc["Tipo"] == "NOTIFICATION"].groupby("ID Chat")["Fecha Hora"].min()
+        agente_mask = (df_ddc["Tipo"] == "NOTIFICATION").to_numpy(dtype=bool)
 
-        credito_mask = (
-            df_ddc["Mensaje"].str.contains("evalúa si tienes un crédito", na=False) |
-            df_ddc["Mensaje"].str.contains("evalua si tienes un credito", na=False) |
-            df_ddc["Mensaje"].str.contains("3. evalúa", na=False) |
-            df_ddc["Mensaje"].str.contains("3. evalua", na=False)
+        if self.compact_ddc:
+            credito_mask = df_ddc.pop("Es_Trigger").to_numpy()
+            df_ddc["ID Chat"] = pd.Categorical.from_codes(chat_codes, categories=chats)
+            df_ddc["Tipo"] = df_ddc["Tipo"].astype("category")
+        else:
+            # Todos los disparadores de crédito en una sola pasada sobre Mensaje
+            credito_mask = matcher.contains(df_ddc["Mensaje"])
+
+        agente_times = self._first_time_by_chat(df_ddc["Fecha Hora"], chat_codes, len(chats), agente_mask)
+        credito_times = self._first_time_by_chat(df_ddc["Fecha Hora"], chat_codes, len(chats), credito_mask)
+        self.ddc_cortes = pd.DataFrame(
+            {"Time_Agente": agente_times, "Time_Credito": credito_times},
+            index=pd.Index(chats, name="ID Chat"),
         )
-        credito_times = df_ddc[credito_mask].groupby("ID Chat")["Fecha Hora"].min()
 
-        df_ddc["Time_Agente"] = df_ddc["ID Chat"].map(agente_times)
-        df_ddc["Time_Credito"] = df_ddc["ID Chat"].map(credito_times)
+        # Cortes expandidos a cada mensaje (en modo compacto sólo como temporales)
+        fechas = df_ddc["Fecha Hora"].array
+        agente_filas = agente_times.take(chat_codes)
+        credito_filas = credito_times.take(chat_codes)
+        if not self.compact_ddc:
+            df_ddc["Time_Agente"] = agente_filas
+            df_ddc["Time_Credito"] = credito_filas
 
-        cond_antes_agente = df_ddc["Time_Agente"].isna() | (df_ddc["Fecha Hora"] < df_ddc["Time_Agente"])
-        cond_antes_credito = df_ddc["Time_Credito"].isna() | (df_ddc["Fecha Hora"] < df_ddc["Time_Credito"])
+        cond_antes_agente = pd.Series(agente_filas.isna() | (fechas < agente_filas), index=df_ddc.index)
+        cond_antes_credito = pd.Series(credito_filas.isna() | (fechas < credito_filas), index=df_ddc.index)
+        del agente_filas, credito_filas
 
-        df_ddc["Es_Facturable"] = (cond_antes_agente & cond_antes_credito).astype(int)
+        df_ddc["Es_Facturable"] = (cond_antes_agente & cond_antes_credito).astype(self._flag_dtype())
         
         self.df_ddc = df_ddc
 
@@ -136,7 +366,62 @@ class QuinaCalculator:
         # Igual que el original: hsm_bruto - hsm_credito - 1000
         self.total_q_hsm = max(0, self.hsm_bruto - self.hsm_credito - self.META_FREE_TIER)
 
-        self._prepare_detailed_report(cond_antes_agente, cond_antes_credito)
+        self._prepare_detailed_report(chat_codes, chats, agente_times, credito_times, cond_antes_agente, cond_antes_credito)
+
+    def _process_ddc_partitioned(self, sources):
+        """
+        Igual que _process_ddc, pero sin tener el DDC completo en memoria: cada archivo se carga,
+        se reduce a banderas de agente/crédito y se reparte en particiones en disco por ID Chat.
+        No deja df_ddc; los cortes por chat quedan en ddc_cortes.
+        Cada archivo se carga completo (caché y deduplicación son por archivo), así que el pico es el
+        del DDC más grande (QuinaPartition.estimate_partitioned_bytes) aunque supere memory_budget.
+        """
+        self.ddc_mode = "particionado"
+        matcher = PatternMatcher(self.CREDITO_TRIGGERS)
+        dedup = MessageDeduplicator() if self.dedup_ddc else None
+        with PartitionSpool(self.partitions, self.spill_dir) as spool:
+            for i, source in enumerate(sources):
+                df = self._load_sources([source], "ddc")[0]
+                if dedup is not None:
+                    df = dedup.filter(df, source_name(source, i))[0]
+                spool.add(pd.DataFrame({
+                    "ID Chat": df["ID Chat"].to_numpy(dtype=object),
+                    "Fecha Hora": df["Fecha Hora"].to_numpy(),
+                    "agente": (df["Tipo"] == "NOTIFICATION").to_numpy(dtype=bool),
+                    "credito": matcher.contains(df["Mensaje"]),
+                }))
+                del df
+            ddc_view, counters = aggregate_partitions(spool.partitions(), self.partition_workers)
+        self.profiler.rows(rows_in=spool.rows, rows_out=spool.rows)
+
+        self.df_ddc = None
+        self.ddc_cortes = ddc_view[["Time_Agente", "Time_Credito"]]
+        self.ddc_duplicados = dedup.report() if dedup is not None else None
+        for name, value in counters.items():
+            setattr(self, name, value)
+        self.total_q_hsm = max(0, self.hsm_bruto - self.hsm_credito - self.META_FREE_TIER)
+
+        self._join_detail(ddc_view)
+
+    @profiled("_dedup_ddc")
+    def _dedup_ddc(self, dfs, sources):
+        """Descarta de cada DDC los mensajes que ya trajo un archivo anterior (ver QuinaDedup)"""
+        dedup = MessageDeduplicator()
+        self.profiler.rows(rows_in=sum(len(df) for df in dfs))
+        dfs = [df for df, _ in dedup.filter_many(dfs, [source_name(src, i) for i, src in enumerate(sources)])]
+        self.ddc_duplicados = dedup.report()
+        self.profiler.rows(rows_out=sum(len(df) for df in dfs))
+        return dfs
+
+    def _flag_dtype(self):
+        return np.int8 if self.compact_ddc else int
+
+    @staticmethod
+    def _first_time_by_chat(times, chat_codes, n_chats, mask):
+        """Primera marca de tiempo por código de chat entre las filas de `mask` (NaT si no hay ninguna)"""
+        mask = np.asarray(mask) & times.notna().to_numpy()
+        first = times[mask].groupby(chat_codes[mask]).min()
+        return first.reindex(range(n_chats)).array
 
     def _prepare_simple_detail(self):
         """Usado cuando no se proporcionan archivos DDC"""
@@ -150,40 +435,45 @@ class QuinaCalculator:
         df["Time_Credito"] = pd.NaT
         self.df_detalle = df
 
-    def _prepare_detailed_report(self, cond_antes_agente, cond_antes_credito):
-        # 1. Totales Facturables: Conteo de mensajes que cumplen todas las condiciones de cobro
-        ddc_counts = self.df_ddc.groupby("ID Chat")["Es_Facturable"].sum().reset_index()
-        ddc_counts.rename(columns={"Es_Facturable": "Mensajes_Facturables"}, inplace=True)
-        
-        # 2. Mensajes Bruto por Chat: Total absoluto de mensajes registrados en el periodo
-        ddc_bruto = self.df_ddc.groupby("ID Chat").size().reset_index(name="Mensajes_Bruto")
-        
-        # 3. Mensajes Post-Agente: Mensajes descartados por ocurrir después de la derivación a humano
-        self.df_ddc["Es_Post_Agente"] = (~cond_antes_agente).astype(int)
-        ddc_post_agente = self.df_ddc.groupby("ID Chat")["Es_Post_Agente"].sum().reset_index()
-        ddc_post_agente.rename(columns={"Es_Post_Agente": "Mensajes_Post_Agente"}, inplace=True)
-        
-        # 4. Mensajes Post-Crédito: Mensajes descartados por ocurrir después de la notificación de crédito
-        self.df_ddc["Es_Post_Credito"] = (cond_antes_agente & (~cond_antes_credito)).astype(int)
-        ddc_post_credito = self.df_ddc.groupby("ID Chat")["Es_Post_Credito"].sum().reset_index()
-        ddc_post_credito.rename(columns={"Es_Post_Credito": "Mensajes_Post_Credito"}, inplace=True)
-        
-        # 5. Metadatos Temporales: Marcas de tiempo de primera derivación a agente o crédito
-        ddc_meta = self.df_ddc[["ID Chat", "Time_Agente", "Time_Credito"]].groupby("ID Chat").first().reset_index()
-        
-        # Unificación de Métricas (Merge): Combinar todos los cálculos en un solo DataFrame de vista DDC
-        ddc_view = pd.merge(ddc_counts, ddc_bruto, on="ID Chat", how="left")
-        ddc_view = pd.merge(ddc_view, ddc_post_agente, on="ID Chat", how="left")
-        ddc_view = pd.merge(ddc_view, ddc_post_credito, on="ID Chat", how="left")
-        ddc_view = pd.merge(ddc_view, ddc_meta, on="ID Chat", how="left")
-        ddc_view["ID Chat"] = ddc_view["ID Chat"].astype(str)
-        
+    @profiled("_prepare_detailed_report")
+    def _prepare_detailed_report(self, chat_codes, chats, agente_times, credito_times, cond_antes_agente, cond_antes_credito):
+        """
+        Vista por chat en una sola pasada sobre los códigos enteros de `ID Chat`.
+        chat_codes/chats: resultado de pd.factorize sobre df_ddc["ID Chat"]
+        agente_times/credito_times: marcas de corte por código de chat
+        """
+        n_chats = len(chats)
+        self.profiler.rows(rows_in=len(self.df_ddc))
+        post_agente = (~cond_antes_agente).to_numpy()
+        post_credito = (cond_antes_agente & (~cond_antes_credito)).to_numpy()
+        self.df_ddc["Es_Post_Agente"] = post_agente.astype(self._flag_dtype())
+        self.df_ddc["Es_Post_Credito"] = post_credito.astype(self._flag_dtype())
+
+        # Conteos por chat: Bruto, Post-Agente, Post-Crédito y Facturables (neto)
+        ddc_view = pd.DataFrame({
+            "Mensajes_Facturables": np.bincount(chat_codes[self.df_ddc["Es_Facturable"].to_numpy() == 1], minlength=n_chats),
+            "Mensajes_Bruto": np.bincount(chat_codes, minlength=n_chats),
+            "Mensajes_Post_Agente": np.bincount(chat_codes[post_agente], minlength=n_chats),
+            "Mensajes_Post_Credito": np.bincount(chat_codes[post_credito], minlength=n_chats),
+            # Metadatos Temporales: Marcas de tiempo de primera derivación a agente o crédito
+            "Time_Agente": agente_times,
+            "Time_Credito": credito_times,
+        }, index=pd.Index(chats, name="ID Chat"))
+
+        self._join_detail(ddc_view)
+        self.profiler.rows(rows_out=len(self.df_detalle))
+
+    def _join_detail(self, ddc_view):
+        """
+        Une la vista RDC (base de conversaciones) con la vista por chat de DDC.
+        ddc_view: métricas por chat indexadas por `ID Chat`
+        """
         # Preparación de Vista RDC: Seleccionar columnas relevantes del Resumen Diario
         rdc_view = self.df_rdc[["ID Chat", "F.Inicio Chat", "Tipificación Chat", "Es_Cobrable", "Es_Credito"]].copy()
         rdc_view["ID Chat"] = rdc_view["ID Chat"].astype(str)
 
-        # Fusión Maestra: Unir información de RDC (base) con métricas detalladas de DDC
-        df_detalle = pd.merge(rdc_view, ddc_view, on="ID Chat", how="left")
+        # Fusión Maestra: Unir información de RDC (base) con métricas detalladas de DDC (búsqueda por índice)
+        df_detalle = rdc_view.join(ddc_view, on="ID Chat").reset_index(drop=True)
         
         # Limpieza de Datos: Rellenar valores nulos resultantes del merge con ceros (para enteros)
         cols_to_fill = ["Mensajes_Facturables", "Mensajes_Bruto", "Mensajes_Post_Agente", "Mensajes_Post_Credito"]
@@ -200,6 +490,21 @@ class QuinaCalculator:
             "Time_Agente", "Time_Credito"
         ]]
 
+    @profiled("_build_rollup")
+    def _build_rollup(self):
+        """Cubo día × tipificación × hora a partir de df_detalle"""
+        self.profiler.rows(rows_in=len(self.df_detalle) if self.df_detalle is not None else 0)
+        self.df_cubo = build_cube(self.df_detalle)
+        self.profiler.rows(rows_out=len(self.df_cubo))
+
+    def get_rollup(self):
+        """Cubo de agregados (ver QuinaRollup.rollup para totales por dimensión)"""
+        return self.df_cubo
+
+    def write_rollup(self, target):
+        """Persiste el cubo en Parquet (p.ej. junto a la factura, para tableros)"""
+        self.df_cubo.to_parquet(target, index=False)
+
     def get_summary(self):
         return {
             "Total HSM Final": self.total_q_hsm,
@@ -211,122 +516,101 @@ class QuinaCalculator:
             "Mensajes Credito": self.mensajes_credito
         }
 
-    def generate_excel_report(self):
-        """Genera los bytes del archivo Excel"""
-        output = io.BytesIO()
-        
-        # Lógica de Cálculo para Facturación
-        def calcular_costo_mensajes(cantidad):
-            # Cálculo de tarifa escalonada según el volumen total de mensajes
-            if cantidad <= 0: return 0.0
-            elif cantidad <= 9999: return cantidad * 0.0456
-            elif cantidad <= 99999: return cantidad * 0.0380
-            elif cantidad <= 249999: return cantidad * 0.0304
-            else: return cantidad * 0.0228
-
-        total_hsm_money = self.total_q_hsm * self.TARIFA_HSM
-        total_msg_money = calcular_costo_mensajes(self.total_q_mensajes)
-        subtotal = self.FEE_MENSUAL + total_hsm_money + total_msg_money
-        igv = subtotal * 0.18
-        total_facturar = subtotal + igv
-        
-        # Generación del Excel
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Factura"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="C00000", end_color="C00000", fill_type="solid")
-        sub_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        white_font = Font(color="FFFFFF", bold=True)
-        bold_font = Font(bold=True)
-        border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        
-        # Determinar tarifa aplicable para mostrar
-        q_mensajes = self.total_q_mensajes
-        if q_mensajes <= 9999: tarifa_msg_aplicable = 0.0456
-        elif q_mensajes <= 99999: tarifa_msg_aplicable = 0.0380
-        elif q_mensajes <= 249999: tarifa_msg_aplicable = 0.0304
-        else: tarifa_msg_aplicable = 0.0228
-
-        data = [
-            ["CONCEPTOS", "ABR / CANTIDAD", "MONTO S/", "OBSERVACIONES"],
-            ["Fee Mensual", 1, self.FEE_MENSUAL, "Fee Mensual Broker Whatsapp API Oficial"],
-            ["", "", "", ""],
-            ["CÁLCULO HSM (Detallado)", "", "", ""],
-            ["HSM Bruto (Total Conversaciones 24h)", self.hsm_bruto, "", "Antes de descuentos"],
-            ["(-) HSM Opción 3 (Evalúa tu Crédito)", -self.hsm_credito, "", "Sesiones que derivaron a crédito"],
-            ["(-) HSM Meta Free Tier", -self.META_FREE_TIER, "", "1,000 conversaciones gratuitas Meta"],
-            ["Q HSM Neto Facturable", self.total_q_hsm, "Calculado", "HSM a cobrar después de descuentos"],
-            ["Tarifa por HSM", self.TARIFA_HSM, "Tarifa", "Según adenda N° 2"],
-            ["TOTAL HSM", "", total_hsm_money, ""],
-            ["", "", "", ""],
-            ["CÁLCULO MENSAJES (Detallado)", "", "", ""],
-            ["Mensajes Bruto (Total)", self.mensajes_bruto, "", "Todos los mensajes del periodo"],
-            ["(-) Mensajes Post-Agente", -self.mensajes_agente, "", "Mensajes después de pase a humano"],
-            ["(-) Mensajes Post-Crédito", -self.mensajes_credito, "", "Mensajes después de trigger crédito"],
-            ["Q Mensajes Neto Facturable", self.total_q_mensajes, "Calculado", "Mensajes a cobrar después de descuentos"],
-            ["Tarifa por mensajes", tarifa_msg_aplicable, "Tarifa", "Tarifa escalonada aplicada al volumen"],
-            ["TOTAL MENSAJES", "", total_msg_money, ""],
-            ["", "", "", ""],
-            ["SUB TOTAL", "", subtotal, ""],
-            ["IGV (18%)", "", igv, ""],
-            ["TOTAL A FACTURAR", "", total_facturar, ""]
-        ]
+    def get_ddc_duplicates(self):
+        """Filas y mensajes repetidos descartados por archivo DDC (None si no se deduplicó)"""
+        return self.ddc_duplicados
+
+    def get_duplicate_count(self):
+        """Total de mensajes repetidos entre DDC descartados (None si no se deduplicó)"""
+        if self.ddc_duplicados is None:
+            return None
+        return int(self.ddc_duplicados["Duplicadas"].sum())
+
+    def compare_window_modes(self):
+        """
+        HSM Bruto, HSM Credito y Total HSM Final con cada modo de ventana y su diferencia
+        (ver QuinaWindows); se calcula junto con el RDC en process_data
+        """
+        if self.window_comparison is None:
+            raise ValueError("No hay RDC procesado: ejecuta process_data primero")
+        return self.window_comparison
+
+    def get_tariff(self):
+        """Tarifa vigente como escenario (ver QuinaTariffs)"""
+        return {
+            "fee_mensual": self.FEE_MENSUAL,
+            "tarifa_hsm": self.TARIFA_HSM,
+            "meta_free_tier": self.META_FREE_TIER,
+            "tramos": self.TRAMOS_MENSAJES,
+            "igv": self.IGV,
+        }
+
+    def simulate_tariffs(self, escenarios):
+        """Compara escenarios de tarifas sobre los contadores ya calculados, sin volver a procesar archivos"""
+        return simulate(self.get_summary(), escenarios, self.get_tariff())
+
+    def simulate_tariffs_daily(self, escenarios, columna="Total a Facturar"):
+        """Evolución diaria (acumulada) de la factura por escenario; requiere la auditoría por chat"""
+        if self.df_detalle is None:
+            raise ValueError("No hay auditoría por chat: ejecuta process_data (o process_increment con build_detail=True) primero")
+        return simulate_daily(daily_counters(self.df_detalle), escenarios, self.get_tariff(), columna)
+
+    def tariff_report(self, escenario):
+        """Bytes de la hoja Factura de un escenario (XLSX sin auditoría)"""
+        return scenario_report(self.get_summary(), escenario, self.get_tariff())
+
+    def get_profile(self):
+        """Mediciones por etapa de la última ejecución (vacío si la instrumentación está desactivada)"""
+        return self.profiler
+
+    def report_fingerprint(self):
+        """
+        Huella (hex) de todo lo que determina los reportes: contadores del resumen, tarifa, filas por hoja
+        de auditoría y df_detalle. Dos cálculos con la misma huella producen los mismos archivos.
+        """
+        if self.huella_reportes is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(repr(sorted((k, int(v)) for k, v in self.get_summary().items())).encode())
+            h.update(repr((sorted(self.get_tariff().items()), self.AUDIT_MAX_ROWS)).encode())
+            if self.df_detalle is not None:
+                h.update(repr(list(self.df_detalle.columns)).encode())
+                h.update(pd.util.hash_pandas_object(self.df_detalle, index=False).to_numpy().tobytes())
+            self.huella_reportes = h.hexdigest()
+        return self.huella_reportes
+
+    def _audit_rows(self):
+        return len(self.df_detalle) if self.df_detalle is not None else 0
+
+    @profiled("generate_excel_report")
+    def generate_excel_report(self, include_audit=True):
+        """Genera los bytes del archivo Excel (include_audit=False: sólo la hoja Factura)"""
+        self.profiler.rows(rows_in=self._audit_rows() if include_audit else 0)
+        return report_bytes(self.get_summary(), self.df_detalle, self.FEE_MENSUAL, self.TARIFA_HSM, self.META_FREE_TIER,
+                            include_audit=include_audit, max_rows=self.AUDIT_MAX_ROWS,
+                            tramos=self.TRAMOS_MENSAJES, tasa_igv=self.IGV, duplicados=self.get_duplicate_count())
+
+    @profiled("generate_excel_report")
+    def write_excel_report(self, target, include_audit=True):
+        """Escribe el archivo Excel directamente en `target` (ruta o archivo binario) sin pasar por memoria"""
+        self.profiler.rows(rows_in=self._audit_rows() if include_audit else 0)
+        write_report(target, self.get_summary(), self.df_detalle, self.FEE_MENSUAL, self.TARIFA_HSM, self.META_FREE_TIER,
+                     include_audit=include_audit, max_rows=self.AUDIT_MAX_ROWS,
+                     tramos=self.TRAMOS_MENSAJES, tasa_igv=self.IGV, duplicados=self.get_duplicate_count())
+
+    @profiled("export_auditoria")
+    def generate_audit_export(self, fmt="csv.gz"):
+        """Bytes de la auditoría completa en un solo archivo "csv.gz" o "parquet" (sin límite de filas)"""
+        self.profiler.rows(rows_in=self._audit_rows())
+        return audit_bytes(self.df_detalle, fmt)
+
+    @profiled("export_auditoria")
+    def write_audit_export(self, target, fmt="csv.gz"):
+        """Escribe la auditoría completa en `target` (formato "csv.gz" o "parquet")"""
+        self.profiler.rows(rows_in=self._audit_rows())
+        write_audit_table(target, self.df_detalle, fmt)
 
-        for i, row in enumerate(data, start=1):
-            for j, val in enumerate(row, start=1):
-                cell = ws.cell(row=i, column=j, value=val)
-                cell.border = border
-                if isinstance(val, (int, float)) and i > 1 and j == 3: cell.number_format = '"S/ " #,##0.00'
-                if i == 1:
-                    cell.fill = header_fill
-                    cell.font = white_font
-                    cell.alignment = Alignment(horizontal='center')
-                if row[0] in ["Fee Mensual", "TOTAL HSM", "TOTAL MENSAJES"] and j in [1,2,3]:
-                    cell.fill = sub_fill
-                if row[0] in ["SUB TOTAL", "TOTAL A FACTURAR"] or row[0] in ["CÁLCULO HSM (Detallado)", "CÁLCULO MENSAJES (Detallado)"]:
-                    cell.font = bold_font
-
-        ws.column_dimensions['A'].width = 35
-        ws.column_dimensions['B'].width = 18
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 50
-
-        # Hoja 2: Detalle de Auditoría - Generación de tabla con desglose detallado por chat
-        if self.df_detalle is not None and not self.df_detalle.empty:
-            ws2 = wb.create_sheet("Detalle Auditoría")
-            headers = [
-                "ID Chat", "Fecha (Día)", "F.Inicio (RDC)", "Tipificación Chat",
-                "Es HSM Bruto? (1=Sí)", "Tuvo Crédito? (1=Sí)",
-                "Mensajes Bruto", "(-) Mensajes Post-Agente", "(-) Mensajes Post-Crédito",
-                "Mensajes Facturables (Neto)", "Fecha Corte Agente", "Fecha Corte Crédito"
-            ]
-            
-            for col, h in enumerate(headers, 1):
-                cell = ws2.cell(row=1, column=col, value=h)
-                cell.fill = header_fill
-                cell.font = white_font
-                cell.alignment = Alignment(horizontal='center')
-            
-            rows = self.df_detalle.values.tolist()
-            for i, row_data in enumerate(rows, start=2):
-                for j, val in enumerate(row_data, 1):
-                    cell = ws2.cell(row=i, column=j, value=val)
-                    if j == 1: cell.number_format = '@'
-
-            ws2.column_dimensions['A'].width = 25
-            ws2.column_dimensions['B'].width = 12
-            ws2.column_dimensions['C'].width = 20
-            ws2.column_dimensions['D'].width = 30
-            ws2.column_dimensions['E'].width = 18
-            ws2.column_dimensions['F'].width = 18
-            ws2.column_dimensions['G'].width = 15
-            ws2.column_dimensions['H'].width = 22
-            ws2.column_dimensions['I'].width = 22
-            ws2.column_dimensions['J'].width = 20
-            ws2.column_dimensions['K'].width = 20
-            ws2.column_dimensions['L'].width = 20
-
-        wb.save(output)
-        return output.getvalue()
+    @profiled("export_auditoria")
+    def write_audit_workbooks(self, directory, prefix="Detalle_Auditoria"):
+        """Escribe la auditoría en libros XLSX separados de AUDIT_MAX_ROWS filas; devuelve las rutas"""
+        self.profiler.rows(rows_in=self._audit_rows())
+        return write_audit_workbooks(directory, self.df_detalle, self.AUDIT_MAX_ROWS, prefix)
@@ -0,0 +1,158 @@
+# Procesamiento del DDC fuera de memoria: las filas se reparten en N particiones en disco por hash de `ID Chat`.
+# Todas las reglas (corte por agente, corte por crédito, conteos facturables) son locales a cada chat,
+# así que cada partición se procesa por separado y los agregados por chat se concatenan al final.
+# Límite: cada archivo DDC se carga completo (como en memoria, con caché y deduplicación por archivo) antes de
+# repartirlo, así que el pico es el del archivo más grande (estimate_partitioned_bytes); un mes en un solo
+# archivo enorme no baja del tamaño de ese archivo, conviene exportarlo en varios.
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from QuinaLoader import detect_format
+
+# Factor aproximado entre el tamaño del archivo y su DataFrame en memoria, por formato
+EXPANSION = {"xlsx": 8, "csv": 3, "csv.gz": 15, "zip": 15, "parquet": 10}
+# Factor entre el DataFrame cargado y el pico de _process_ddc (concat, máscaras, columnas derivadas)
+PROCESS_OVERHEAD = 3
+
+SPILL_COLUMNS = ["ID Chat", "Fecha Hora", "agente", "credito"]
+
+
+def _source_bytes(source):
+    """Memoria aproximada del DataFrame de un archivo DDC ya cargado"""
+    if isinstance(source, pd.DataFrame):
+        return int(source.memory_usage(deep=True).sum())
+    factor = EXPANSION[detect_format(source)]
+    if isinstance(source, (bytes, bytearray)):
+        return len(source) * factor
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source) * factor
+    if getattr(source, "size", None) is not None:  # UploadedFile de Streamlit
+        return source.size * factor
+    pos = source.tell()
+    source.seek(0, os.SEEK_END)
+    total = (source.tell() - pos) * factor
+    source.seek(pos)
+    return total
+
+
+def estimate_ddc_bytes(sources):
+    """Memoria estimada que ocuparía el DDC completo dentro de _process_ddc"""
+    return sum(_source_bytes(source) for source in sources) * PROCESS_OVERHEAD
+
+
+def estimate_partitioned_bytes(sources):
+    """
+    Memoria estimada del modo particionado: cada archivo se carga completo antes de repartirlo,
+    así que el pico es el del archivo más grande, no el del presupuesto.
+    """
+    return max((_source_bytes(source) for source in sources), default=0) * PROCESS_OVERHEAD
+
+
+def partition_of(chat_ids, n_partitions):
+    """Número de partición de cada fila (hash estable de `ID Chat`)"""
+    return (pd.util.hash_array(np.asarray(chat_ids, dtype=object)) % np.uint64(n_partitions)).astype(np.int64)
+
+
+class PartitionSpool:
+    """
+    Directorio temporal con N particiones; cada bloque recibido se reparte y se escribe en disco.
+    Se usa como context manager: el directorio se borra al salir.
+    """
+
+    def __init__(self, n_partitions, spill_dir=None):
+        self.n_partitions = n_partitions
+        self.path = tempfile.mkdtemp(prefix="quina_particiones_", dir=spill_dir)
+        self.files = [[] for _ in range(n_partitions)]
+        self.blocks = 0
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def add(self, df):
+        """df: bloque con SPILL_COLUMNS (Mensaje y Tipo ya reducidos a banderas)"""
+        self.rows += len(df)
+        partes = partition_of(df["ID Chat"].to_numpy(), self.n_partitions)
+        orden = np.argsort(partes, kind="stable")
+        limites = np.searchsorted(partes[orden], np.arange(self.n_partitions + 1))
+        bloque = self.blocks
+        self.blocks += 1
+        for p in range(self.n_partitions):
+            filas = orden[limites[p]:limites[p + 1]]
+            if len(filas) == 0:
+                continue
+            ruta = os.path.join(self.path, f"p{p:04d}_{bloque:05d}.pkl")
+            df.iloc[filas].to_pickle(ruta)
+            self.files[p].append(ruta)
+
+    def partitions(self):
+        return self.files
+
+
+def aggregate_partition(paths):
+    """
+    Agregados por chat de una partición (mismas reglas que QuinaCalculator._process_ddc).
+    Devuelve (vista por chat indexada por `ID Chat`, contadores)
+    """
+    from QuinaLogic import QuinaCalculator
+
+    if paths:
+        df = pd.concat([pd.read_pickle(p) for p in paths], ignore_index=True)
+    else:
+        df = pd.DataFrame({
+            "ID Chat": pd.Series(dtype=object),
+            "Fecha Hora": pd.Series(dtype="datetime64[ns]"),
+            "agente": pd.Series(dtype=bool),
+            "credito": pd.Series(dtype=bool),
+        })
+    chat_codes, chats = pd.factorize(df["ID Chat"])
+    n_chats = len(chats)
+    fechas = df["Fecha Hora"]
+
+    agente_times = QuinaCalculator._first_time_by_chat(fechas, chat_codes, n_chats, df["agente"].to_numpy())
+    credito_times = QuinaCalculator._first_time_by_chat(fechas, chat_codes, n_chats, df["credito"].to_numpy())
+    agente_filas = agente_times.take(chat_codes)
+    credito_filas = credito_times.take(chat_codes)
+    antes_agente = np.asarray(agente_filas.isna() | (fechas.array < agente_filas))
+    antes_credito = np.asarray(credito_filas.isna() | (fechas.array < credito_filas))
+
+    facturable = antes_agente & antes_credito
+    post_agente = ~antes_agente
+    post_credito = antes_agente & ~antes_credito
+
+    view = pd.DataFrame({
+        "Mensajes_Facturables": np.bincount(chat_codes[facturable], minlength=n_chats),
+        "Mensajes_Bruto": np.bincount(chat_codes, minlength=n_chats),
+        "Mensajes_Post_Agente": np.bincount(chat_codes[post_agente], minlength=n_chats),
+        "Mensajes_Post_Credito": np.bincount(chat_codes[post_credito], minlength=n_chats),
+        "Time_Agente": agente_times,
+        "Time_Credito": credito_times,
+    }, index=pd.Index(chats, name="ID Chat", dtype=object))
+    counters = {
+        "total_q_mensajes": int(facturable.sum()),
+        "mensajes_bruto": len(df),
+        "mensajes_agente": int(post_agente.sum()),
+        "mensajes_credito": int(post_credito.sum()),
+    }
+    return view, counters
+
+
+def aggregate_partitions(partitions, workers=1):
+    """Procesa todas las particiones y une sus vistas y contadores"""
+    if workers > 1 and len(partitions) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as pool:
+            resultados = list(pool.map(aggregate_partition, partitions))
+    else:
+        resultados = [aggregate_partition(p) for p in partitions]
+
+    view = pd.concat([v for v, _ in resultados])
+    counters = {k: sum(c[k] for _, c in resultados) for k in resultados[0][1]}
+    return view, counters
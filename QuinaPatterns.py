@@ -0,0 +1,68 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+
+def factorize_values(series):
+    """Códigos enteros y valores distintos de una columna (usa las categorías si ya es categórica)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    return pd.factorize(series)
+
+
+def map_unique(series, func):
+    """
+    Aplica `func` (Series -> Series) sólo sobre los valores distintos de la columna
+    y propaga el resultado a todas las filas. Pensado para columnas de baja cardinalidad.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = func(pd.Series(uniques, dtype=object))
+    return pd.Series(mapped.to_numpy()[codes], index=series.index, name=series.name)
+
+
+class PatternMatcher:
+    """
+    Detector de varios disparadores compilados en una sola expresión regular.
+    patterns: lista de patrones (misma sintaxis que Series.str.contains, sin distinguir mayúsculas)
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.regex = None
+        if self.patterns:
+            self.regex = re.compile("|".join(f"(?:{p})" for p in self.patterns), re.IGNORECASE)
+
+    def contains(self, series):
+        """Máscara booleana de filas que contienen algún patrón, en una sola pasada sobre la columna"""
+        if self.regex is None:
+            return np.zeros(len(series), dtype=bool)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return self.contains_unique(series)
+        if isinstance(series.dtype, pd.ArrowDtype):
+            hits = self._contains_arrow(series)
+            if hits is not None:
+                return hits
+        return series.str.contains(self.regex, na=False).to_numpy(dtype=bool)
+
+    def _contains_arrow(self, series):
+        """Columna de texto Arrow: búsqueda con el kernel RE2 de Arrow (None si el patrón no es compatible con RE2)"""
+        try:
+            hits = pc.match_substring_regex(pa.array(series.array), self.regex.pattern, ignore_case=True)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+        return pc.fill_null(hits, False).to_numpy(zero_copy_only=False)
+
+    def contains_unique(self, series):
+        """Igual que `contains`, pero evaluando sólo los valores distintos (columnas de baja cardinalidad)"""
+        if self.regex is None:
+            return np.zeros(len(series), dtype=bool)
+        codes, uniques = factorize_values(series)
+        hits = pd.Series(uniques).astype(str).str.contains(self.regex, na=False).to_numpy(dtype=bool)
+        # El código -1 (valor nulo) toma la última posición: nunca coincide
+        return np.append(hits, False)[codes]
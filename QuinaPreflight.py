@@ -0,0 +1,535 @@
+# Revisión previa (preflight) de los archivos RDC/DDC antes del cálculo: cada archivo se abre sin cargarlo
+# y se leen sólo el encabezado y una muestra de filas, así que toma lo mismo con 10 mil o 10 millones de filas.
+#   - columnas requeridas faltantes (las que usan _process_rdc y _process_ddc)
+#   - DDC de un periodo distinto al del RDC y DDC que se solapan en fechas
+#   - filas estimadas (dimensión de la hoja, metadatos o tamaño / bytes por fila) para elegir entre
+#     procesar el DDC en memoria o particionado
+# Las fechas salen de la muestra inicial (XLSX, CSV.GZ, ZIP), de la muestra inicial y el final del archivo (CSV)
+# o de las estadísticas de los metadatos (Parquet, exactas). Un periodo distinto sólo detiene el cálculo si
+# ambos rangos cubren el archivo completo; visto sólo en la muestra inicial es una advertencia que la
+# aplicación web pide confirmar antes de calcular (PreflightReport.confirmaciones).
+import csv
+import gzip
+import io
+import itertools
+import os
+import posixpath
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # sin pyarrow no se leen archivos Parquet (igual que QuinaLoader)
+    pq = None
+
+from QuinaLoader import (RDC_COLUMNS, DDC_COLUMNS, DATE_FORMATS, FORMATS, _convert_cell, _csv_header,
+                         _open_binary, detect_format)
+from QuinaPartition import PROCESS_OVERHEAD
+from QuinaDedup import source_name
+
+# Columnas requeridas y columna de fecha por tipo de archivo
+REQUIRED = {"RDC": RDC_COLUMNS, "DDC": DDC_COLUMNS}
+DATE_COLUMN = {"RDC": "F.Inicio Chat", "DDC": "Fecha Hora"}
+
+# Origen de las fechas que cubre el archivo completo (no sólo sus primeras filas)
+FECHAS_COMPLETAS = {"exactas", "todas las filas", "muestra y final"}
+
+# Filas de muestra por archivo (después del encabezado)
+SAMPLE_ROWS = 500
+# Bloque de lectura del XML de la hoja y bytes leídos del final de un CSV
+CHUNK_BYTES = 64 * 1024
+TAIL_BYTES = 256 * 1024
+
+COLUMNS = ["Archivo", "Tipo", "Formato", "Filas Estimadas", "Estimación", "Desde", "Hasta", "Fechas",
+           "Columnas Faltantes", "Error"]
+
+
+def _local(tag):
+    """Nombre sin espacio de nombres de una etiqueta o atributo XML"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _xlsx_rels(zf, path):
+    """Relaciones de una parte del libro: Id -> (tipo, ruta dentro del ZIP)"""
+    carpeta, nombre = posixpath.split(path)
+    ruta_rels = posixpath.join(carpeta, "_rels", nombre + ".rels")
+    if ruta_rels not in zf.NameToInfo:
+        return {}
+    rels = {}
+    for rel in ET.fromstring(zf.read(ruta_rels)):
+        target = rel.get("Target", "")
+        destino = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(carpeta, target))
+        rels[rel.get("Id")] = (rel.get("Type", "").rsplit("/", 1)[-1], destino)
+    return rels
+
+
+def _xlsx_layout(zf):
+    """(ruta de la primera hoja, ruta de los textos compartidos o None, fechas en sistema 1904)"""
+    libro = next((ruta for tipo, ruta in _xlsx_rels(zf, "").values() if tipo == "officeDocument"),
+                 "xl/workbook.xml")
+    rels = _xlsx_rels(zf, libro)
+    hoja, date1904 = None, False
+    for elem in ET.fromstring(zf.read(libro)).iter():
+        nombre = _local(elem.tag)
+        if nombre == "workbookPr":
+            date1904 = elem.get("date1904") in ("1", "true")
+        elif nombre == "sheet" and hoja is None:
+            rid = next(v for k, v in elem.attrib.items() if _local(k) == "id")
+            hoja = rels[rid][1]
+    if hoja is None:
+        raise ValueError("El libro no contiene hojas")
+    compartidos = next((ruta for tipo, ruta in rels.values() if tipo == "sharedStrings"), None)
+    return hoja, compartidos, date1904
+
+
+def _column_index(ref):
+    """'C12' -> 2"""
+    idx = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        idx = idx * 26 + ord(ch.upper()) - 64
+    return idx - 1
+
+
+def _cell_value(elem):
+    """Valor crudo de una celda <c>; los textos compartidos quedan como ("s", índice)"""
+    tipo = elem.get("t", "n")
+    if tipo == "inlineStr":
+        return "".join(x.text or "" for x in elem.iter() if _local(x.tag) == "t")
+    v = next((x.text for x in elem if _local(x.tag) == "v"), None)
+    if v is None:
+        return None
+    if tipo == "s":
+        return ("s", int(v))
+    if tipo in ("str", "e"):
+        return v
+    if tipo == "b":
+        return v == "1"
+    if tipo == "d":
+        return pd.Timestamp(v)
+    return float(v)
+
+
+def _xlsx_head(zf, hoja, n_rows):
+    """
+    Encabezado y primeras `n_rows` filas no vacías de la hoja, leyendo el XML en bloques hasta tenerlas.
+    Devuelve (filas, número de la fila de encabezado, última fila según <dimension>, filas estimadas por
+    tamaño del XML o None, hoja leída completa)
+    """
+    filas, encabezado, ultima, vistas, leidos = [], None, None, 0, 0
+    completa = False
+    fila, pos = {}, 0
+    parser = ET.XMLPullParser(events=("start", "end"))
+    with zf.open(hoja) as stream:
+        while len(filas) <= n_rows:
+            chunk = stream.read(CHUNK_BYTES)
+            if not chunk:
+                completa = True
+                break
+            leidos += len(chunk)
+            parser.feed(chunk)
+            for evento, elem in parser.read_events():
+                nombre = _local(elem.tag)
+                if evento == "start":
+                    if nombre == "dimension":
+                        ref = elem.get("ref", "").split(":")[-1]
+                        digitos = "".join(ch for ch in ref if ch.isdigit())
+                        ultima = int(digitos) if ":" in elem.get("ref", "") and digitos else None
+                    elif nombre == "row":
+                        fila, pos = {}, 0
+                elif nombre == "c":
+                    ref = elem.get("r")
+                    col = _column_index(ref) if ref else pos
+                    pos = col + 1
+                    valor = _cell_value(elem)
+                    if valor is not None and valor != "":
+                        fila[col] = valor
+                elif nombre == "row":
+                    vistas += 1
+                    if fila and len(filas) <= n_rows:
+                        if encabezado is None:
+                            encabezado = int(elem.get("r", vistas))
+                        filas.append(fila)
+                    elem.clear()
+        size = zf.getinfo(hoja).file_size
+    estimadas = None
+    if not completa and vistas and encabezado is not None:
+        estimadas = int(size * vistas / leidos) - encabezado
+    return filas, encabezado, ultima, estimadas, completa
+
+
+def _shared_strings(zf, ruta, hasta):
+    """Textos compartidos 0..hasta: sharedStrings.xml se recorre sólo hasta ese índice"""
+    textos = []
+    if ruta is None or hasta < 0:
+        return textos
+    with zf.open(ruta) as stream:
+        for _, elem in ET.iterparse(stream, events=("end",)):
+            if _local(elem.tag) != "si":
+                continue
+            # Texto simple (<t>) o enriquecido (<r><t>); se omite la fonética (<rPh>)
+            partes = [x for x in elem if _local(x.tag) == "t"]
+            partes += [t for r in elem if _local(r.tag) == "r" for t in r if _local(t.tag) == "t"]
+            textos.append("".join(x.text or "" for x in partes))
+            elem.clear()
+            if len(textos) > hasta:
+                break
+    return textos
+
+
+def _scan_xlsx(f, n_rows):
+    with zipfile.ZipFile(f) as zf:
+        hoja, compartidos, date1904 = _xlsx_layout(zf)
+        filas, encabezado, ultima, estimadas, completa = _xlsx_head(zf, hoja, n_rows)
+        if not filas:
+            raise ValueError("El archivo no contiene una fila de encabezados")
+        indices = [v[1] for fila in filas for v in fila.values() if isinstance(v, tuple)]
+        textos = _shared_strings(zf, compartidos, max(indices, default=-1))
+
+    def valor(v):
+        return textos[v[1]] if isinstance(v, tuple) else v
+
+    ancho = max(max(fila) for fila in filas) + 1
+    tabla = [[valor(fila.get(i)) for i in range(ancho)] for fila in filas]
+    lectura = {"header": tabla[0], "filas": [[_convert_cell(v) for v in fila] for fila in tabla[1:]],
+               "date1904": date1904}
+    if completa:
+        lectura["conteo"] = (len(lectura["filas"]), "exacta")
+        lectura["fechas"] = "todas las filas"
+    elif ultima is not None and ultima > encabezado:
+        lectura["conteo"] = (ultima - encabezado, "dimensión de la hoja")
+    else:
+        lectura["conteo"] = (estimadas, "tamaño de la hoja")
+    return lectura
+
+
+def _scan_csv(stream, n_rows, size=None, tail=None):
+    """
+    stream: CSV binario ya descomprimido; size: bytes descomprimidos totales (None = desconocido)
+    tail: (archivo con seek, tamaño) para leer también el final del CSV
+    """
+    primera = stream.readline()
+    sep, header = _csv_header(io.BytesIO(primera))
+    leidos = 0
+
+    def lineas():
+        nonlocal leidos
+        for linea in iter(stream.readline, b""):
+            leidos += len(linea)
+            yield linea.decode("utf-8", errors="replace")
+
+    filas = [fila for fila in itertools.islice(csv.reader(lineas(), delimiter=sep), n_rows) if fila]
+    lectura = {"header": header, "filas": filas, "leidos": leidos, "conteo": (None, None)}
+    completa = not stream.readline()
+    if completa:
+        lectura["conteo"] = (len(filas), "exacta")
+        lectura["fechas"] = "todas las filas"
+    elif size is not None and filas:
+        lectura["conteo"] = (int((size - len(primera)) * len(filas) / leidos), "tamaño del archivo")
+
+    if tail is not None and not completa:
+        # Sólo para las fechas: las primeras filas y las últimas suelen cubrir el periodo completo
+        f, total = tail
+        f.seek(max(len(primera) + leidos, total - TAIL_BYTES))
+        bloque = f.read().split(b"\n", 1)[-1].decode("utf-8", errors="replace")
+        lectura["final"] = [fila for fila in csv.reader(bloque.splitlines(), delimiter=sep) if len(fila) == len(header)]
+        lectura["fechas"] = "muestra y final"
+    return lectura
+
+
+def _gzip_size(f, minimo):
+    """Tamaño descomprimido según el pie del gzip (módulo 2^32; se corrige con lo ya leído)"""
+    f.seek(-4, os.SEEK_END)
+    size = struct.unpack("<I", f.read(4))[0]
+    while size < minimo:
+        size += 2 ** 32
+    return size
+
+
+def _scan_parquet(f, n_rows, columnas):
+    if pq is None:
+        raise ValueError("Leer archivos Parquet requiere pyarrow")
+    pf = pq.ParquetFile(f)
+    header = pf.schema_arrow.names
+    presentes = [c for c in columnas if c in header]
+    lote = next(pf.iter_batches(batch_size=n_rows, columns=presentes), None) if presentes else None
+    muestra = lote.to_pandas() if lote is not None else pd.DataFrame(columns=presentes)
+
+    # Mínimo y máximo exactos de cada columna según las estadísticas de cada grupo de filas
+    extremos = {}
+    meta = pf.metadata
+    for i in range(meta.num_row_groups):
+        grupo = meta.row_group(i)
+        for j in range(grupo.num_columns):
+            columna = grupo.column(j)
+            stats = columna.statistics
+            if stats is not None and stats.has_min_max:
+                extremos.setdefault(columna.path_in_schema, []).extend([stats.min, stats.max])
+    return {"header": header, "muestra": muestra, "conteo": (meta.num_rows, "exacta"), "extremos": extremos,
+            "fechas": "exactas"}
+
+
+def _scan_zip(f, n_rows, columnas):
+    """ZIP con un archivo de datos: se inspecciona el primero que aparezca, como read_zip_columns"""
+    with zipfile.ZipFile(f) as zf:
+        members = [m for m in zf.namelist()
+                   if not m.endswith("/") and FORMATS.get(os.path.splitext(m.lower())[1]) not in (None, "zip")]
+        if not members:
+            raise ValueError("El archivo ZIP no contiene archivos CSV, XLSX o Parquet")
+        member = members[0]
+        fmt = FORMATS[os.path.splitext(member.lower())[1]]
+        with zf.open(member) as stream:
+            if fmt == "csv":
+                return _scan_csv(stream, n_rows, zf.getinfo(member).file_size)
+            if fmt == "csv.gz":
+                return _scan_csv(gzip.GzipFile(fileobj=stream), n_rows)
+            if fmt == "xlsx":
+                return _scan_xlsx(stream, n_rows)
+            return _scan_parquet(stream, n_rows, columnas)
+
+
+def _as_dates(valores, date1904=False):
+    """Fechas de una muestra (NaT si no se reconocen): seriales de Excel, textos (DATE_FORMATS o inferidos) y fechas"""
+    s = pd.Series(list(valores), dtype=object)
+    fechas = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    numeros = s.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+    if numeros.any():
+        origen = "1904-01-01" if date1904 else "1899-12-30"
+        fechas[numeros] = pd.to_datetime(s[numeros].astype(float), unit="D", origin=origen).dt.round("ms")
+    textos = s.map(lambda v: isinstance(v, str))
+    if textos.any():
+        texto = s[textos]
+        leidas = pd.Series(pd.NaT, index=texto.index, dtype="datetime64[ns]")
+        for fmt in DATE_FORMATS:
+            leidas = leidas.fillna(pd.to_datetime(texto, format=fmt, errors="coerce"))
+        fechas[textos] = leidas.fillna(pd.to_datetime(texto, format="mixed", errors="coerce"))
+    tipadas = ~numeros & ~textos & s.notna()
+    if tipadas.any():
+        fechas[tipadas] = pd.to_datetime(s[tipadas], errors="coerce")
+    return fechas
+
+
+def _positions(header):
+    """Posición de cada nombre de columna (la primera, como _resolve_columns)"""
+    posiciones = {}
+    for idx, nombre in enumerate(header):
+        posiciones.setdefault("" if nombre is None else str(nombre), idx)
+    return posiciones
+
+
+def _read(source, fmt, n_rows, columnas):
+    f = _open_binary(source)
+    try:
+        if fmt == "xlsx":
+            return _scan_xlsx(f, n_rows)
+        if fmt == "parquet":
+            return _scan_parquet(f, n_rows, columnas)
+        if fmt == "zip":
+            return _scan_zip(f, n_rows, columnas)
+        if fmt == "csv.gz":
+            stream = gzip.GzipFile(fileobj=f)
+            lectura = _scan_csv(stream, n_rows)
+            if lectura["conteo"][1] is None and lectura["filas"]:
+                # El pie del gzip da el tamaño descomprimido sin leer el archivo entero
+                size = _gzip_size(f, stream.tell())
+                lectura["conteo"] = (int(size * len(lectura["filas"]) / lectura["leidos"]), "tamaño descomprimido")
+            return lectura
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(0)
+        return _scan_csv(f, n_rows, size, (f, size))
+    finally:
+        if f is not source:
+            f.close()
+        else:
+            f.seek(0)
+
+
+def scan_file(source, kind, name=None, sample_rows=SAMPLE_ROWS):
+    """
+    Inspección rápida de un archivo RDC o DDC (kind: "RDC" o "DDC") sin cargarlo: ruta, archivo binario,
+    bytes o DataFrame. Devuelve un registro con las claves de COLUMNS, el encabezado y "Bytes por Fila"
+    (memoria por fila de la muestra cargada, para estimar el DDC completo).
+    """
+    columnas, fecha = REQUIRED[kind], DATE_COLUMN[kind]
+    registro = dict.fromkeys(COLUMNS)
+    registro.update({"Archivo": name or source_name(source, 0), "Tipo": kind, "Columnas Faltantes": [],
+                     "Encabezado": [], "Bytes por Fila": None})
+    try:
+        if isinstance(source, pd.DataFrame):
+            registro["Formato"] = "DataFrame"
+            lectura = {"header": list(source.columns), "muestra": source.head(sample_rows),
+                       "conteo": (len(source), "exacta")}
+            if fecha in source.columns and pd.api.types.is_datetime64_any_dtype(source[fecha]):
+                lectura["extremos"] = {fecha: [source[fecha].min(), source[fecha].max()]}
+                lectura["fechas"] = "exactas"
+        else:
+            registro["Formato"] = detect_format(source)
+            lectura = _read(source, registro["Formato"], sample_rows, columnas)
+    except Exception as e:
+        registro["Error"] = f"No se pudo leer el archivo: {e}"
+        return registro
+
+    posiciones = _positions(lectura["header"])
+    registro["Encabezado"] = list(posiciones)
+    registro["Columnas Faltantes"] = [c for c in columnas if c not in posiciones]
+    registro["Filas Estimadas"], registro["Estimación"] = lectura["conteo"]
+
+    muestra = lectura.get("muestra")
+    if muestra is None:
+        presentes = [c for c in columnas if c in posiciones]
+        muestra = pd.DataFrame([[fila[posiciones[c]] if posiciones[c] < len(fila) else None for c in presentes]
+                                for fila in lectura["filas"]], columns=presentes)
+    else:
+        muestra = muestra[[c for c in columnas if c in muestra.columns]]
+
+    if fecha in muestra.columns:
+        date1904 = lectura.get("date1904", False)
+        extra = list(lectura.get("extremos", {}).get(fecha, []))
+        extra += [fila[posiciones[fecha]] for fila in lectura.get("final", [])]
+        fechas = _as_dates(list(muestra[fecha]) + extra, date1904)
+        if fechas.notna().any():
+            registro["Desde"], registro["Hasta"] = fechas.min(), fechas.max()
+            registro["Fechas"] = lectura.get("fechas", "muestra")
+        muestra = muestra.assign(**{fecha: _as_dates(muestra[fecha], date1904).to_numpy()})
+
+    if not registro["Columnas Faltantes"] and len(muestra):
+        registro["Bytes por Fila"] = float(muestra.memory_usage(deep=True, index=False).sum()) / len(muestra)
+    return registro
+
+
+def _months(desde, hasta):
+    return set(pd.period_range(desde, hasta, freq="M").astype(str))
+
+
+def _same_source(a, b):
+    if isinstance(a, (str, os.PathLike)) and isinstance(b, (str, os.PathLike)):
+        return os.fspath(a) == os.fspath(b)
+    return a is b
+
+
+class PreflightReport:
+    """
+    Resultado de preflight: un registro por archivo (ver to_frame), errores que impiden calcular
+    (columnas faltantes, archivos ilegibles, DDC de otro periodo) y advertencias (solapamientos, fechas
+    no reconocidas). ddc_bytes: memoria estimada del DDC dentro de _process_ddc (None si algún archivo
+    no permite estimarla; entonces se usa QuinaPartition.estimate_ddc_bytes). ddc_max_bytes: la del DDC más grande,
+    el pico del modo particionado (que carga cada archivo completo antes de repartirlo).
+    confirmaciones: las advertencias que conviene confirmar antes de calcular (DDC que en la muestra parece
+    de otro periodo); también están en `advertencias`.
+    """
+
+    def __init__(self, archivos, errores, advertencias, ddc_sources, ddc_bytes, confirmaciones=None,
+                 ddc_max_bytes=None):
+        self.archivos = archivos
+        self.errores = errores
+        self.advertencias = advertencias
+        self.confirmaciones = confirmaciones or []
+        self.ddc_sources = ddc_sources
+        self.ddc_bytes = ddc_bytes
+        self.ddc_max_bytes = ddc_max_bytes
+
+    @property
+    def ok(self):
+        return not self.errores
+
+    def check(self):
+        """Lanza ValueError con todos los errores encontrados"""
+        if self.errores:
+            raise ValueError("Revisión previa de archivos: " + "; ".join(self.errores))
+        return self
+
+    def covers(self, sources):
+        """True si el reporte se hizo sobre exactamente estos DDC (rutas iguales o los mismos objetos)"""
+        sources = [sources] if isinstance(sources, pd.DataFrame) else list(sources or [])
+        return len(sources) == len(self.ddc_sources) and all(map(_same_source, sources, self.ddc_sources))
+
+    def ddc_mode(self, memory_budget):
+        """"memoria" o "particionado" según `memory_budget` (bytes; None = siempre en memoria), None si no se estimó"""
+        if memory_budget is None:
+            return "memoria"
+        if self.ddc_bytes is None:
+            return None
+        return "particionado" if self.ddc_bytes > memory_budget else "memoria"
+
+    def to_frame(self):
+        tabla = pd.DataFrame(self.archivos, columns=COLUMNS)
+        tabla["Filas Estimadas"] = tabla["Filas Estimadas"].astype("Int64")
+        tabla["Columnas Faltantes"] = tabla["Columnas Faltantes"].map(", ".join)
+        return tabla
+
+
+def preflight(rdc_source, ddc_sources, rdc_name=None, ddc_names=None, sample_rows=SAMPLE_ROWS, memory_budget=None):
+    """
+    Revisa el RDC y los DDC antes de procesarlos (ver scan_file) y cruza sus fechas.
+    rdc_name/ddc_names: nombres para los mensajes (p.ej. los de los archivos subidos)
+    Un DDC cuyos meses no coinciden con ninguno del RDC es un error si ambas fechas cubren el archivo
+    completo (FECHAS_COMPLETAS) y una advertencia a confirmar si salen sólo de la muestra inicial; dos DDC con fechas
+    que se cruzan son una advertencia (los mensajes repetidos se descartan al deduplicar).
+    memory_budget: presupuesto del DDC (bytes); advierte de los archivos que solos lo superan, porque incluso
+    particionado cada archivo se carga completo.
+    """
+    if isinstance(ddc_sources, pd.DataFrame):
+        ddc_sources = [ddc_sources]
+    ddc_sources = list(ddc_sources or [])
+    ddc_names = list(ddc_names) if ddc_names else [source_name(s, i) for i, s in enumerate(ddc_sources)]
+    rdc = scan_file(rdc_source, "RDC", rdc_name, sample_rows)
+    ddcs = [scan_file(s, "DDC", n, sample_rows) for s, n in zip(ddc_sources, ddc_names)]
+
+    errores, advertencias, confirmaciones, validos = [], [], [], []
+    for registro in [rdc, *ddcs]:
+        archivo, tipo = registro["Archivo"], registro["Tipo"]
+        if registro["Error"]:
+            errores.append(f"{archivo} ({tipo}): {registro['Error']}")
+            continue
+        if registro["Columnas Faltantes"]:
+            mensaje = f"{archivo} ({tipo}): faltan las columnas {registro['Columnas Faltantes']}"
+            otro = "DDC" if tipo == "RDC" else "RDC"
+            if all(c in registro["Encabezado"] for c in REQUIRED[otro]):
+                mensaje += f" (parece un archivo {otro})"
+            errores.append(mensaje)
+            continue
+        if registro["Desde"] is None and registro["Filas Estimadas"]:
+            advertencias.append(f"{archivo} ({tipo}): no se reconocen fechas en '{DATE_COLUMN[tipo]}' de la muestra")
+        elif tipo == "DDC":
+            validos.append(registro)
+
+    # Periodo: los meses de cada DDC deben cruzarse con los del RDC
+    if rdc["Desde"] is not None and not rdc["Columnas Faltantes"]:
+        meses_rdc = _months(rdc["Desde"], rdc["Hasta"])
+        for registro in validos:
+            meses = _months(registro["Desde"], registro["Hasta"])
+            if meses & meses_rdc:
+                continue
+            mensaje = (f"{registro['Archivo']} (DDC): periodo {', '.join(sorted(meses))} distinto al "
+                       f"del RDC ({', '.join(sorted(meses_rdc))})")
+            if {rdc["Fechas"], registro["Fechas"]} <= FECHAS_COMPLETAS:
+                errores.append(mensaje)
+            else:
+                confirmaciones.append(f"{mensaje}, según las primeras {sample_rows:,} filas")
+                advertencias.append(confirmaciones[-1])
+
+    # Solapamientos entre DDC (p.ej. el semanal junto con los diarios de esos días)
+    for i, a in enumerate(validos):
+        for b in validos[i + 1:]:
+            if a["Desde"] <= b["Hasta"] and b["Desde"] <= a["Hasta"]:
+                desde, hasta = max(a["Desde"], b["Desde"]), min(a["Hasta"], b["Hasta"])
+                advertencias.append(f"{a['Archivo']} y {b['Archivo']} comparten fechas ({desde} a {hasta}); "
+                                    "si son exportaciones solapadas, los mensajes repetidos se cuentan una sola vez")
+
+    ddc_bytes = ddc_max_bytes = None
+    if all(r["Filas Estimadas"] is not None and r["Bytes por Fila"] is not None for r in ddcs):
+        por_archivo = [int(r["Filas Estimadas"] * r["Bytes por Fila"] * PROCESS_OVERHEAD) for r in ddcs]
+        ddc_bytes, ddc_max_bytes = sum(por_archivo), max(por_archivo, default=0)
+        if memory_budget is not None:
+            for registro, estimado in zip(ddcs, por_archivo):
+                if estimado > memory_budget:
+                    advertencias.append(f"{registro['Archivo']} (DDC): se carga completo aun en modo particionado "
+                                        f"(~{estimado / 1024 ** 2:,.0f} MB estimados, presupuesto "
+                                        f"{memory_budget / 1024 ** 2:,.0f} MB); conviene exportarlo en varios archivos")
+    return PreflightReport([rdc, *ddcs], errores, advertencias, ddc_sources, ddc_bytes, confirmaciones,
+                           ddc_max_bytes)
@@ -0,0 +1,125 @@
+# Instrumentación por etapas de QuinaCalculator: tiempo, filas de entrada/salida y memoria.
+# Desactivada, cada etapa cuesta una verificación de un atributo.
+import functools
+import os
+import time
+
+# Etapas del cálculo (process_data) en el orden en que empiezan: las lecturas, la deduplicación y el detalle
+# corren anidados dentro de _process_rdc/_process_ddc. Los reportes se generan aparte y a pedido
+ETAPAS = ["_process_rdc", "load_rdc", "_process_ddc", "load_ddc", "_dedup_ddc", "_prepare_detailed_report",
+          "_build_rollup"]
+
+
+def current_rss_mb():
+    """Memoria residente actual del proceso (MB), None fuera de Linux"""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(paginas * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+
+
+class StageRecord:
+    """Medición de una etapa"""
+    __slots__ = ("name", "depth", "rows_in", "rows_out", "seconds", "rss_before_mb", "rss_after_mb", "finished")
+
+    def __init__(self, name, depth=0):
+        self.name = name
+        self.depth = depth
+        self.rows_in = None
+        self.rows_out = None
+        self.seconds = None
+        self.rss_before_mb = None
+        self.rss_after_mb = None
+        self.finished = False
+
+    @property
+    def mem_delta_mb(self):
+        if self.rss_before_mb is None or self.rss_after_mb is None:
+            return None
+        return round(self.rss_after_mb - self.rss_before_mb, 1)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "depth": self.depth,
+            "seconds": self.seconds,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "mem_delta_mb": self.mem_delta_mb,
+            "rss_after_mb": self.rss_after_mb,
+        }
+
+
+class Profiler:
+    """
+    Registro de etapas de una ejecución.
+    enabled: activa la medición (se activa sola si hay hook)
+    hook: callable(record) invocado al iniciar (finished=False) y al terminar (finished=True) cada etapa
+    """
+
+    def __init__(self, enabled=False, hook=None):
+        self.enabled = enabled or hook is not None
+        self.hook = hook
+        self.stages = []
+        self._activas = []
+
+    def reset(self):
+        self.stages = []
+        self._activas = []
+
+    def rows(self, rows_in=None, rows_out=None):
+        """Anota filas de entrada/salida en la etapa en curso"""
+        if not self._activas:
+            return
+        record = self._activas[-1]
+        if rows_in is not None:
+            record.rows_in = int(rows_in)
+        if rows_out is not None:
+            record.rows_out = int(rows_out)
+
+    def start(self, name):
+        record = StageRecord(name, depth=len(self._activas))
+        self.stages.append(record)
+        self._activas.append(record)
+        record.rss_before_mb = current_rss_mb()
+        if self.hook is not None:
+            self.hook(record)
+        record.seconds = time.perf_counter()
+        return record
+
+    def finish(self, record):
+        record.seconds = round(time.perf_counter() - record.seconds, 4)
+        record.rss_after_mb = current_rss_mb()
+        record.finished = True
+        self._activas.remove(record)
+        if self.hook is not None:
+            self.hook(record)
+
+    def total_seconds(self):
+        return round(sum(r.seconds for r in self.stages if r.finished and r.depth == 0), 4)
+
+    def to_dict(self):
+        return {"total_seconds": self.total_seconds(), "stages": [r.to_dict() for r in self.stages if r.finished]}
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame([r.to_dict() for r in self.stages if r.finished])
+
+
+def profiled(name):
+    """Decorador de métodos de QuinaCalculator: mide la etapa `name` si `self.profiler` está activo"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if not profiler.enabled:
+                return method(self, *args, **kwargs)
+            record = profiler.start(name(*args) if callable(name) else name)
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                profiler.finish(record)
+        return wrapper
+    return decorator
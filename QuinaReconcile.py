@@ -0,0 +1,267 @@
+# Conciliación entre dos corridas del mismo periodo (cambio de reglas, otra versión de la exportación, reclamos).
+# Cada lado se reduce a una huella por chat (suma de hashes de sus filas de auditoría); los chats con la misma
+# huella se descartan sin compararlos campo por campo y sólo los distintos se detallan.
+#
+#   python QuinaReconcile.py anterior.xlsx nuevo.parquet --output conciliacion.xlsx
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from QuinaLoader import detect_format, read_columns, read_table
+from QuinaReport import AUDIT_HEADERS, AUDIT_SHEET
+
+# Columnas internas de df_detalle, en el orden de AUDIT_HEADERS
+DETAIL_COLUMNS = [
+    "ID Chat", "Fecha_Dia", "F.Inicio Chat", "Tipificación Chat", "Es_Cobrable", "Es_Credito",
+    "Mensajes_Bruto", "Mensajes_Post_Agente", "Mensajes_Post_Credito", "Mensajes_Facturables",
+    "Time_Agente", "Time_Credito",
+]
+COUNT_COLUMNS = ["Es_Cobrable", "Es_Credito", "Mensajes_Bruto", "Mensajes_Post_Agente", "Mensajes_Post_Credito",
+                 "Mensajes_Facturables"]
+TIME_COLUMNS = ["F.Inicio Chat", "Time_Agente", "Time_Credito"]
+# Encabezados de texto del libro de auditoría: se leen tal cual (un ID Chat "00123" no pasa a 123)
+AUDIT_TEXT_HEADERS = ["ID Chat", "Tipificación Chat"]
+# Lo que entra en la huella de cada fila
+FINGERPRINT_COLUMNS = ["F.Inicio Chat", "Es_Cobrable", "Es_Credito", "Mensajes_Bruto", "Mensajes_Post_Agente",
+                       "Mensajes_Post_Credito", "Mensajes_Facturables", "Time_Agente", "Time_Credito"]
+
+# Medidas por chat (un chat puede tener varias filas RDC) y la métrica del resumen que explican
+CHAT_MEASURES = ["Filas_RDC", "HSM_Cobrables", "HSM_Credito", "Mensajes_Bruto", "Mensajes_Post_Agente",
+                 "Mensajes_Post_Credito", "Mensajes_Facturables"]
+CHAT_TIMES = ["Time_Agente", "Time_Credito"]
+SUMMARY_MEASURES = {
+    "HSM Bruto": "HSM_Cobrables",
+    "HSM Credito": "HSM_Credito",
+    "Mensajes Bruto": "Mensajes_Bruto",
+    "Mensajes Agente": "Mensajes_Post_Agente",
+    "Mensajes Credito": "Mensajes_Post_Credito",
+    "Total Mensajes Final": "Mensajes_Facturables",
+}
+
+CAMBIADO = "cambiado"
+NUEVO = "nuevo"
+ELIMINADO = "eliminado"
+
+
+def _audit_sheets(source):
+    wb = openpyxl.load_workbook(source, read_only=True)
+    try:
+        return [name for name in wb.sheetnames if name.startswith(AUDIT_SHEET)]
+    finally:
+        wb.close()
+
+
+def load_audit(source):
+    """
+    Auditoría de una corrida con las columnas de df_detalle.
+    source: QuinaCalculator ya procesado, DataFrame (df_detalle), archivo exportado (libro XLSX con
+    hojas "Detalle Auditoría", CSV.GZ o Parquet de write_audit_table), lista de archivos o carpeta
+    con libros numerados (write_audit_workbooks)
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+        source = sorted(glob.glob(os.path.join(source, "*.xlsx")))
+        if not source:
+            raise ValueError("La carpeta no contiene libros de auditoría")
+    if hasattr(source, "df_detalle"):
+        df = source.df_detalle
+        if df is None:
+            raise ValueError("La calculadora no tiene auditoría por chat (df_detalle)")
+    elif isinstance(source, pd.DataFrame):
+        df = source
+    elif isinstance(source, (list, tuple)):
+        return pd.concat([load_audit(s) for s in source], ignore_index=True)
+    elif detect_format(source) == "xlsx":
+        hojas = _audit_sheets(source)
+        if not hojas:
+            raise ValueError(f"{source}: el libro no tiene hojas '{AUDIT_SHEET}'")
+        partes = [read_columns(source, AUDIT_HEADERS, sheet_name=hoja, text_columns=AUDIT_TEXT_HEADERS)
+                  for hoja in hojas]
+        df = pd.concat(partes, ignore_index=True).set_axis(DETAIL_COLUMNS, axis=1)
+    else:
+        df = read_table(source, AUDIT_HEADERS).set_axis(DETAIL_COLUMNS, axis=1)
+    return _normalize(df)
+
+
+def _normalize(df):
+    """Tipos comunes para que la misma fila tenga el mismo hash venga de memoria, XLSX, CSV o Parquet"""
+    out = pd.DataFrame({"ID Chat": df["ID Chat"].astype(str).to_numpy()})
+    for col in COUNT_COLUMNS:
+        out[col] = pd.to_numeric(df[col]).fillna(0).astype(np.int64).to_numpy()
+    for col in TIME_COLUMNS:
+        out[col] = pd.to_datetime(df[col]).astype("datetime64[ns]").to_numpy()
+    return out
+
+
+def chat_fingerprints(audit):
+    """
+    Huella por chat: suma (módulo 2^64) de los hashes de sus filas; no depende del orden de las filas.
+    Devuelve (códigos de chat por fila, Index de ID Chat, huellas uint64)
+    """
+    codes, chats = pd.factorize(audit["ID Chat"])
+    filas = pd.util.hash_pandas_object(audit[FINGERPRINT_COLUMNS], index=False).to_numpy()
+    huellas = pd.Series(filas).groupby(codes).sum().to_numpy(dtype=np.uint64)
+    return codes, pd.Index(chats, name="ID Chat"), huellas
+
+
+def chat_measures(audit, codes, chats, seleccion):
+    """Medidas por chat sólo de los chats `seleccion` (posiciones en `chats`)"""
+    marcados = np.zeros(len(chats), dtype=bool)
+    marcados[seleccion] = True
+    filas = marcados[codes]
+    sub = audit[filas]
+    cobrable = sub["Es_Cobrable"].to_numpy() == 1
+    medidas = pd.DataFrame({
+        "chat": codes[filas],
+        "Filas_RDC": np.ones(len(sub), dtype=np.int64),
+        "HSM_Cobrables": cobrable.astype(np.int64),
+        "HSM_Credito": (cobrable & (sub["Es_Credito"].to_numpy() == 1)).astype(np.int64),
+    })
+    for col in CHAT_MEASURES[3:]:
+        medidas[col] = sub[col].to_numpy()
+    for col in CHAT_TIMES:
+        medidas[col] = sub[col].to_numpy()
+    agg = {col: "sum" for col in CHAT_MEASURES}
+    agg.update({col: "min" for col in CHAT_TIMES})
+    por_chat = medidas.groupby("chat").agg(agg)
+    por_chat.index = chats[por_chat.index.to_numpy()]
+    return por_chat.reindex(chats[seleccion])
+
+
+def _totals(audit):
+    cobrable = audit["Es_Cobrable"].to_numpy() == 1
+    totales = {
+        "HSM_Cobrables": int(cobrable.sum()),
+        "HSM_Credito": int((cobrable & (audit["Es_Credito"].to_numpy() == 1)).sum()),
+    }
+    for col in CHAT_MEASURES[3:]:
+        totales[col] = int(audit[col].sum())
+    return totales
+
+
+class Reconciliation:
+    """
+    Resultado de reconcile():
+    chats: una fila por chat cambiado/nuevo/eliminado con valores anterior, nuevo y diferencia
+    efecto: una fila por métrica del resumen con el efecto neto de esos chats
+    stats: chats comparados, descartados por huella y tiempos
+    """
+
+    def __init__(self, chats, efecto, stats):
+        self.chats = chats
+        self.efecto = efecto
+        self.stats = stats
+
+    def write(self, target):
+        """Escribe el efecto por métrica y el detalle de chats en un libro XLSX"""
+        with pd.ExcelWriter(target, engine="openpyxl") as writer:
+            self.efecto.to_excel(writer, sheet_name="Efecto", index=False)
+            self.chats.to_excel(writer, sheet_name="Chats", index=False)
+
+
+def reconcile(anterior, nuevo):
+    """
+    Compara dos corridas (ver load_audit para los tipos de entrada) uniendo por ID Chat.
+    Con dos QuinaCalculator el efecto se muestra además contra sus resúmenes (get_summary()).
+    """
+    inicio = time.perf_counter()
+    audits = [load_audit(anterior), load_audit(nuevo)]
+    t_carga = time.perf_counter() - inicio
+
+    (codes_a, chats_a, huellas_a), (codes_b, chats_b, huellas_b) = [chat_fingerprints(a) for a in audits]
+    # Unión por hash: posición de cada chat nuevo en el lado anterior
+    pos = chats_a.get_indexer(chats_b)
+    en_ambos = pos >= 0
+    cambiados_b = np.flatnonzero(en_ambos)[huellas_a[pos[en_ambos]] != huellas_b[en_ambos]]
+    cambiados_a = pos[cambiados_b]
+    nuevos_b = np.flatnonzero(~en_ambos)
+    presentes_a = np.zeros(len(chats_a), dtype=bool)
+    presentes_a[pos[en_ambos]] = True
+    eliminados_a = np.flatnonzero(~presentes_a)
+
+    medidas_a = chat_measures(audits[0], codes_a, chats_a, np.concatenate([cambiados_a, eliminados_a]))
+    medidas_b = chat_measures(audits[1], codes_b, chats_b, np.concatenate([cambiados_b, nuevos_b]))
+    ids = chats_b[cambiados_b].append(chats_b[nuevos_b]).append(chats_a[eliminados_a])
+    estado = np.repeat([CAMBIADO, NUEVO, ELIMINADO], [len(cambiados_b), len(nuevos_b), len(eliminados_a)])
+    lado_a = medidas_a.reindex(ids)
+    lado_b = medidas_b.reindex(ids)
+
+    detalle = pd.DataFrame({"ID Chat": ids.to_numpy(), "Estado": estado})
+    cambios = []
+    for col in CHAT_MEASURES:
+        a = lado_a[col].fillna(0).astype(np.int64).to_numpy()
+        b = lado_b[col].fillna(0).astype(np.int64).to_numpy()
+        detalle[f"{col} Anterior"] = a
+        detalle[f"{col} Nuevo"] = b
+        detalle[f"{col} Dif"] = b - a
+        cambios.append((col, a != b))
+    for col in CHAT_TIMES:
+        a = lado_a[col].to_numpy()
+        b = lado_b[col].to_numpy()
+        detalle[f"{col} Anterior"] = a
+        detalle[f"{col} Nuevo"] = b
+        cambios.append((col, ~((a == b) | (np.isnat(a) & np.isnat(b)))))
+    # Campos que cambiaron; con las mismas medidas pero filas distintas (p.ej. otra F.Inicio Chat): "filas RDC"
+    marcas = pd.DataFrame(dict(cambios))
+    campos = marcas.dot(marcas.columns + ", ").str.rstrip(", ") if len(marcas) else pd.Series([], dtype=object)
+    detalle["Campos"] = campos.replace("", "filas RDC").to_numpy()
+
+    totales = [_totals(a) for a in audits]
+    efecto = pd.DataFrame({
+        "Métrica": list(SUMMARY_MEASURES),
+        "Auditoría Anterior": [totales[0][m] for m in SUMMARY_MEASURES.values()],
+        "Auditoría Nueva": [totales[1][m] for m in SUMMARY_MEASURES.values()],
+        "Efecto Chats": [int(detalle[f"{m} Dif"].sum()) for m in SUMMARY_MEASURES.values()],
+    })
+    if all(hasattr(x, "get_summary") for x in (anterior, nuevo)):
+        resumenes = [anterior.get_summary(), nuevo.get_summary()]
+        efecto["Resumen Anterior"] = [int(resumenes[0][k]) for k in SUMMARY_MEASURES]
+        efecto["Resumen Nuevo"] = [int(resumenes[1][k]) for k in SUMMARY_MEASURES]
+        # Mensajes de chats sin fila RDC: cuentan en el resumen pero no en la auditoría
+        efecto["Fuera de Auditoría"] = (efecto["Resumen Nuevo"] - efecto["Resumen Anterior"]) - efecto["Efecto Chats"]
+        # Total HSM Final: HSM Bruto - HSM Credito - free tier de cada corrida
+        libres = [anterior.META_FREE_TIER, nuevo.META_FREE_TIER]
+        auditoria = [max(0, t["HSM_Cobrables"] - t["HSM_Credito"] - f) for t, f in zip(totales, libres)]
+        resumen = [max(0, int(r["HSM Bruto"] - r["HSM Credito"]) - f) for r, f in zip(resumenes, libres)]
+        efecto.loc[len(efecto)] = ["Total HSM Final", auditoria[0], auditoria[1], auditoria[1] - auditoria[0],
+                                   resumen[0], resumen[1], (resumen[1] - resumen[0]) - (auditoria[1] - auditoria[0])]
+
+    stats = {
+        "chats_anterior": len(chats_a),
+        "chats_nuevo": len(chats_b),
+        "sin_cambios": int(en_ambos.sum()) - len(cambiados_b),
+        "cambiados": len(cambiados_b),
+        "nuevos": len(nuevos_b),
+        "eliminados": len(eliminados_a),
+        "carga_s": round(t_carga, 3),
+        "total_s": round(time.perf_counter() - inicio, 3),
+    }
+    return Reconciliation(detalle, efecto, stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conciliación de la auditoría entre dos corridas")
+    parser.add_argument("anterior", help="Auditoría anterior: XLSX, CSV.GZ, Parquet o carpeta de libros numerados")
+    parser.add_argument("nuevo", help="Auditoría nueva (mismos formatos)")
+    parser.add_argument("--output", default=None, help="Libro XLSX con el efecto y los chats con cambios")
+    args = parser.parse_args(argv)
+
+    resultado = reconcile(args.anterior, args.nuevo)
+    s = resultado.stats
+    print(f"{s['chats_nuevo']:,} chats: {s['sin_cambios']:,} sin cambios, {s['cambiados']:,} cambiados, "
+          f"{s['nuevos']:,} nuevos, {s['eliminados']:,} eliminados ({s['total_s']}s)")
+    print(resultado.efecto.to_string(index=False))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        resultado.write(args.output)
+        print(f"Detalle: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
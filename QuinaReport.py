@@ -0,0 +1,271 @@
+import os
+import tempfile
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+
+# Tamaño máximo en memoria antes de que el archivo temporal pase a disco
+SPOOL_MAX_BYTES = 32 * 1024 ** 2
+
+# Filas de auditoría convertidas a objetos Python por bloque
+AUDIT_BLOCK_ROWS = 10000
+
+# Máximo de filas de datos por hoja de Excel (1,048,576 menos el encabezado)
+EXCEL_MAX_ROWS = 1_048_575
+AUDIT_SHEET = "Detalle Auditoría"
+
+# Formatos de la auditoría por separado (junto a una factura XLSX sin auditoría)
+AUDIT_FORMATS = ("csv.gz", "parquet")
+
+FORMATO_SOLES = '"S/ " #,##0.00'
+
+# Tarifa escalonada de mensajes: (volumen máximo del tramo, tarifa por mensaje); None = sin tope.
+# Todo el volumen del mes se cobra a la tarifa del tramo en que cae.
+TRAMOS_MENSAJES = [(9999, 0.0456), (99999, 0.0380), (249999, 0.0304), (None, 0.0228)]
+IGV = 0.18
+
+AUDIT_HEADERS = [
+    "ID Chat", "Fecha (Día)", "F.Inicio (RDC)", "Tipificación Chat",
+    "Es HSM Bruto? (1=Sí)", "Tuvo Crédito? (1=Sí)",
+    "Mensajes Bruto", "(-) Mensajes Post-Agente", "(-) Mensajes Post-Crédito",
+    "Mensajes Facturables (Neto)", "Fecha Corte Agente", "Fecha Corte Crédito"
+]
+
+FACTURA_WIDTHS = {"A": 35, "B": 18, "C": 15, "D": 50}
+AUDIT_WIDTHS = {
+    "A": 25, "B": 12, "C": 20, "D": 30, "E": 18, "F": 18,
+    "G": 15, "H": 22, "I": 22, "J": 20, "K": 20, "L": 20,
+}
+
+FILAS_RESALTADAS = ["Fee Mensual", "TOTAL HSM", "TOTAL MENSAJES"]
+FILAS_NEGRITA = ["SUB TOTAL", "TOTAL A FACTURAR", "CÁLCULO HSM (Detallado)", "CÁLCULO MENSAJES (Detallado)"]
+
+
+def calcular_costo_mensajes(cantidad, tramos=TRAMOS_MENSAJES):
+    """Cálculo de tarifa escalonada según el volumen total de mensajes"""
+    if cantidad <= 0: return 0.0
+    return cantidad * tarifa_mensajes(cantidad, tramos)
+
+
+def tarifa_mensajes(cantidad, tramos=TRAMOS_MENSAJES):
+    """Tarifa por mensaje aplicable al volumen (referencial para la factura)"""
+    for tope, tarifa in tramos:
+        if tope is None or cantidad <= tope:
+            return tarifa
+    return tramos[-1][1]
+
+
+def _named_styles():
+    """Estilos compartidos del reporte: se registran una vez en el libro y cada celda sólo los referencia"""
+    header_fill = PatternFill(start_color="C00000", end_color="C00000", fill_type="solid")
+    sub_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+    white_font = Font(color="FFFFFF", bold=True)
+    bold_font = Font(bold=True)
+    border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    center = Alignment(horizontal='center')
+
+    return [
+        NamedStyle("quina_factura", border=border),
+        NamedStyle("quina_factura_monto", border=border, number_format=FORMATO_SOLES),
+        NamedStyle("quina_factura_encabezado", border=border, fill=header_fill, font=white_font, alignment=center),
+        NamedStyle("quina_factura_resaltado", border=border, fill=sub_fill),
+        NamedStyle("quina_factura_resaltado_monto", border=border, fill=sub_fill, number_format=FORMATO_SOLES),
+        NamedStyle("quina_factura_negrita", border=border, font=bold_font),
+        NamedStyle("quina_factura_negrita_monto", border=border, font=bold_font, number_format=FORMATO_SOLES),
+        NamedStyle("quina_auditoria_encabezado", fill=header_fill, font=white_font, alignment=center),
+        NamedStyle("quina_auditoria_texto", number_format='@'),
+    ]
+
+
+def _factura_style(row, i, j, val):
+    """Nombre del estilo de una celda de la hoja Factura"""
+    if i == 1:
+        return "quina_factura_encabezado"
+    monto = "_monto" if isinstance(val, (int, float)) and j == 3 else ""
+    if row[0] in FILAS_RESALTADAS and j in [1, 2, 3]:
+        return "quina_factura_resaltado" + monto
+    if row[0] in FILAS_NEGRITA:
+        return "quina_factura_negrita" + monto
+    return "quina_factura" + monto
+
+
+def factura_rows(summary, fee_mensual, tarifa_hsm, meta_free_tier, tramos=TRAMOS_MENSAJES, tasa_igv=IGV,
+                 duplicados=None):
+    """
+    Filas de la hoja Factura a partir del resumen de QuinaCalculator.get_summary()
+    duplicados: mensajes repetidos entre DDC descartados (informativo; None = fila omitida)
+    """
+    q_hsm = summary["Total HSM Final"]
+    q_mensajes = summary["Total Mensajes Final"]
+
+    total_hsm_money = q_hsm * tarifa_hsm
+    total_msg_money = calcular_costo_mensajes(q_mensajes, tramos)
+    subtotal = fee_mensual + total_hsm_money + total_msg_money
+    igv = subtotal * tasa_igv
+    total_facturar = subtotal + igv
+
+    filas_duplicados = []
+    if duplicados is not None:
+        filas_duplicados = [["Mensajes Repetidos entre DDC", duplicados, "",
+                             "Descartados antes del bruto (archivos DDC solapados)"]]
+
+    return [
+        ["CONCEPTOS", "ABR / CANTIDAD", "MONTO S/", "OBSERVACIONES"],
+        ["Fee Mensual", 1, fee_mensual, "Fee Mensual Broker Whatsapp API Oficial"],
+        ["", "", "", ""],
+        ["CÁLCULO HSM (Detallado)", "", "", ""],
+        ["HSM Bruto (Total Conversaciones 24h)", summary["HSM Bruto"], "", "Antes de descuentos"],
+        ["(-) HSM Opción 3 (Evalúa tu Crédito)", -summary["HSM Credito"], "", "Sesiones que derivaron a crédito"],
+        ["(-) HSM Meta Free Tier", -meta_free_tier, "", f"{meta_free_tier:,} conversaciones gratuitas Meta"],
+        ["Q HSM Neto Facturable", q_hsm, "Calculado", "HSM a cobrar después de descuentos"],
+        ["Tarifa por HSM", tarifa_hsm, "Tarifa", "Según adenda N° 2"],
+        ["TOTAL HSM", "", total_hsm_money, ""],
+        ["", "", "", ""],
+        ["CÁLCULO MENSAJES (Detallado)", "", "", ""],
+        *filas_duplicados,
+        ["Mensajes Bruto (Total)", summary["Mensajes Bruto"], "", "Todos los mensajes del periodo"],
+        ["(-) Mensajes Post-Agente", -summary["Mensajes Agente"], "", "Mensajes después de pase a humano"],
+        ["(-) Mensajes Post-Crédito", -summary["Mensajes Credito"], "", "Mensajes después de trigger crédito"],
+        ["Q Mensajes Neto Facturable", q_mensajes, "Calculado", "Mensajes a cobrar después de descuentos"],
+        ["Tarifa por mensajes", tarifa_mensajes(q_mensajes, tramos), "Tarifa", "Tarifa escalonada aplicada al volumen"],
+        ["TOTAL MENSAJES", "", total_msg_money, ""],
+        ["", "", "", ""],
+        ["SUB TOTAL", "", subtotal, ""],
+        [f"IGV ({tasa_igv:.0%})", "", igv, ""],
+        ["TOTAL A FACTURAR", "", total_facturar, ""]
+    ]
+
+
+def _write_factura(wb, summary, fee_mensual, tarifa_hsm, meta_free_tier, tramos=TRAMOS_MENSAJES, tasa_igv=IGV,
+                   duplicados=None):
+    ws = wb.create_sheet("Factura")
+    for col, width in FACTURA_WIDTHS.items():
+        ws.column_dimensions[col].width = width
+
+    rows = factura_rows(summary, fee_mensual, tarifa_hsm, meta_free_tier, tramos, tasa_igv, duplicados)
+    for i, row in enumerate(rows, start=1):
+        cells = []
+        for j, val in enumerate(row, start=1):
+            cell = WriteOnlyCell(ws, value=val)
+            cell.style = _factura_style(row, i, j, val)
+            cells.append(cell)
+        ws.append(cells)
+
+
+def _iter_audit_rows(df_detalle):
+    """Recorre la auditoría por bloques, convirtiendo a objetos Python sólo un bloque a la vez"""
+    columns = [df_detalle[col] for col in df_detalle.columns]
+    for start in range(0, len(df_detalle), AUDIT_BLOCK_ROWS):
+        block = [col.iloc[start:start + AUDIT_BLOCK_ROWS].astype(object).tolist() for col in columns]
+        yield from zip(*block)
+
+
+def _write_auditoria(wb, df_detalle, title=AUDIT_SHEET):
+    ws = wb.create_sheet(title)
+    for col, width in AUDIT_WIDTHS.items():
+        ws.column_dimensions[col].width = width
+
+    header = []
+    for h in AUDIT_HEADERS:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.style = "quina_auditoria_encabezado"
+        header.append(cell)
+    ws.append(header)
+
+    # Forzar Texto para ID Chat (Columna 1). Cada fila se serializa al hacer append,
+    # por lo que una sola celda con estilo se reutiliza en todas las filas.
+    id_cell = WriteOnlyCell(ws)
+    id_cell.style = "quina_auditoria_texto"
+    for row in _iter_audit_rows(df_detalle):
+        id_cell.value = row[0]
+        ws.append((id_cell,) + row[1:])
+
+
+def _new_workbook():
+    wb = openpyxl.Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    return wb
+
+
+def write_report(target, summary, df_detalle, fee_mensual, tarifa_hsm, meta_free_tier,
+                 include_audit=True, max_rows=EXCEL_MAX_ROWS, tramos=TRAMOS_MENSAJES, tasa_igv=IGV, duplicados=None):
+    """
+    Escribe el libro de facturación (hojas Factura y Detalle Auditoría) en modo streaming.
+    target: ruta o archivo binario de destino
+    summary: diccionario de QuinaCalculator.get_summary()
+    df_detalle: auditoría por chat (puede ser None o vacía)
+    include_audit: False = sólo la hoja Factura
+    max_rows: filas por hoja de auditoría; el resto sigue en "Detalle Auditoría 2", "3", ...
+    tramos / tasa_igv: tarifa escalonada de mensajes e IGV
+    duplicados: mensajes repetidos entre DDC descartados, en la hoja Factura junto al bruto (None = sin fila)
+    """
+    wb = _new_workbook()
+    _write_factura(wb, summary, fee_mensual, tarifa_hsm, meta_free_tier, tramos, tasa_igv, duplicados)
+    if include_audit and df_detalle is not None and not df_detalle.empty:
+        for n, start in enumerate(range(0, len(df_detalle), max_rows), start=1):
+            title = AUDIT_SHEET if n == 1 else f"{AUDIT_SHEET} {n}"
+            _write_auditoria(wb, df_detalle.iloc[start:start + max_rows], title)
+
+    wb.save(target)
+
+
+def _to_bytes(write, *args, **kwargs):
+    """Ejecuta write(archivo, ...) sobre un temporal (en disco si supera SPOOL_MAX_BYTES) y devuelve sus bytes"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        write(spool, *args, **kwargs)
+        spool.seek(0)
+        return spool.read()
+
+
+def report_bytes(summary, df_detalle, fee_mensual, tarifa_hsm, meta_free_tier,
+                 include_audit=True, max_rows=EXCEL_MAX_ROWS, tramos=TRAMOS_MENSAJES, tasa_igv=IGV, duplicados=None):
+    """Genera el libro en un archivo temporal y devuelve sus bytes"""
+    return _to_bytes(write_report, summary, df_detalle, fee_mensual, tarifa_hsm, meta_free_tier,
+                     include_audit=include_audit, max_rows=max_rows, tramos=tramos, tasa_igv=tasa_igv,
+                     duplicados=duplicados)
+
+
+def _audit_or_empty(df_detalle):
+    """Sin auditoría (None) se exporta sólo el encabezado"""
+    if df_detalle is None:
+        return pd.DataFrame({h: [] for h in AUDIT_HEADERS})
+    return df_detalle
+
+
+def write_audit_workbooks(directory, df_detalle, max_rows=EXCEL_MAX_ROWS, prefix="Detalle_Auditoria"):
+    """
+    Auditoría en libros XLSX separados de a lo sumo `max_rows` filas (prefijo_001.xlsx, prefijo_002.xlsx, ...).
+    Devuelve las rutas escritas.
+    """
+    os.makedirs(directory, exist_ok=True)
+    df_detalle = _audit_or_empty(df_detalle)
+    rutas = []
+    for n, start in enumerate(range(0, max(len(df_detalle), 1), max_rows), start=1):
+        wb = _new_workbook()
+        _write_auditoria(wb, df_detalle.iloc[start:start + max_rows])
+        ruta = os.path.join(directory, f"{prefix}_{n:03d}.xlsx")
+        wb.save(ruta)
+        rutas.append(ruta)
+    return rutas
+
+
+def write_audit_table(target, df_detalle, fmt="csv.gz"):
+    """
+    Auditoría completa en un solo archivo columnar, sin límite de filas.
+    fmt: "csv.gz" (UTF-8 con BOM para Excel) o "parquet"
+    """
+    df = _audit_or_empty(df_detalle).set_axis(AUDIT_HEADERS, axis=1)
+    if fmt == "csv.gz":
+        df.to_csv(target, index=False, encoding="utf-8-sig", compression={"method": "gzip"})
+    elif fmt == "parquet":
+        df.to_parquet(target, index=False)
+    else:
+        raise ValueError(f"Formato de auditoría no soportado: {fmt} (opciones: {list(AUDIT_FORMATS)})")
+
+
+def audit_bytes(df_detalle, fmt="csv.gz"):
+    """Bytes de la auditoría en formato columnar (ver write_audit_table)"""
+    return _to_bytes(write_audit_table, df_detalle, fmt)
@@ -0,0 +1,92 @@
+# Cubo de agregados para tableros: día × tipificación × hora de inicio del chat.
+# Se arma una vez a partir de la auditoría por chat (o de los días afectados en modo incremental)
+# y los gráficos se calculan sobre el cubo, que tiene a lo sumo días × tipificaciones × 24 filas.
+import numpy as np
+import pandas as pd
+
+CUBE_KEYS = ["Fecha_Dia", "Tipificación Chat", "Hora"]
+MEASURES = [
+    "Chats", "Chats_Agente", "HSM_Cobrables", "HSM_Credito",
+    "Mensajes_Bruto", "Mensajes_Post_Agente", "Mensajes_Post_Credito", "Mensajes_Facturables",
+]
+SIN_TIPIFICACION = "(sin tipificación)"
+
+# Columnas de entrada (las de df_detalle)
+DETAIL_COLUMNS = [
+    "F.Inicio Chat", "Tipificación Chat", "Es_Cobrable", "Es_Credito", "Time_Agente",
+    "Mensajes_Bruto", "Mensajes_Post_Agente", "Mensajes_Post_Credito", "Mensajes_Facturables",
+]
+
+
+def empty_cube():
+    cubo = pd.DataFrame({
+        "Fecha_Dia": pd.Series(dtype="datetime64[ns]"),
+        "Tipificación Chat": pd.Series(dtype=object),
+        "Hora": pd.Series(dtype=np.int8),
+    })
+    for col in MEASURES:
+        cubo[col] = pd.Series(dtype=np.int64)
+    return cubo
+
+
+def build_cube(df_detalle):
+    """
+    Agrega la auditoría por chat (una fila por fila RDC, como la hoja Detalle Auditoría).
+    Fecha_Dia y Hora salen de F.Inicio Chat; Chats_Agente cuenta los chats con pase a agente.
+    """
+    if df_detalle is None or df_detalle.empty:
+        return empty_cube()
+    # cache=False: con fechas ya tipadas, la heurística de caché de pandas recorre las filas como Timestamp
+    inicio = pd.to_datetime(df_detalle["F.Inicio Chat"], cache=False)
+    cobrable = df_detalle["Es_Cobrable"].to_numpy() == 1
+    base = pd.DataFrame({
+        "Fecha_Dia": inicio.dt.normalize(),
+        "Tipificación Chat": df_detalle["Tipificación Chat"].fillna(SIN_TIPIFICACION).astype(str),
+        "Hora": inicio.dt.hour.fillna(-1).astype(np.int8),
+        "Chats": np.ones(len(df_detalle), dtype=np.int64),
+        "Chats_Agente": df_detalle["Time_Agente"].notna().to_numpy().astype(np.int64),
+        "HSM_Cobrables": cobrable.astype(np.int64),
+        "HSM_Credito": (cobrable & (df_detalle["Es_Credito"].to_numpy() == 1)).astype(np.int64),
+    })
+    for col in MEASURES[4:]:
+        base[col] = df_detalle[col].to_numpy().astype(np.int64)
+    cubo = base.groupby(CUBE_KEYS, sort=True, dropna=False).sum().reset_index()
+    return cubo[CUBE_KEYS + MEASURES]
+
+
+def replace_days(cubo, parcial, dias):
+    """Sustituye en `cubo` las filas de `dias` por el cubo `parcial` de esos días (actualización incremental)"""
+    if cubo is None:
+        cubo = empty_cube()
+    resto = cubo[~cubo["Fecha_Dia"].isin(dias)]
+    cubo = pd.concat([resto, parcial], ignore_index=True) if len(resto) else parcial.reset_index(drop=True)
+    return cubo.sort_values(CUBE_KEYS, kind="stable", ignore_index=True)
+
+
+def apply_delta(cubo, antes, despues):
+    """
+    Actualiza `cubo` cuando un grupo de filas de df_detalle pasa de `antes` a `despues` (mismas filas más las
+    nuevas, ya que una fila no cambia de día, tipificación ni hora): resta el cubo de `antes` y suma el de
+    `despues` sólo en sus días. Devuelve (cubo, días actualizados)
+    """
+    previo = build_cube(antes)
+    previo[MEASURES] *= -1
+    parcial = pd.concat([previo, build_cube(despues)], ignore_index=True)
+    dias = pd.unique(parcial["Fecha_Dia"])
+    if cubo is None:
+        cubo = empty_cube()
+    actual = cubo[cubo["Fecha_Dia"].isin(dias)]
+    parcial = pd.concat([actual, parcial], ignore_index=True).groupby(CUBE_KEYS, sort=True, dropna=False).sum()
+    # Celdas que se quedaron sin filas RDC
+    parcial = parcial[parcial["Chats"] > 0].reset_index()
+    return replace_days(cubo, parcial[CUBE_KEYS + MEASURES], dias), dias
+
+
+def rollup(cubo, by):
+    """
+    Totales del cubo por una o más dimensiones (p.ej. "Fecha_Dia", "Tipificación Chat", "Hora"),
+    con la tasa de pase a agente (chats con agente / chats).
+    """
+    tabla = cubo.groupby(by, sort=True)[MEASURES].sum()
+    tabla["Tasa_Agente"] = tabla["Chats_Agente"] / tabla["Chats"].where(tabla["Chats"] > 0)
+    return tabla
@@ -0,0 +1,112 @@
+# Ingesta de archivos subidos: se copian a un directorio de spool en disco y el cálculo recibe rutas,
+# de modo que los bytes no quedan retenidos en memoria durante la sesión.
+# Cuotas de disco por sesión y globales; los archivos sin uso se borran pasado un TTL.
+import os
+import shutil
+import tempfile
+import time
+
+from QuinaCache import hash_source
+
+SPOOL_TTL = 2 * 60 * 60  # segundos sin uso antes de borrar un archivo
+COPY_BLOCK = 1024 * 1024
+
+
+class QuotaExceeded(RuntimeError):
+    """La carga superaría la cuota de disco de la sesión o la global"""
+
+
+class UploadSpool:
+    """
+    spool_dir: directorio base (una subcarpeta por sesión)
+    session_quota / global_quota: bytes máximos en disco (None = sin límite)
+    ttl: segundos sin uso tras los que se borran los archivos
+    """
+
+    def __init__(self, spool_dir, session_quota=None, global_quota=None, ttl=SPOOL_TTL):
+        self.spool_dir = spool_dir
+        self.session_quota = session_quota
+        self.global_quota = global_quota
+        self.ttl = ttl
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _session_dir(self, session_id):
+        return os.path.join(self.spool_dir, session_id)
+
+    @staticmethod
+    def _usage(directory):
+        total = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def usage(self, session_id=None):
+        """Bytes en disco de una sesión (o de todo el spool)"""
+        return self._usage(self._session_dir(session_id) if session_id else self.spool_dir)
+
+    def ingest(self, session_id, upload):
+        """
+        Copia `upload` (archivo binario con .name, p.ej. UploadedFile) al spool de la sesión.
+        Devuelve {"name", "path", "hash", "size"}; el mismo contenido se guarda una sola vez por sesión.
+        """
+        self.cleanup()
+        size = getattr(upload, "size", None)
+        if size is None:
+            pos = upload.tell()
+            upload.seek(0, os.SEEK_END)
+            size = upload.tell()
+            upload.seek(pos)
+        if self.session_quota is not None and self.usage(session_id) + size > self.session_quota:
+            raise QuotaExceeded(
+                f"La sesión superaría su cuota de {self.session_quota / 1024 ** 2:,.0f} MB en archivos subidos"
+            )
+        if self.global_quota is not None and self.usage() + size > self.global_quota:
+            raise QuotaExceeded("El servidor no tiene espacio para más archivos; intenta de nuevo más tarde")
+
+        directory = self._session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        ext = os.path.splitext(upload.name)[1].lower()
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            upload.seek(0)
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(upload, out, COPY_BLOCK)
+            content_hash = hash_source(tmp)
+            # Nombre por contenido: la extensión se conserva para detectar el formato
+            path = os.path.join(directory, content_hash + ext)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return {"name": upload.name, "path": path, "hash": content_hash, "size": size}
+
+    def touch(self, entries):
+        """Marca archivos como en uso (p.ej. al encolar un cálculo) para que el TTL no los borre"""
+        for entry in entries:
+            try:
+                os.utime(entry["path"])
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """Borra archivos sin uso por más de `ttl` segundos y las carpetas de sesión vacías"""
+        limite = time.time() - self.ttl
+        for session_id in os.listdir(self.spool_dir):
+            directory = self._session_dir(session_id)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < limite:
+                        os.remove(path)
+                except OSError:
+                    pass
+            try:
+                os.rmdir(directory)  # sólo si quedó vacía
+            except OSError:
+                pass
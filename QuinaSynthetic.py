@@ -0,0 +1,183 @@
+# Generador de datos sintéticos RDC/DDC con distribuciones similares a las exportaciones reales.
+# Se usa para benchmarks y pruebas sin compartir datos de clientes.
+import os
+
+import numpy as np
+import pandas as pd
+import openpyxl
+
+# Escalas predefinidas (cantidad de mensajes DDC)
+SCALES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# Parámetros de las distribuciones
+MENSAJES_POR_CHAT = 8          # media de mensajes por chat (geométrica)
+CHATS_POR_CLIENTE = 1.7        # media de chats por ID de cliente
+PROB_REVISITA_24H = 0.25       # chats que vuelven dentro de las 24h del anterior del mismo cliente
+PROB_AGENTE = 0.15             # chats derivados a agente (evento NOTIFICATION)
+PROB_CREDITO = 0.10            # chats que activan la opción de crédito
+PROB_SIN_DDC = 0.05            # chats del RDC sin mensajes en el DDC
+SEGUNDOS_ENTRE_MENSAJES = 40   # media (exponencial)
+
+# Máximo de filas por hoja de Excel (sin encabezado)
+EXCEL_MAX_ROWS = 1_048_575
+
+TIPIFICACIONES = ["Consulta general", "Estado de pedido", "Reclamo", "Actualización de datos", "Sin tipificar"]
+TIPIFICACION_CREDITO = ["Evalúa tu crédito", "Evaluación crediticia"]
+TIPOS = ["TEXT", "TEXT", "TEXT", "text", " TEXT ", "IMAGE", "DOCUMENT", "AUDIO"]
+MENSAJES_BOT = [
+    "Hola, soy el asistente virtual de Quina",
+    "Elige una opción: 1. Pedidos 2. Pagos 3. Créditos",
+    "Gracias por escribirnos",
+    "¿Te ayudo con algo más?",
+    "Un asesor te atenderá en breve",
+    "Por favor ingresa tu DNI",
+]
+MENSAJES_CREDITO = [
+    "3. Evalúa si tienes un crédito disponible",
+    "3. evalua si tienes un credito disponible",
+    "Evalúa si tienes un crédito pre aprobado",
+]
+
+
+def _tiempos_chat(rng, ids, inicio, segundos_mes):
+    """Inicio de cada chat: uniforme en el mes, con revisitas dentro de 24h del chat anterior del cliente"""
+    t = rng.integers(0, segundos_mes, len(ids))
+    orden = np.lexsort((t, ids))
+    ids_o = ids[orden]
+    t_o = t[orden]
+    mismo_cliente = np.zeros(len(ids), dtype=bool)
+    mismo_cliente[1:] = ids_o[1:] == ids_o[:-1]
+    revisita = mismo_cliente & (rng.random(len(ids)) < PROB_REVISITA_24H)
+    # Revisita: entre 30 minutos y 23.5 horas después del chat anterior (sin encadenar revisitas)
+    previo = np.roll(t_o, 1)
+    t_o = np.where(revisita, previo + rng.integers(1800, 84600, len(ids)), t_o)
+    t_final = np.empty_like(t)
+    t_final[orden] = t_o
+    return (inicio + t_final.astype("timedelta64[s]")).astype("datetime64[ns]")
+
+
+def generate(n_mensajes, seed=0, mes="2024-05"):
+    """
+    Genera un par (rdc, ddc) de DataFrames con el formato de las exportaciones.
+    n_mensajes: cantidad exacta de filas DDC
+    seed: semilla (misma semilla y tamaño => mismos datos)
+    """
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64(f"{mes}-01T00:00:00")
+    segundos_mes = 30 * 86400
+
+    n_chats = max(1, n_mensajes // MENSAJES_POR_CHAT)
+    n_clientes = max(1, int(n_chats / CHATS_POR_CLIENTE))
+
+    # --- RDC: un registro por chat ---
+    ids = 51_900_000_000 + rng.integers(0, n_clientes, n_chats)
+    id_chat = np.char.add("CH", np.arange(1, n_chats + 1).astype(str)).astype(object)
+    t_chat = _tiempos_chat(rng, ids, inicio, segundos_mes)
+
+    con_credito = rng.random(n_chats) < PROB_CREDITO
+    con_agente = rng.random(n_chats) < PROB_AGENTE
+    tipif = np.asarray(TIPIFICACIONES, dtype=object)[rng.integers(0, len(TIPIFICACIONES), n_chats)]
+    tipif_credito = np.asarray(TIPIFICACION_CREDITO, dtype=object)[rng.integers(0, len(TIPIFICACION_CREDITO), n_chats)]
+    tipif = np.where(con_credito & (rng.random(n_chats) < 0.8), tipif_credito, tipif)
+
+    rdc = pd.DataFrame({
+        "ID": ids,
+        "Canal": "WhatsApp",
+        "F.Inicio Chat": t_chat,
+        "ID Chat": id_chat,
+        "Tipificación Chat": tipif,
+        "Agente": np.where(con_agente, "asesor", ""),
+    })
+
+    # --- DDC: mensajes por chat (geométrica), sólo chats con detalle ---
+    con_ddc = np.flatnonzero(rng.random(n_chats) >= PROB_SIN_DDC)
+    if len(con_ddc) == 0:
+        con_ddc = np.arange(n_chats)
+    conteo = rng.geometric(1.0 / MENSAJES_POR_CHAT, len(con_ddc))
+    chat_msg = np.repeat(con_ddc, conteo)[:n_mensajes]
+    if len(chat_msg) < n_mensajes:
+        chat_msg = np.concatenate([chat_msg, rng.choice(con_ddc, n_mensajes - len(chat_msg))])
+    chat_msg.sort(kind="stable")
+
+    # Posición del mensaje dentro de su chat y tiempos crecientes
+    nuevo_chat = np.ones(n_mensajes, dtype=bool)
+    nuevo_chat[1:] = chat_msg[1:] != chat_msg[:-1]
+    inicio_grupo = np.maximum.accumulate(np.where(nuevo_chat, np.arange(n_mensajes), 0))
+    posicion = np.arange(n_mensajes) - inicio_grupo
+    gaps = rng.exponential(SEGUNDOS_ENTRE_MENSAJES, n_mensajes).astype(np.int64)
+    acumulado = np.cumsum(gaps)
+    offset = acumulado - acumulado[inicio_grupo]
+    fecha = t_chat[chat_msg] + offset.astype("timedelta64[s]")
+
+    tamanio = np.bincount(chat_msg, minlength=n_chats)[chat_msg]
+    tipo = np.asarray(TIPOS, dtype=object)[rng.integers(0, len(TIPOS), n_mensajes)]
+    mensaje = np.asarray(MENSAJES_BOT, dtype=object)[rng.integers(0, len(MENSAJES_BOT), n_mensajes)]
+    # Respuestas libres del cliente (alta cardinalidad)
+    libres = rng.random(n_mensajes) < 0.3
+    mensaje[libres] = np.char.add("mi dni es ", rng.integers(10_000_000, 99_999_999, libres.sum()).astype(str)).astype(object)
+
+    # Un evento de agente y/o crédito en una posición aleatoria de los chats elegidos
+    pos_evento = (rng.random(n_mensajes) * tamanio).astype(np.int64)
+    es_evento = posicion == pos_evento
+    tipo[es_evento & con_agente[chat_msg]] = "NOTIFICATION"
+    credito_msg = es_evento & con_credito[chat_msg]
+    mensaje[credito_msg] = np.asarray(MENSAJES_CREDITO, dtype=object)[rng.integers(0, len(MENSAJES_CREDITO), credito_msg.sum())]
+
+    ddc = pd.DataFrame({
+        "ID Chat": id_chat[chat_msg],
+        "Canal": "WhatsApp",
+        "Mensaje": mensaje,
+        "Fecha Hora": fecha,
+        "Tipo": tipo,
+    })
+    return rdc, ddc
+
+
+def _write_sheet(path, df):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Hoja1")
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+    wb.save(path)
+
+
+def write_files(rdc, ddc, directory, fmt="xlsx"):
+    """
+    Escribe los DataFrames en el formato indicado: "xlsx", "csv", "csv.gz" o "parquet".
+    Devuelve (ruta_rdc, [rutas_ddc]).
+    """
+    if fmt == "xlsx":
+        return write_xlsx(rdc, ddc, directory)
+    os.makedirs(directory, exist_ok=True)
+    rutas = []
+    for nombre, df in (("RDC", rdc), ("DDC", ddc)):
+        ruta = os.path.join(directory, f"{nombre}.{fmt}")
+        if fmt == "parquet":
+            df.to_parquet(ruta, index=False)
+        else:
+            df.to_csv(ruta, index=False, date_format="%Y-%m-%d %H:%M:%S")
+        rutas.append(ruta)
+    return rutas[0], rutas[1:]
+
+
+def write_xlsx(rdc, ddc, directory, max_rows=EXCEL_MAX_ROWS):
+    """
+    Escribe los DataFrames como XLSX (RDC.xlsx y DDC_01.xlsx, DDC_02.xlsx, ...).
+    El DDC se divide en archivos de a lo sumo `max_rows` filas (límite de una hoja de Excel).
+    Devuelve (ruta_rdc, [rutas_ddc]).
+    """
+    os.makedirs(directory, exist_ok=True)
+    ruta_rdc = os.path.join(directory, "RDC.xlsx")
+    _write_sheet(ruta_rdc, rdc)
+
+    rutas_ddc = []
+    for n, start in enumerate(range(0, max(len(ddc), 1), max_rows), start=1):
+        ruta = os.path.join(directory, f"DDC_{n:02d}.xlsx")
+        _write_sheet(ruta, ddc.iloc[start:start + max_rows])
+        rutas_ddc.append(ruta)
+    return ruta_rdc, rutas_ddc
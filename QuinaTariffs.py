@@ -0,0 +1,189 @@
+# Simulación de tarifas ("what-if") sobre los contadores ya agregados de un cálculo.
+# No vuelve a leer ni a procesar los archivos: cientos de tablas de tarifas se evalúan en un solo lote NumPy,
+# con la misma aritmética que la hoja Factura (los totales coinciden al centavo con factura_rows).
+#
+#   escenarios = scenario_grid(tarifa_hsm=[0.06, 0.07, 0.077], meta_free_tier=[0, 1000, 2000])
+#   calc.simulate_tariffs(escenarios)                  # tabla comparativa, una fila por escenario
+#   calc.tariff_report(escenarios[4])                  # hoja Factura de un escenario (bytes XLSX)
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+
+from QuinaReport import factura_rows, report_bytes
+
+# Parámetros de un escenario (mismos nombres que en factura_rows); los omitidos toman la tarifa vigente
+TARIFF_KEYS = ("fee_mensual", "tarifa_hsm", "meta_free_tier", "tramos", "igv")
+
+COLUMNAS = [
+    "Escenario", "Fee Mensual", "Q HSM", "Tarifa HSM", "Total HSM", "Q Mensajes", "Tarifa Mensajes",
+    "Total Mensajes", "Sub Total", "IGV", "Total a Facturar", "Diferencia", "Variación %",
+]
+
+DAILY_COLUMNS = ["HSM Bruto", "HSM Credito", "Mensajes Final"]
+
+
+def scenario_grid(nombre="Escenario", **valores):
+    """
+    Producto cartesiano de valores por parámetro, p.ej. scenario_grid(tarifa_hsm=[0.06, 0.07], igv=[0.18]).
+    Cada escenario lleva un nombre con sus valores.
+    """
+    claves = list(valores)
+    escenarios = []
+    for combinacion in itertools.product(*(valores[k] for k in claves)):
+        escenario = dict(zip(claves, combinacion))
+        etiqueta = ", ".join(f"{k}={v}" for k, v in escenario.items() if k != "tramos")
+        escenario["nombre"] = f"{nombre} {len(escenarios) + 1}" + (f" ({etiqueta})" if etiqueta else "")
+        escenarios.append(escenario)
+    return escenarios
+
+
+def load_scenarios(path):
+    """Escenarios desde un JSON (lista de objetos con `nombre` y parámetros de TARIFF_KEYS)"""
+    with open(path, encoding="utf-8") as f:
+        escenarios = json.load(f)
+    for escenario in escenarios:
+        if "tramos" in escenario:
+            escenario["tramos"] = [tuple(t) for t in escenario["tramos"]]
+    return escenarios
+
+
+def _completar(escenario, base, n):
+    desconocidas = set(escenario) - set(TARIFF_KEYS) - {"nombre"}
+    if desconocidas:
+        raise ValueError(f"Parámetros de tarifa desconocidos: {sorted(desconocidas)} (opciones: {TARIFF_KEYS})")
+    completo = {**base, **escenario}
+    completo["nombre"] = escenario.get("nombre") or f"Escenario {n}"
+    return completo
+
+
+class TariffBatch:
+    """
+    Escenarios de tarifas como arreglos alineados (un escenario por fila) para evaluarlos en bloque.
+    base: tarifa vigente (QuinaCalculator.get_tariff()); completa los parámetros omitidos
+    """
+
+    def __init__(self, escenarios, base):
+        self.escenarios = [_completar(e, base, n) for n, e in enumerate(escenarios, start=1)]
+        self.nombres = [e["nombre"] for e in self.escenarios]
+        self.fee = np.array([e["fee_mensual"] for e in self.escenarios], dtype=np.float64)
+        self.tarifa_hsm = np.array([e["tarifa_hsm"] for e in self.escenarios], dtype=np.float64)
+        self.free_tier = np.array([e["meta_free_tier"] for e in self.escenarios], dtype=np.float64)
+        self.igv = np.array([e["igv"] for e in self.escenarios], dtype=np.float64)
+
+        # Tramos rellenados hasta el escenario con más tramos: tope infinito y la última tarifa
+        n_tramos = max(len(e["tramos"]) for e in self.escenarios)
+        self.topes = np.full((len(self.escenarios), n_tramos), np.inf)
+        self.tarifas = np.empty((len(self.escenarios), n_tramos))
+        for i, e in enumerate(self.escenarios):
+            topes = [np.inf if tope is None else tope for tope, _ in e["tramos"]]
+            if any(a >= b for a, b in zip(topes, topes[1:])):
+                raise ValueError(f"{e['nombre']}: los topes de los tramos deben ser crecientes")
+            self.topes[i, :len(topes)] = topes
+            self.tarifas[i, :] = e["tramos"][-1][1]
+            self.tarifas[i, :len(topes)] = [t for _, t in e["tramos"]]
+
+    def __len__(self):
+        return len(self.escenarios)
+
+    def evaluate(self, hsm_bruto, hsm_credito, mensajes):
+        """
+        Contadores escalares (un mes) o arreglos (D,) (p.ej. acumulados por día).
+        Devuelve un diccionario de arreglos (S,) o (S, D) con los importes de la factura de cada escenario.
+        """
+        bruto = np.asarray(hsm_bruto, dtype=np.float64)
+        credito = np.asarray(hsm_credito, dtype=np.float64)
+        q_mensajes = np.asarray(mensajes, dtype=np.float64)
+        forma = (len(self),) + (1,) * q_mensajes.ndim
+
+        q_hsm = np.maximum(0, bruto - credito - self.free_tier.reshape(forma))
+        total_hsm = q_hsm * self.tarifa_hsm.reshape(forma)
+
+        # Tramo de cada volumen: cantidad de topes que supera (cantidad <= tope cae en ese tramo)
+        supera = q_mensajes[np.newaxis, np.newaxis] > self.topes.reshape(self.topes.shape + (1,) * q_mensajes.ndim)
+        tramo = np.minimum(supera.sum(axis=1), self.topes.shape[1] - 1)
+        tarifa_msg = np.take_along_axis(self.tarifas.reshape(self.tarifas.shape + (1,) * q_mensajes.ndim),
+                                        tramo[:, np.newaxis], axis=1)[:, 0]
+        total_msg = np.where(q_mensajes > 0, q_mensajes * tarifa_msg, 0.0)
+
+        subtotal = self.fee.reshape(forma) + total_hsm + total_msg
+        igv = subtotal * self.igv.reshape(forma)
+        return {
+            "Fee Mensual": np.broadcast_to(self.fee.reshape(forma), subtotal.shape),
+            "Q HSM": q_hsm,
+            "Tarifa HSM": np.broadcast_to(self.tarifa_hsm.reshape(forma), subtotal.shape),
+            "Total HSM": total_hsm,
+            "Q Mensajes": np.broadcast_to(q_mensajes, subtotal.shape),
+            "Tarifa Mensajes": tarifa_msg,
+            "Total Mensajes": total_msg,
+            "Sub Total": subtotal,
+            "IGV": igv,
+            "Total a Facturar": subtotal + igv,
+        }
+
+
+def simulate(summary, escenarios, base):
+    """
+    Tabla comparativa de escenarios sobre el resumen de QuinaCalculator.get_summary().
+    La primera fila es la tarifa vigente ("Vigente"); Diferencia y Variación % son respecto de ella.
+    """
+    lote = TariffBatch([{"nombre": "Vigente"}, *escenarios], base)
+    importes = lote.evaluate(summary["HSM Bruto"], summary["HSM Credito"], summary["Total Mensajes Final"])
+    tabla = pd.DataFrame({"Escenario": lote.nombres, **importes})
+    for col in ["Q HSM", "Q Mensajes"]:
+        tabla[col] = tabla[col].astype(np.int64)
+    vigente = tabla["Total a Facturar"].iloc[0]
+    tabla["Diferencia"] = tabla["Total a Facturar"] - vigente
+    tabla["Variación %"] = tabla["Diferencia"] / vigente * 100 if vigente else np.nan
+    return tabla[COLUMNAS]
+
+
+def daily_counters(df_detalle):
+    """
+    Contadores por día (Fecha_Dia) de la auditoría: HSM Bruto, HSM Credito y Mensajes Final.
+    Los mensajes de chats sin fila en el RDC no tienen día y no figuran aquí.
+    """
+    hsm = df_detalle["Es_Cobrable"] == 1
+    diario = pd.DataFrame({
+        "Fecha_Dia": df_detalle["Fecha_Dia"],
+        "HSM Bruto": hsm.astype(np.int64),
+        "HSM Credito": (hsm & (df_detalle["Es_Credito"] == 1)).astype(np.int64),
+        "Mensajes Final": df_detalle["Mensajes_Facturables"].astype(np.int64),
+    })
+    return diario.groupby("Fecha_Dia").sum().sort_index()
+
+
+def simulate_daily(diario, escenarios, base, columna="Total a Facturar"):
+    """
+    Evolución de la factura en el mes: cada escenario se evalúa con los contadores acumulados hasta cada día.
+    diario: salida de daily_counters. Devuelve un DataFrame días × escenarios (incluye "Vigente").
+    """
+    lote = TariffBatch([{"nombre": "Vigente"}, *escenarios], base)
+    acumulado = diario[DAILY_COLUMNS].cumsum()
+    importes = lote.evaluate(acumulado["HSM Bruto"].to_numpy(), acumulado["HSM Credito"].to_numpy(),
+                             acumulado["Mensajes Final"].to_numpy())
+    return pd.DataFrame(importes[columna].T, index=diario.index, columns=lote.nombres)
+
+
+def scenario_summary(summary, escenario, base):
+    """Resumen con el Q HSM recalculado según el free tier del escenario"""
+    e = _completar(escenario, base, 1)
+    return {
+        **summary,
+        "Total HSM Final": max(0, summary["HSM Bruto"] - summary["HSM Credito"] - e["meta_free_tier"]),
+    }
+
+
+def scenario_rows(summary, escenario, base):
+    """Filas de la hoja Factura de un escenario"""
+    e = _completar(escenario, base, 1)
+    return factura_rows(scenario_summary(summary, e, base), e["fee_mensual"], e["tarifa_hsm"],
+                        e["meta_free_tier"], e["tramos"], e["igv"])
+
+
+def scenario_report(summary, escenario, base):
+    """Bytes de un XLSX con la hoja Factura del escenario (sin auditoría)"""
+    e = _completar(escenario, base, 1)
+    return report_bytes(scenario_summary(summary, e, base), None, e["fee_mensual"], e["tarifa_hsm"],
+                        e["meta_free_tier"], include_audit=False, tramos=e["tramos"], tasa_igv=e["igv"])
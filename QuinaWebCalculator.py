@@ -1,401 +1,357 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import io
+import os
 import time
-from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import uuid
+
+import streamlit as st
+
+from QuinaJobs import JobRunner, JobRejected, run_calculator, run_export, EN_COLA, EJECUTANDO, TERMINADO, ERROR
+from QuinaLoader import UPLOAD_TYPES
+from QuinaPartition import estimate_ddc_bytes, estimate_partitioned_bytes
+from QuinaPreflight import preflight
+from QuinaRollup import rollup
+from QuinaSpool import UploadSpool, QuotaExceeded
+
+# Resultados conservados: acotados en cantidad y tiempo de vida para no agotar la memoria del dyno
+RESULT_CACHE_ENTRIES = 4
+RESULT_CACHE_TTL = 60 * 60  # segundos
+
+# Trabajos en segundo plano: ejecución simultánea, cola máxima y memoria estimada admitida (bytes)
+JOB_WORKERS = int(os.environ.get("QUINA_JOB_WORKERS", "1"))
+JOB_MAX_QUEUE = int(os.environ.get("QUINA_JOB_QUEUE", "8"))
+JOB_MEMORY_LIMIT = int(os.environ["QUINA_JOB_MEMORY"]) if os.environ.get("QUINA_JOB_MEMORY") else None
+POLL_SECONDS = 1.0
+
+# Caché en disco de archivos ya parseados (compartida entre sesiones)
+PARSED_CACHE_DIR = os.environ.get("QUINA_CACHE_DIR", ".quina_cache")
+PARSED_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+# Spool de archivos subidos en disco (cuotas en MB por sesión y en total)
+SPOOL_DIR = os.environ.get("QUINA_SPOOL_DIR", os.path.join(PARSED_CACHE_DIR, "uploads"))
+SPOOL_SESSION_QUOTA = int(os.environ.get("QUINA_SPOOL_SESSION_MB", "2048")) * 1024 ** 2
+SPOOL_GLOBAL_QUOTA = int(os.environ.get("QUINA_SPOOL_TOTAL_MB", "8192")) * 1024 ** 2
+
+# Presupuesto de memoria del DDC (bytes): por encima se procesa particionado en disco
+MEMORY_BUDGET = int(os.environ["QUINA_MEMORY_BUDGET"]) if os.environ.get("QUINA_MEMORY_BUDGET") else None
+
+# Procesos para leer varios DDC en paralelo dentro de un cálculo (1 = lectura secuencial)
+DDC_WORKERS = int(os.environ.get("QUINA_DDC_WORKERS", "1"))
+
+# Etiquetas de las etapas del cálculo en la barra de progreso
+ETIQUETAS_ETAPA = {
+    "load_rdc": "Leyendo RDC",
+    "_process_rdc": "Procesando RDC (regla 24h, crédito)",
+    "load_ddc": "Leyendo DDC",
+    "_dedup_ddc": "Descartando mensajes repetidos entre archivos DDC",
+    "_process_ddc": "Procesando DDC (mensajes, agentes, crédito)",
+    "_prepare_detailed_report": "Preparando detalle de auditoría",
+    "_build_rollup": "Agregando tendencias por día",
+}
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Descargas que se generan a pedido tras el cálculo: formato -> (botón, archivo, tipo MIME).
+# Se memorizan por la huella del cálculo (contadores, tarifa y auditoría), no por sesión ni por trabajo.
+EXPORTACIONES = {
+    "factura": ("⚡ Factura (sin auditoría)", "FACTURA_FINAL.xlsx", XLSX_MIME),
+    "csv.gz": ("🗜️ Auditoría CSV.GZ", "Detalle_Auditoria.csv.gz", "application/gzip"),
+    "parquet": ("📦 Auditoría Parquet", "Detalle_Auditoria.parquet", "application/octet-stream"),
+    "xlsx": ("📚 Libro completo XLSX", "FACTURA_COMPLETA.xlsx", XLSX_MIME),
+}
 
 st.set_page_config(page_title="Facturación Quina", page_icon="💼", layout="wide")
 
 st.title("📋 Calculadora de Facturación - Quina")
 st.markdown("""
-**📁 Instrucciones:** Sube los archivos RDC y DDC mensuales para generar la factura.  
+**📁 Instrucciones:** Sube los archivos RDC y DDC mensuales (XLSX, CSV, CSV.GZ, ZIP o Parquet) para generar la factura.
 Se aplicarán automáticamente las reglas de ventana 24h, descuentos por agente y crédito.
 """)
 
+@st.cache_resource
+def get_runner():
+    """Un único pool de trabajos para todas las sesiones del servidor"""
+    # Cada cálculo puede tener además una exportación terminada por formato
+    return JobRunner(workers=JOB_WORKERS, max_queue=JOB_MAX_QUEUE, memory_limit=JOB_MEMORY_LIMIT,
+                     keep_finished=RESULT_CACHE_ENTRIES * (1 + len(EXPORTACIONES)), ttl=RESULT_CACHE_TTL)
+
+
+@st.cache_resource
+def get_spool():
+    return UploadSpool(SPOOL_DIR, session_quota=SPOOL_SESSION_QUOTA, global_quota=SPOOL_GLOBAL_QUOTA)
+
+
+spool = get_spool()
+sesion = st.session_state.setdefault("spool_session", uuid.uuid4().hex)
+ronda = st.session_state.setdefault("upload_round", 0)
+
 # Carga de archivos
 st.sidebar.header("📂 Archivos de Entrada")
 
-file_rdc = st.sidebar.file_uploader("Subir Archivo RDC (Resumen)", type=["xlsx"])
-files_ddc = st.sidebar.file_uploader("Subir Archivos DDC (Detalle)", type=["xlsx"], accept_multiple_files=True)
+up_rdc = st.sidebar.file_uploader("Subir Archivo RDC (Resumen)", type=UPLOAD_TYPES, key=f"rdc_{ronda}")
+up_ddc = st.sidebar.file_uploader("Subir Archivos DDC (Detalle)", type=UPLOAD_TYPES, accept_multiple_files=True,
+                                  key=f"ddc_{ronda}")
+
+# Cada carga se copia al spool en disco; al cambiar la clave de los uploaders Streamlit libera
+# los bytes en memoria y la sesión conserva sólo las rutas
+if up_rdc or up_ddc:
+    try:
+        if up_rdc:
+            st.session_state["rdc"] = spool.ingest(sesion, up_rdc)
+        archivos_ddc = st.session_state.setdefault("ddc", [])
+        for upload in up_ddc:
+            entrada = spool.ingest(sesion, upload)
+            if all(f["hash"] != entrada["hash"] for f in archivos_ddc):
+                archivos_ddc.append(entrada)
+    except QuotaExceeded as e:
+        st.session_state["spool_error"] = str(e)
+    st.session_state["upload_round"] = ronda + 1
+    st.rerun()
+
+if "spool_error" in st.session_state:
+    st.sidebar.error(f"⚠️ {st.session_state.pop('spool_error')}")
+
+file_rdc = st.session_state.get("rdc")
+files_ddc = st.session_state.get("ddc", [])
+if file_rdc or files_ddc:
+    st.sidebar.markdown("**Archivos cargados**")
+    if file_rdc:
+        st.sidebar.caption(f"RDC: {file_rdc['name']} ({file_rdc['size'] / 1024 ** 2:,.1f} MB)")
+    for entrada in files_ddc:
+        st.sidebar.caption(f"DDC: {entrada['name']} ({entrada['size'] / 1024 ** 2:,.1f} MB)")
+    if st.sidebar.button("🗑️ Quitar archivos"):
+        st.session_state.pop("rdc", None)
+        st.session_state.pop("ddc", None)
+        st.rerun()
 
 # Procesamiento de facturación
 
-def get_excel_bytes(q_hsm, q_mensajes, hsm_bruto, hsm_credito, mensajes_bruto, mensajes_agente, mensajes_credito, df_detalle):
-    """Genera archivo Excel con factura y hoja de auditoría"""
-    output = io.BytesIO()
-    
-    # Configuración de tarifas
-    FEE_MENSUAL = 760.00
-    TARIFA_HSM = 0.077
-    META_FREE_TIER = 1000
-    
-    # TARIFAS ESCALONADAS PARA MENSAJES (según tabla real)
-    def calcular_costo_mensajes(cantidad):
-        """Calcula el costo total aplicando tarifas escalonadas"""
-        if cantidad <= 0:
-            return 0.0
-        elif cantidad <= 9999:
-            return cantidad * 0.0456
-        elif cantidad <= 99999:
-            return cantidad * 0.0380
-        elif cantidad <= 249999:
-            return cantidad * 0.0304
-        else: # 250000+
-            return cantidad * 0.0228
-    
-    total_hsm_money = q_hsm * TARIFA_HSM
-    total_msg_money = calcular_costo_mensajes(q_mensajes)
-    subtotal = FEE_MENSUAL + total_hsm_money + total_msg_money
-    igv = subtotal * 0.18
-    total_facturar = subtotal + igv
-
-    wb = openpyxl.Workbook()
-    
-    # ------------------ HOJA 1: FACTURA DESGLOSADA ------------------
-    ws = wb.active
-    ws.title = "Factura"
-
-    # Estilos
-    header_fill = PatternFill(start_color="C00000", end_color="C00000", fill_type="solid")
-    sub_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    white_font = Font(color="FFFFFF", bold=True)
-    bold_font = Font(bold=True)
-    border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    
-    # Determinar tarifa aplicable (Referencial para el texto)
-    if q_mensajes <= 9999:
-        tarifa_msg_aplicable = 0.0456
-    elif q_mensajes <= 99999:
-        tarifa_msg_aplicable = 0.0380
-    elif q_mensajes <= 249999:
-        tarifa_msg_aplicable = 0.0304
-    else:
-        tarifa_msg_aplicable = 0.0228
-
-    # Estructura Datos EXPANDIDA
-    data = [
-        ["CONCEPTOS", "ABR / CANTIDAD", "MONTO S/", "OBSERVACIONES"], # Header
-        ["Fee Mensual", 1, FEE_MENSUAL, "Fee Mensual Broker Whatsapp API Oficial"],
-        ["", "", "", ""],  # Espacio
-        ["CÁLCULO HSM (Detallado)", "", "", ""],  # Sección
-        ["HSM Bruto (Total Conversaciones 24h)", hsm_bruto, "", "Antes de descuentos"],
-        ["(-) HSM Opción 3 (Evalúa tu Crédito)", -hsm_credito, "", "Sesiones que derivaron a crédito"],
-        ["(-) HSM Meta Free Tier", -META_FREE_TIER, "", "1,000 conversaciones gratuitas Meta"],
-        ["Q HSM Neto Facturable", q_hsm, "Calculado", "HSM a cobrar después de descuentos"],
-        ["Tarifa por HSM", TARIFA_HSM, "Tarifa", "Según adenda N° 2"],
-        ["TOTAL HSM", "", total_hsm_money, ""],
-        ["", "", "", ""],  # Espacio
-        ["CÁLCULO MENSAJES (Detallado)", "", "", ""],  # Sección
-        ["Mensajes Bruto (Total)", mensajes_bruto, "", "Todos los mensajes del periodo"],
-        ["(-) Mensajes Post-Agente", -mensajes_agente, "", "Mensajes después de pase a humano"],
-        ["(-) Mensajes Post-Crédito", -mensajes_credito, "", "Mensajes después de trigger crédito"],
-        ["Q Mensajes Neto Facturable", q_mensajes, "Calculado", "Mensajes a cobrar después de descuentos"],
-        ["Tarifa por mensajes", tarifa_msg_aplicable, "Tarifa", f"Tarifa escalonada aplicada al volumen"],
-        ["TOTAL MENSAJES", "", total_msg_money, ""],
-        ["", "", "", ""],  # Espacio
-        ["SUB TOTAL", "", subtotal, ""],
-        ["IGV (18%)", "", igv, ""],
-        ["TOTAL A FACTURAR", "", total_facturar, ""]
-    ]
-
-    for i, row in enumerate(data, start=1):
-        for j, val in enumerate(row, start=1):
-            cell = ws.cell(row=i, column=j, value=val)
-            cell.border = border
-            if isinstance(val, (int, float)) and i > 1 and j == 3: cell.number_format = '"S/ " #,##0.00'
-            if i == 1:
-                cell.fill = header_fill
-                cell.font = white_font
-                cell.alignment = Alignment(horizontal='center')
-            # Filas amarillas
-            if row[0] in ["Fee Mensual", "TOTAL HSM", "TOTAL MENSAJES"]:
-                    if j in [1,2,3]: cell.fill = sub_fill
-            # Negritas finales
-            if row[0] in ["SUB TOTAL", "TOTAL A FACTURAR"]:
-                    cell.font = bold_font
-            # Negritas secciones
-            if row[0] in ["CÁLCULO HSM (Detallado)", "CÁLCULO MENSAJES (Detallado)"]:
-                    cell.font = bold_font
-
-    ws.column_dimensions['A'].width = 35
-    ws.column_dimensions['B'].width = 18
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 50
-
-    # ------------------ HOJA 2: AUDITORÍA DETALLADA ------------------
-    if not df_detalle.empty:
-        ws2 = wb.create_sheet("Detalle Auditoría")
-        
-        # Headers Auditoría (EXPANDIDO CON DESGLOSE COMPLETO)
-        headers = [
-            "ID Chat", 
-            "Fecha (Día)", 
-            "F.Inicio (RDC)",
-            "Tipificación Chat",
-            "Es HSM Bruto? (1=Sí)", 
-            "Tuvo Crédito? (1=Sí)",
-            "Mensajes Bruto",
-            "(-) Mensajes Post-Agente",
-            "(-) Mensajes Post-Crédito",
-            "Mensajes Facturables (Neto)",
-            "Fecha Corte Agente", 
-            "Fecha Corte Crédito"
-        ]
-        
-        for col, h in enumerate(headers, 1):
-            cell = ws2.cell(row=1, column=col, value=h)
-            cell.fill = header_fill
-            cell.font = white_font
-            cell.alignment = Alignment(horizontal='center')
-        
-        # Datos
-        rows = df_detalle.values.tolist()
-        for i, row_data in enumerate(rows, start=2):
-            for j, val in enumerate(row_data, 1):
-                cell = ws2.cell(row=i, column=j, value=val)
-                # Forzar Texto para ID Chat (Columna 1)
-                if j == 1:
-                    cell.number_format = '@'  # Formato Texto explícito en Excel
-        
-        # Anchos de columna optimizados
-        ws2.column_dimensions['A'].width = 25  # ID Chat
-        ws2.column_dimensions['B'].width = 12  # Fecha
-        ws2.column_dimensions['C'].width = 20  # F.Inicio
-        ws2.column_dimensions['D'].width = 30  # Tipificación Chat
-        ws2.column_dimensions['E'].width = 18  # Es HSM Bruto
-        ws2.column_dimensions['F'].width = 18  # Tuvo Crédito
-        ws2.column_dimensions['G'].width = 15  # Mensajes Bruto
-        ws2.column_dimensions['H'].width = 22  # Mensajes Post-Agente
-        ws2.column_dimensions['I'].width = 22  # Mensajes Post-Crédito
-        ws2.column_dimensions['J'].width = 20  # Mensajes Facturables
-        ws2.column_dimensions['K'].width = 20  # Fecha Corte Agente
-        ws2.column_dimensions['L'].width = 20  # Fecha Corte Crédito
-
-    wb.save(output)
-    return output.getvalue()
-
-# Botón de procesamiento
+
+def session_jobs():
+    """IDs de trabajos de la sesión; también se guardan en la URL para volver a ellos tras recargar la página"""
+    if "jobs" not in st.session_state:
+        st.session_state["jobs"] = [j for j in st.query_params.get("jobs", "").split(",") if j]
+    return st.session_state["jobs"]
+
+
+def remember_job(job_id):
+    jobs = session_jobs()
+    if job_id in jobs:
+        jobs.remove(job_id)
+    jobs.append(job_id)
+    st.query_params["jobs"] = ",".join(jobs)
+
+
+def show_exports(job):
+    """Botones de exportación a pedido; devuelve True si alguna sigue en curso"""
+    calc = job.result
+    huella = calc.report_fingerprint()
+    exportaciones = st.session_state.setdefault("exports", {})
+    activos = False
+    columnas = st.columns(len(EXPORTACIONES))
+    for col, (fmt, (etiqueta, archivo, mime)) in zip(columnas, EXPORTACIONES.items()):
+        with col:
+            export = runner.get(exportaciones.get(f"{huella}:{fmt}"))
+            if export is None or export.state == ERROR:
+                if export is not None:
+                    st.caption(f"❌ {export.error}")
+                if st.button(f"Preparar {etiqueta}", key=f"preparar_{job.id}_{fmt}"):
+                    try:
+                        export = runner.submit(run_export, calc, fmt, key=(huella, fmt), name=f"{job.name} ({fmt})")
+                        exportaciones[f"{huella}:{fmt}"] = export.id
+                        st.rerun()
+                    except JobRejected as e:
+                        st.warning(f"⏳ Servidor ocupado: {e}")
+            elif export.state == TERMINADO:
+                st.download_button(label=etiqueta, data=export.result, file_name=archivo, mime=mime,
+                                   key=f"descarga_{job.id}_{fmt}")
+            else:
+                activos = True
+                st.info(f"⏳ Generando {etiqueta}...")
+    return activos
+
+
+def show_trends(cubo):
+    """Gráficos desde el cubo día × tipificación × hora (no recorre la auditoría por chat)"""
+    with st.expander("📈 Tendencias"):
+        por_dia, por_tipif, por_hora = st.tabs(["Por día", "Por tipificación", "Por hora"])
+        with por_dia:
+            diario = rollup(cubo, "Fecha_Dia")
+            st.line_chart(diario[["HSM_Cobrables", "HSM_Credito"]])
+            st.line_chart(diario[["Mensajes_Facturables", "Mensajes_Post_Agente", "Mensajes_Post_Credito"]])
+        with por_tipif:
+            tipif = rollup(cubo, "Tipificación Chat").sort_values("Chats", ascending=False)
+            st.bar_chart(tipif[["HSM_Cobrables", "HSM_Credito"]])
+            st.dataframe(tipif, use_container_width=True)
+        with por_hora:
+            horas = rollup(cubo, "Hora")
+            st.bar_chart(horas["Chats"])
+            st.line_chart(horas["Tasa_Agente"])
+
+
+def show_warnings(job):
+    """Advertencias de la revisión previa (p.ej. DDC que comparten fechas), visibles desde que el trabajo entra en cola"""
+    avisos = st.session_state.get("avisos", {}).get(job.id)
+    if avisos is None and job.state == TERMINADO and job.result.preflight_report is not None:
+        avisos = job.result.preflight_report.advertencias
+    for aviso in avisos or []:
+        st.warning(f"⚠️ {aviso}")
+
+
+def files_key():
+    """Clave de los archivos cargados (sus hashes): reutiliza un cálculo de los mismos archivos"""
+    return (file_rdc["hash"], tuple(f["hash"] for f in files_ddc))
+
+
+def submit_job(revision):
+    """Encola el cálculo de los archivos cargados, ya revisados por preflight"""
+    rutas_ddc = [f["path"] for f in files_ddc]
+    est_bytes = revision.ddc_bytes
+    if est_bytes is None:
+        est_bytes = estimate_ddc_bytes(rutas_ddc)
+    if MEMORY_BUDGET is not None:
+        # Por encima del presupuesto el DDC se procesa particionado: ocupa el presupuesto, o el DDC más
+        # grande si éste solo lo supera (cada archivo se carga completo antes de repartirlo)
+        pico = revision.ddc_max_bytes
+        if pico is None:
+            pico = estimate_partitioned_bytes(rutas_ddc)
+        est_bytes = min(est_bytes, max(MEMORY_BUDGET, pico))
+    job = runner.submit(
+        run_calculator, file_rdc["path"], rutas_ddc,
+        calc_kwargs=dict(cache_dir=PARSED_CACHE_DIR, cache_max_bytes=PARSED_CACHE_MAX_BYTES,
+                         memory_budget=MEMORY_BUDGET, ddc_workers=DDC_WORKERS),
+        ddc_names=[f["name"] for f in files_ddc],
+        preflight_report=revision,
+        key=files_key(),
+        name=f"{file_rdc['name']} + {len(files_ddc)} DDC",
+        est_bytes=est_bytes,
+    )
+    st.session_state.setdefault("avisos", {})[job.id] = revision.advertencias
+    remember_job(job.id)
+
+
+def show_result(job):
+    calc = job.result
+    resumen = calc.get_summary()
+
+    # Tarjetas de KPI
+    # DDC solapados (p.ej. semanal + diarios): los mensajes repetidos se cuentan una sola vez
+    n_duplicados = calc.get_duplicate_count()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(label="HSM Bruto", value=f"{resumen['HSM Bruto']:,.0f}", delta=f"- {resumen['HSM Credito']} (Crédito)")
+    with col2:
+        st.metric(label="Q HSM (Final Facturable)", value=f"{resumen['Total HSM Final']:,.0f}", delta="- 1,000 (Meta)")
+    with col3:
+        st.metric(label="Q Mensajes (Facturables)", value=f"{resumen['Total Mensajes Final']:,.0f}")
+    with col4:
+        st.metric(label="Mensajes Repetidos (Descartados)",
+                  value=f"{n_duplicados:,}" if n_duplicados is not None else "—",
+                  help="Mensajes que ya traía otro archivo DDC; no cuentan en el bruto")
+
+    if n_duplicados:
+        with st.expander("Mensajes repetidos por archivo"):
+            st.dataframe(calc.get_ddc_duplicates(), hide_index=True)
+
+    # Los reportes se generan sólo al pedirlos; la auditoría por chat puede superar el límite de filas de Excel
+    st.caption(f"Detalle de auditoría: {len(calc.df_detalle) if calc.df_detalle is not None else 0:,} chats")
+    activos = show_exports(job)
+
+    cubo = calc.get_rollup()
+    if cubo is not None and not cubo.empty:
+        show_trends(cubo)
+
+    perfil = calc.get_profile()
+    if perfil.stages:
+        with st.expander("⏱️ Tiempos por etapa"):
+            st.dataframe(perfil.to_frame(), hide_index=True)
+    return activos
+
+
+runner = get_runner()
+
+# Botón de procesamiento: el cálculo corre en segundo plano y la sesión sólo guarda el ID del trabajo.
+# Antes se revisan los archivos (encabezado y una muestra): columnas faltantes o un DDC de otro mes
+# se informan al instante en lugar de después de leer todo el archivo. Si la muestra sugiere un DDC de otro
+# periodo (XLSX, CSV.GZ y ZIP sólo se revisan al inicio) el cálculo espera una confirmación explícita.
 if st.sidebar.button("⚙️ PROCESAR FACTURA", type="primary"):
+    st.session_state.pop("por_confirmar", None)
     if not file_rdc or not files_ddc:
         st.error("⚠️ Error: Debes subir ambos archivos (RDC y DDC) para continuar.")
     else:
-        status_container = st.empty()
-        progress_bar = st.progress(0)
-        
         try:
-            # Paso 1: Procesamiento RDC
-            status_container.info("⏳ Paso 1/3: Procesando archivo RDC (regla 24h)...")
-            progress_bar.progress(20)
-            
-            df_rdc = pd.read_excel(file_rdc, usecols=["ID", "F.Inicio Chat", "ID Chat", "Tipificación Chat"])
-            df_rdc.dropna(subset=["ID", "F.Inicio Chat"], inplace=True)
-            df_rdc["F.Inicio Chat"] = pd.to_datetime(df_rdc["F.Inicio Chat"])
-            df_rdc.sort_values(by=["ID", "F.Inicio Chat"], inplace=True)
-            
-            # Aplicar regla de ventana 24h
-            df_rdc["Prev_ID"] = df_rdc["ID"].shift(1)
-            df_rdc["Prev_Time"] = df_rdc["F.Inicio Chat"].shift(1)
-            time_diff = (df_rdc["F.Inicio Chat"] - df_rdc["Prev_Time"]).dt.total_seconds() / 3600.0
-            
-            is_new_id = df_rdc["ID"] != df_rdc["Prev_ID"]
-            is_new_window = time_diff >= 24.0
-            
-            df_rdc["Es_Cobrable"] = (is_new_id | is_new_window).astype(int)
-            total_q_hsm = df_rdc["Es_Cobrable"].sum()
-            
-            # DETECCIÓN DE CRÉDITO (Para HSM): Inmediatamente después de cargar RDC
-            # Asegurar ID Chat string
-            df_rdc["ID Chat"] = df_rdc["ID Chat"].astype(str)
-            
-            # Detectar chats con tipificación de crédito (cualquier tipificación que contenga "evalú")
-            mask_tipif_credito = df_rdc["Tipificación Chat"].astype(str).str.contains("evalú", case=False, na=False)
-            chats_con_credito_tipif = set(df_rdc[mask_tipif_credito]["ID Chat"].unique())
-            
-            # Marcar filas RDC que son de crédito (por Tipificación)
-            df_rdc["Es_Credito"] = df_rdc["ID Chat"].isin(chats_con_credito_tipif)
-
-            # Paso 2: Procesamiento DDC
-            status_container.info("⏳ Paso 2/3: Procesando DDC (mensajes, agentes, crédito)...")
-            progress_bar.progress(50)
-            
-            dfs = []
-            for f in files_ddc:
-                dfs.append(pd.read_excel(f, usecols=["ID Chat", "Mensaje", "Fecha Hora", "Tipo"]))
-            
-            if dfs:
-                df_ddc = pd.concat(dfs, ignore_index=True)
-                df_ddc["Fecha Hora"] = pd.to_datetime(df_ddc["Fecha Hora"])
-                df_ddc["ID Chat"] = df_ddc["ID Chat"].astype(str)
-                df_ddc["Tipo"] = df_ddc["Tipo"].astype(str).str.upper().str.strip()
-                df_ddc["Mensaje"] = df_ddc["Mensaje"].astype(str).str.lower()
-                
-                # Identificar hitos de agente y crédito
-                status_container.info("🔍 Paso 2/3: Analizando interacciones de agente y crédito...")
-                
-                agente_times = df_ddc[df_ddc["Tipo"] == "NOTIFICATION"].groupby("ID Chat")["Fecha Hora"].min()
-                
-                # Detectar mensaje de evaluación de crédito (opción 3)
-                credito_mask = (
-                    df_ddc["Mensaje"].str.contains("evalúa si tienes un crédito", na=False) |
-                    df_ddc["Mensaje"].str.contains("evalua si tienes un credito", na=False) |
-                    df_ddc["Mensaje"].str.contains("3. evalúa", na=False) |
-                    df_ddc["Mensaje"].str.contains("3. evalua", na=False)
-                )
-                credito_times = df_ddc[credito_mask].groupby("ID Chat")["Fecha Hora"].min()
-                
-                df_ddc["Time_Agente"] = df_ddc["ID Chat"].map(agente_times)
-                df_ddc["Time_Credito"] = df_ddc["ID Chat"].map(credito_times)
-                
-                cond_antes_agente = df_ddc["Time_Agente"].isna() | (df_ddc["Fecha Hora"] < df_ddc["Time_Agente"])
-                cond_antes_credito = df_ddc["Time_Credito"].isna() | (df_ddc["Fecha Hora"] < df_ddc["Time_Credito"])
-                
-                df_ddc["Es_Facturable"] = (cond_antes_agente & cond_antes_credito).astype(int)
-                total_q_mensajes = df_ddc["Es_Facturable"].sum()
-                
-                # --- CÁLCULO DESGLOSE MENSAJES (para factura detallada) ---
-                mensajes_bruto = len(df_ddc)  # Total de mensajes
-                
-                # Mensajes post-agente (los que NO son facturables por agente)
-                cond_post_agente = ~cond_antes_agente  # Después del agente
-                mensajes_agente = cond_post_agente.sum()
-                
-                # Mensajes post-crédito (los que NO son facturables por crédito)
-                # Nota: Algunos pueden estar ya descontados por agente, así que solo contamos los ADICIONALES
-                # Es decir, mensajes que pasaron el filtro de agente pero fallaron el de crédito
-                cond_post_credito = cond_antes_agente & (~cond_antes_credito)
-                mensajes_credito = cond_post_credito.sum()
-                
-                # --- CÁLCULO HSM: Descontar Crédito y 1K Meta ---
-                # La detección de crédito por Tipificación ya se hizo al cargar RDC
-                # df_rdc["Es_Credito"] ya está marcado
-                
-                # Total HSM Inicial (Bruto)
-                hsm_bruto = df_rdc["Es_Cobrable"].sum()
-                
-                # HSM que son de crédito (para restar)
-                # Solo contamos como "HSM de Crédito" si era cobrable Y tuvo crédito
-                hsm_credito = df_rdc[(df_rdc["Es_Cobrable"] == 1) & (df_rdc["Es_Credito"])].shape[0]
-                
-                # Cálculo Final HSM
-                # Total - Crédito - 1000 (Meta Free Tier)
-                total_q_hsm = max(0, hsm_bruto - hsm_credito - 1000)
-
-                # --- PREPARAR MESA DE AUDITORÍA DETALLADA (Actualizado con Metadatos) ---
-                # RDC Join Ready
-                rdc_view = df_rdc[["ID Chat", "F.Inicio Chat", "Tipificación Chat", "Es_Cobrable", "Es_Credito"]].copy()
-                rdc_view["ID Chat"] = rdc_view["ID Chat"].astype(str)
-                
-                # DDC Join Ready - EXPANDIDO CON DESGLOSE COMPLETO
-                # 1. Totales Facturables
-                ddc_counts = df_ddc.groupby("ID Chat")["Es_Facturable"].sum().reset_index()
-                ddc_counts.rename(columns={"Es_Facturable": "Mensajes_Facturables"}, inplace=True)
-                
-                # 2. Mensajes Bruto por Chat
-                ddc_bruto = df_ddc.groupby("ID Chat").size().reset_index(name="Mensajes_Bruto")
-                
-                # 3. Mensajes Post-Agente por Chat
-                df_ddc["Es_Post_Agente"] = (~cond_antes_agente).astype(int)
-                ddc_post_agente = df_ddc.groupby("ID Chat")["Es_Post_Agente"].sum().reset_index()
-                ddc_post_agente.rename(columns={"Es_Post_Agente": "Mensajes_Post_Agente"}, inplace=True)
-                
-                # 4. Mensajes Post-Crédito por Chat (adicionales, no ya descontados por agente)
-                df_ddc["Es_Post_Credito"] = (cond_antes_agente & (~cond_antes_credito)).astype(int)
-                ddc_post_credito = df_ddc.groupby("ID Chat")["Es_Post_Credito"].sum().reset_index()
-                ddc_post_credito.rename(columns={"Es_Post_Credito": "Mensajes_Post_Credito"}, inplace=True)
-                
-                # 5. Metadatos (Tiempos de corte)
-                ddc_meta = df_ddc[["ID Chat", "Time_Agente", "Time_Credito"]].groupby("ID Chat").first().reset_index()
-                
-                # Unir todas las métricas DDC
-                ddc_view = pd.merge(ddc_counts, ddc_bruto, on="ID Chat", how="left")
-                ddc_view = pd.merge(ddc_view, ddc_post_agente, on="ID Chat", how="left")
-                ddc_view = pd.merge(ddc_view, ddc_post_credito, on="ID Chat", how="left")
-                ddc_view = pd.merge(ddc_view, ddc_meta, on="ID Chat", how="left")
-                ddc_view["ID Chat"] = ddc_view["ID Chat"].astype(str)
-                
-                # Merge Master (Left Join al RDC porque es la base de conversaciones)
-                df_detalle = pd.merge(rdc_view, ddc_view, on="ID Chat", how="left")
-                
-                # Limpieza final para el Excel
-                df_detalle["Mensajes_Facturables"] = df_detalle["Mensajes_Facturables"].fillna(0).astype(int)
-                df_detalle["Mensajes_Bruto"] = df_detalle["Mensajes_Bruto"].fillna(0).astype(int)
-                df_detalle["Mensajes_Post_Agente"] = df_detalle["Mensajes_Post_Agente"].fillna(0).astype(int)
-                df_detalle["Mensajes_Post_Credito"] = df_detalle["Mensajes_Post_Credito"].fillna(0).astype(int)
-                
-                # Convertir Es_Credito de booleano a numérico (1/0)
-                df_detalle["Es_Credito"] = df_detalle["Es_Credito"].astype(int)
-                
-                # Extraer Fecha (Día) para análisis temporal
-                df_detalle["Fecha_Dia"] = df_detalle["F.Inicio Chat"].dt.date
-                
-                # Seleccionar y Ordenar Columnas para el Excel (SIN HSM_Facturable_Individual)
-                df_detalle = df_detalle[[
-                    "ID Chat",
-                    "Fecha_Dia",
-                    "F.Inicio Chat",
-                    "Tipificación Chat",
-                    "Es_Cobrable",
-                    "Es_Credito",
-                    "Mensajes_Bruto",
-                    "Mensajes_Post_Agente",
-                    "Mensajes_Post_Credito",
-                    "Mensajes_Facturables",
-                    "Time_Agente",
-                    "Time_Credito"
-                ]]
-
+            spool.touch([file_rdc, *files_ddc])
+            revision = preflight(file_rdc["path"], [f["path"] for f in files_ddc], file_rdc["name"],
+                                 [f["name"] for f in files_ddc], memory_budget=MEMORY_BUDGET)
+            if not revision.ok:
+                st.error("❌ Revisa los archivos antes de procesar:\n\n" + "\n".join(f"- {e}" for e in revision.errores))
+                with st.expander("Revisión de archivos"):
+                    st.dataframe(revision.to_frame(), hide_index=True)
+            elif revision.confirmaciones:
+                st.session_state["por_confirmar"] = (files_key(), revision)
             else:
-                total_q_mensajes = 0
-                mensajes_bruto = 0
-                mensajes_agente = 0
-                mensajes_credito = 0
-                hsm_bruto = total_q_hsm 
-                hsm_credito = 0
-                total_q_hsm = max(0, total_q_hsm - 1000)
-                
-                # Detalle solo RDC (sin DDC)
-                df_detalle = df_rdc[["ID Chat", "F.Inicio Chat", "Tipificación Chat", "Es_Cobrable"]].copy()
-                df_detalle["Fecha_Dia"] = df_detalle["F.Inicio Chat"].dt.date
-                df_detalle["Es_Credito"] = df_rdc["Es_Credito"].astype(int)
-                df_detalle["Mensajes_Bruto"] = 0
-                df_detalle["Mensajes_Post_Agente"] = 0
-                df_detalle["Mensajes_Post_Credito"] = 0
-                df_detalle["Mensajes_Facturables"] = 0
-                df_detalle["Time_Agente"] = pd.NaT
-                df_detalle["Time_Credito"] = pd.NaT
-
-            # Resultados finales
-            progress_bar.progress(100)
-            status_container.success("✅ Cálculo completado exitosamente")
-            
-            # Tarjetas de KPI
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric(label="HSM Bruto", value=f"{hsm_bruto:,.0f}", delta=f"- {hsm_credito} (Crédito)")
-            with col2:
-                st.metric(label="Q HSM (Final Facturable)", value=f"{total_q_hsm:,.0f}", delta="- 1,000 (Meta)")
-            with col3:
-                st.metric(label="Q Mensajes (Facturables)", value=f"{total_q_mensajes:,.0f}")
-            
-            # Descarga de reporte
-            st.markdown("---")
-            st.subheader("📥 Descargar Reporte")
-            
-            excel_data = get_excel_bytes(total_q_hsm, total_q_mensajes, hsm_bruto, hsm_credito, mensajes_bruto, mensajes_agente, mensajes_credito, df_detalle)
-            
-            st.download_button(
-                label="📄 Descargar FACTURA_FINAL.xlsx",
-                data=excel_data,
-                file_name="FACTURA_FINAL.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
-            
+                submit_job(revision)
+        except JobRejected as e:
+            st.warning(f"⏳ Servidor ocupado: {e}")
         except Exception as e:
-            status_container.error(f"❌ Error en el procesamiento: {str(e)}")
+            st.error(f"❌ Error en el procesamiento: {str(e)}")
+
+pendiente = st.session_state.get("por_confirmar")
+if pendiente is not None and file_rdc and files_ddc and pendiente[0] == files_key():
+    revision = pendiente[1]
+    with st.container(border=True):
+        st.warning("⚠️ Revisa el periodo antes de procesar:\n\n" + "\n".join(f"- {a}" for a in revision.advertencias))
+        with st.expander("Revisión de archivos"):
+            st.dataframe(revision.to_frame(), hide_index=True)
+        confirmar, cancelar = st.columns(2)
+        if confirmar.button("Procesar de todos modos", key="confirmar_periodo"):
+            try:
+                submit_job(revision)
+                enviado = True
+            except JobRejected as e:
+                st.warning(f"⏳ Servidor ocupado: {e}")
+                enviado = False
+            if enviado:
+                st.session_state.pop("por_confirmar")
+                st.rerun()
+        if cancelar.button("Cancelar", key="cancelar_periodo"):
+            st.session_state.pop("por_confirmar")
+            st.rerun()
+elif pendiente is not None:
+    # Los archivos cambiaron desde la revisión
+    st.session_state.pop("por_confirmar")
+
+# Trabajos de la sesión (el más reciente primero); se pueden descargar al volver más tarde
+activos = False
+jobs = session_jobs()
+if jobs:
+    st.markdown("---")
+    st.subheader("📥 Trabajos y Descargas")
+
+for job_id in reversed(jobs):
+    job = runner.get(job_id)
+    with st.container(border=True):
+        if job is None:
+            st.caption(f"Trabajo {job_id}: expiró o el servidor se reinició; vuelve a procesar los archivos.")
+            continue
+        st.markdown(f"**{job.name}** · `{job.id}`")
+        show_warnings(job)
+        if job.state == EN_COLA:
+            activos = True
+            posicion = runner.queue_position(job)
+            st.info(f"🕒 En cola{f' (posición {posicion})' if posicion else ''}...")
+        elif job.state == EJECUTANDO:
+            activos = True
+            st.progress(job.progress, text=f"⏳ {ETIQUETAS_ETAPA.get(job.stage, 'Iniciando')}...")
+        elif job.state == TERMINADO:
+            st.success("✅ Cálculo completado exitosamente")
+            activos = show_result(job) or activos
+        else:
+            st.error(f"❌ Error en el procesamiento: {job.error}")
 
 # Información Footer
 st.sidebar.markdown("---")
 st.sidebar.info("v1.0 - Calculadora Web Local")
+
+# Mientras haya trabajos pendientes la página se refresca sola para mostrar el avance
+if activos:
+    time.sleep(POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,125 @@
+# Regla de ventanas de conversación (HSM) sobre el RDC, sin ordenar columnas de texto:
+# los ID se factorizan a códigos enteros y se ordena (o se verifica el orden) por código y fecha en int64.
+#
+# Modos:
+#   "previous-chat"  un chat abre conversación si es el primero del ID o si pasaron >= 24h desde el chat anterior
+#                    (regla histórica de la calculadora)
+#   "meta-anchored"  la ventana de 24h se mide desde el inicio de la conversación, como factura Meta:
+#                    una cadena de chats cada 23h abre una conversación nueva cada vez que se cumplen 24h
+import numpy as np
+import pandas as pd
+
+WINDOW_MODES = ("previous-chat", "meta-anchored")
+
+# Umbral de la ventana de conversación (horas)
+VENTANA_HORAS = 24.0
+VENTANA_NS = int(VENTANA_HORAS * 3600 * 10 ** 9)
+
+
+def window_order(id_codes, tiempos, desempate=None):
+    """
+    Permutación que ordena por (código de ID, fecha, desempate); None si la entrada ya está ordenada.
+    Con códigos de pd.factorize(sort=True) el orden coincide con sort_values(["ID", "F.Inicio Chat"]) estable.
+    """
+    claves = [tiempos, id_codes] if desempate is None else [desempate, tiempos, id_codes]
+    if len(id_codes) < 2:
+        return None
+    ordenado = np.zeros(len(id_codes) - 1, dtype=bool)
+    igual = np.ones(len(id_codes) - 1, dtype=bool)
+    for clave in reversed(claves):
+        d = np.diff(clave)
+        ordenado |= igual & (d > 0)
+        igual &= d == 0
+    if (ordenado | igual).all():
+        return None
+    return np.lexsort(claves)
+
+
+def _previous_chat_starts(id_codes, tiempos):
+    inicio = np.ones(len(id_codes), dtype=bool)
+    # Misma aritmética que la versión con pandas (total_seconds / 3600) para no mover ningún borde
+    inicio[1:] = (id_codes[1:] != id_codes[:-1]) | (np.diff(tiempos) / 1e9 / 3600.0 >= VENTANA_HORAS)
+    return inicio
+
+
+def _anchored_starts(tiempos, inicio):
+    """
+    Inicios anclados a partir de los de "previous-chat" (que siempre lo son también: un hueco de 24h
+    desde el chat anterior lo es desde el inicio de la ventana). Sólo los tramos que duran >= 24h pueden
+    abrir ventanas adicionales; en ellos se salta de ancla en ancla con una búsqueda binaria vectorizada.
+    """
+    inicio = inicio.copy()
+    n = len(tiempos)
+    desde = np.flatnonzero(inicio)
+    hasta = np.append(desde[1:], n)
+    largos = tiempos[hasta - 1] - tiempos[desde] >= VENTANA_NS
+    ancla, fin = desde[largos], hasta[largos]
+    while len(ancla):
+        # Primera fila del tramo con fecha >= ancla + 24h
+        objetivo = tiempos[ancla] + VENTANA_NS
+        lo, hi = ancla + 1, fin.copy()
+        activo = lo < hi
+        while activo.any():
+            mid = (lo + hi) // 2
+            alcanza = tiempos[np.where(activo, mid, 0)] >= objetivo
+            hi = np.where(activo & alcanza, mid, hi)
+            lo = np.where(activo & ~alcanza, mid + 1, lo)
+            activo = lo < hi
+        sigue = lo < fin
+        ancla, fin = lo[sigue], fin[sigue]
+        inicio[ancla] = True
+    return inicio
+
+
+def sort_keys(ids, tiempos, desempate=None):
+    """
+    Códigos de ID (pd.factorize con sort=True) y fechas int64 ya ordenados, y la permutación aplicada
+    (None si la entrada venía ordenada). tiempos: F.Inicio Chat sin NaT; desempate: orden de llegada opcional
+    """
+    id_codes = pd.factorize(ids, sort=True)[0]
+    t = np.asarray(tiempos, dtype="datetime64[ns]").view(np.int64)
+    orden = window_order(id_codes, t, desempate)
+    if orden is not None:
+        id_codes, t = id_codes[orden], t[orden]
+    return id_codes, t, orden
+
+
+def window_flags(id_codes, tiempos, modes=WINDOW_MODES):
+    """
+    Marca 1 (int64) en los chats que abren conversación (HSM cobrable) en cada modo de `modes`.
+    id_codes/tiempos: salida de sort_keys. Los modos comparten el orden: evaluar ambos cuesta casi lo mismo que uno.
+    """
+    desconocidos = set(modes) - set(WINDOW_MODES)
+    if desconocidos:
+        raise ValueError(f"Modo de ventana desconocido: {sorted(desconocidos)} (opciones: {WINDOW_MODES})")
+    inicio = _previous_chat_starts(id_codes, tiempos)
+    marcas = {}
+    if "previous-chat" in modes:
+        marcas["previous-chat"] = inicio.astype(np.int64)
+    if "meta-anchored" in modes:
+        marcas["meta-anchored"] = _anchored_starts(tiempos, inicio).astype(np.int64)
+    return marcas
+
+
+def conversation_starts(ids, tiempos, mode="previous-chat", desempate=None):
+    """Marca de HSM cobrable (int64) según el modo de ventana, en el orden de entrada"""
+    id_codes, t, orden = sort_keys(ids, tiempos, desempate)
+    cobrable = window_flags(id_codes, t, modes=(mode,))[mode]
+    if orden is not None:
+        cobrable[orden] = cobrable.copy()
+    return cobrable
+
+
+def compare_modes(marcas, credito, free_tier):
+    """
+    Tabla de HSM por modo (filas) y la diferencia entre ambos.
+    marcas: salida de window_flags; credito: máscara de chats con crédito, en el mismo orden
+    """
+    credito = np.asarray(credito, dtype=bool)
+    tabla = pd.DataFrame([
+        {"HSM Bruto": int(v.sum()), "HSM Credito": int(((v == 1) & credito).sum())} for v in marcas.values()
+    ], index=pd.Index(list(marcas), name="Modo"))
+    tabla["Total HSM Final"] = (tabla["HSM Bruto"] - tabla["HSM Credito"] - free_tier).clip(lower=0)
+    if len(marcas) == 2:
+        tabla.loc["Diferencia"] = tabla.iloc[1] - tabla.iloc[0]
+    return tabla
@@ -0,0 +1,15 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from QuinaCache import ParsedFileCache
+from QuinaSynthetic import generate
+
+
+def test_hilos_guardan_la_misma_clave(tmp_path):
+    cache = ParsedFileCache(tmp_path)
+    _, ddc = generate(20000, seed=6)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cache.put("misma", ddc), range(16)))
+
+    assert os.listdir(tmp_path) == ["misma.feather"]
+    assert len(cache.get("misma")) == len(ddc)
@@ -0,0 +1,67 @@
+import hashlib
+
+import pytest
+
+from QuinaLogic import QuinaCalculator
+from QuinaSynthetic import generate, write_xlsx
+
+# Resultado del cálculo original (antes de las optimizaciones, leyendo los XLSX con pandas.read_excel)
+# sobre generate(20000, seed=11); el detalle se compara por el SHA-256 de su CSV
+RESUMEN = {
+    "Total HSM Final": 1035,
+    "Total Mensajes Final": 17763,
+    "HSM Bruto": 2122,
+    "HSM Credito": 87,
+    "Mensajes Bruto": 20000,
+    "Mensajes Agente": 1320,
+    "Mensajes Credito": 917,
+}
+DETALLE_SHA256 = "cfa5bda268fea28cf46f3ca1812d80983437034abaac8c06dd81a6247557f24c"
+
+# Dos DDC solapados (p.ej. semanal + diario): las filas compartidas se descartan al deduplicar
+SOLAPE = slice(10000, 12000)
+
+VARIANTES = {
+    "memoria": {},
+    "compacto": {"compact_ddc": True},
+    "pyarrow": {"engine": "pyarrow"},
+    "particionado": {"memory_budget": 0, "partitions": 4},
+}
+
+
+@pytest.fixture(scope="module")
+def datos():
+    rdc, ddc = generate(20000, seed=11)
+    return rdc, [ddc.iloc[:SOLAPE.stop], ddc.iloc[SOLAPE.start:]]
+
+
+def _verificar(calc, resumen):
+    assert {k: int(v) for k, v in resumen.items()} == RESUMEN
+    detalle = calc.df_detalle.reset_index(drop=True).to_csv(index=False)
+    assert hashlib.sha256(detalle.encode()).hexdigest() == DETALLE_SHA256
+
+
+@pytest.mark.parametrize("variante", VARIANTES)
+def test_variantes_igual_al_original(datos, variante):
+    rdc, ddcs = datos
+    calc = QuinaCalculator(**VARIANTES[variante])
+    _verificar(calc, calc.process_data(rdc, ddcs))
+    assert calc.get_duplicate_count() == SOLAPE.stop - SOLAPE.start
+
+
+def test_xlsx_igual_al_original(datos, tmp_path):
+    rdc, ddcs = datos
+    ruta_rdc, rutas_ddc = write_xlsx(rdc, ddcs[0], tmp_path / "a", max_rows=5000)
+    rutas_ddc += write_xlsx(rdc, ddcs[1], tmp_path / "b", max_rows=5000)[1]
+    calc = QuinaCalculator(cache_dir=tmp_path / "cache")
+    _verificar(calc, calc.process_data(ruta_rdc, rutas_ddc))
+    # Segunda corrida desde la caché de archivos parseados
+    calc = QuinaCalculator(cache_dir=tmp_path / "cache")
+    _verificar(calc, calc.process_data(ruta_rdc, rutas_ddc))
+
+
+def test_incremental_igual_al_original(datos, tmp_path):
+    rdc, ddcs = datos
+    QuinaCalculator().process_increment(tmp_path, rdc, ddcs[:1])
+    calc = QuinaCalculator()
+    _verificar(calc, calc.process_increment(tmp_path, None, ddcs[1:], build_detail=True))
@@ -0,0 +1,27 @@
+import json
+import os
+
+import pytest
+
+from QuinaIncremental import STATE_META, IncrementalState
+from QuinaLogic import QuinaCalculator
+from QuinaSynthetic import generate
+
+
+def test_estado_de_otra_version_no_se_pisa(tmp_path):
+    rdc, ddc = generate(2000, seed=4)
+    QuinaCalculator().process_increment(tmp_path, rdc, [ddc])
+    ruta = os.path.join(tmp_path, STATE_META)
+    with open(ruta, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["version"] = 99
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    archivos = {nombre: os.path.getmtime(os.path.join(tmp_path, nombre)) for nombre in os.listdir(tmp_path)}
+
+    with pytest.raises(ValueError, match="versión 99"):
+        IncrementalState.load(tmp_path)
+    with pytest.raises(ValueError):
+        QuinaCalculator().process_increment(tmp_path, rdc, [ddc])
+
+    assert {nombre: os.path.getmtime(os.path.join(tmp_path, nombre)) for nombre in os.listdir(tmp_path)} == archivos
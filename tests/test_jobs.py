@@ -0,0 +1,23 @@
+import threading
+
+from QuinaJobs import TERMINADO, JobRunner
+
+
+def _esperar(job, evento):
+    evento.wait(10)
+    return job.est_bytes
+
+
+def test_trabajo_mayor_al_limite_corre_solo():
+    runner = JobRunner(workers=2, memory_limit=100)
+    liberar = threading.Event()
+    chico = runner.submit(_esperar, liberar, est_bytes=50)
+    grande = runner.submit(_esperar, liberar, est_bytes=500)
+
+    # El grande espera a que no haya otro en ejecución y luego se admite aunque supere el límite
+    liberar.set()
+    for job in (chico, grande):
+        while not job.done:
+            threading.Event().wait(0.01)
+        assert job.state == TERMINADO
+    assert grande.started >= chico.finished
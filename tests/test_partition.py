@@ -0,0 +1,20 @@
+from QuinaLogic import QuinaCalculator
+from QuinaPartition import estimate_ddc_bytes, estimate_partitioned_bytes
+from QuinaSynthetic import generate, write_xlsx
+
+
+def test_archivo_mayor_al_presupuesto_se_advierte(tmp_path):
+    rdc, ddc = generate(6000, seed=5)
+    ruta_rdc, rutas_ddc = write_xlsx(rdc, ddc, tmp_path, max_rows=4000)
+    assert estimate_partitioned_bytes(rutas_ddc) < estimate_ddc_bytes(rutas_ddc)
+
+    calc = QuinaCalculator(memory_budget=1)
+    revision = calc.preflight(ruta_rdc, rutas_ddc)
+    assert revision.ddc_max_bytes < revision.ddc_bytes
+    avisos = [a for a in revision.advertencias if "aun en modo particionado" in a]
+    assert len(avisos) == len(rutas_ddc)
+
+    # La advertencia no cambia el resultado: se procesa particionado igual
+    calc.process_data(ruta_rdc, rutas_ddc)
+    assert calc.ddc_mode == "particionado"
+    assert calc.get_summary() == QuinaCalculator().process_data(ruta_rdc, rutas_ddc)
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from QuinaLogic import QuinaCalculator
+from QuinaReconcile import reconcile
+from QuinaSynthetic import generate
+
+
+@pytest.fixture(scope="module")
+def corrida():
+    """Corrida con ID Chat numéricos con ceros a la izquierda (texto que parece número)"""
+    rdc, ddc = generate(5000, seed=2)
+    chats = pd.unique(pd.concat([rdc["ID Chat"], ddc["ID Chat"]]))
+    codigos = {chat: f"{n:06d}" for n, chat in enumerate(chats)}
+    rdc["ID Chat"] = rdc["ID Chat"].map(codigos)
+    ddc["ID Chat"] = ddc["ID Chat"].map(codigos)
+    calc = QuinaCalculator()
+    calc.process_data(rdc, [ddc])
+    return calc
+
+
+@pytest.mark.parametrize("formato", ["xlsx", "csv.gz", "parquet"])
+def test_auditoria_exportada_concilia_con_su_corrida(corrida, formato, tmp_path):
+    ruta = tmp_path / f"auditoria.{formato}"
+    if formato == "xlsx":
+        corrida.write_excel_report(ruta)
+    else:
+        corrida.write_audit_export(ruta, formato)
+
+    resultado = reconcile(corrida, ruta)
+
+    assert resultado.stats["chats_nuevo"] == resultado.stats["chats_anterior"] == corrida.df_detalle["ID Chat"].nunique()
+    assert resultado.stats["cambiados"] == resultado.stats["nuevos"] == resultado.stats["eliminados"] == 0
+    assert resultado.chats.empty
+    assert (resultado.efecto["Efecto Chats"] == 0).all()
@@ -0,0 +1,29 @@
+import io
+
+import openpyxl
+import pandas as pd
+
+from QuinaLogic import QuinaCalculator
+from QuinaSynthetic import generate
+
+
+def test_factura_muestra_los_repetidos(tmp_path):
+    rdc, ddc = generate(3000, seed=7)
+    # Un DDC semanal más el diario de sus últimos días: las filas compartidas se cuentan una vez
+    diario = ddc.iloc[-500:]
+    calc = QuinaCalculator()
+    calc.process_data(rdc, [ddc, diario])
+    assert calc.get_duplicate_count() == len(diario)
+
+    ruta = tmp_path / "factura.xlsx"
+    calc.write_excel_report(ruta, include_audit=False)
+    filas = {fila[0]: fila[1] for fila in openpyxl.load_workbook(ruta)["Factura"].iter_rows(values_only=True)}
+    assert filas["Mensajes Repetidos entre DDC"] == len(diario)
+    assert filas["Mensajes Bruto (Total)"] == calc.get_summary()["Mensajes Bruto"]
+
+    # Sin deduplicación no hay fila
+    calc = QuinaCalculator(dedup_ddc=False)
+    calc.process_data(rdc, [ddc])
+    assert calc.get_duplicate_count() is None
+    factura = pd.read_excel(io.BytesIO(calc.generate_excel_report(include_audit=False)), sheet_name="Factura")
+    assert "Mensajes Repetidos entre DDC" not in set(factura["CONCEPTOS"])